@@ -0,0 +1,70 @@
+"""
+TinyDB storage codecs benchmark.
+
+Stores the same subscriptions and time counts with every combination
+of file format and packed tables, and reports the size of the files,
+the time it takes to write them all and to open them again.
+Combinations using msgpack are skipped if it isn't installed.
+
+    python -m benchmarks.bench_codecs [channels] [users per channel]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+from voice_activity.backends.tinydb_backend import TinyDBBackend
+from voice_activity.tinydb_exts.codecs import msgpack
+
+PACKED = ("subscriptions", "time_counts")
+VARIANTS = [
+    ("json", ()),
+    ("json", PACKED),
+    ("msgpack", ()),
+    ("msgpack", PACKED),
+]
+
+
+def generate(channels, users, seed=0):
+    rng = random.Random(seed)
+    return {
+        rng.getrandbits(63): {rng.getrandbits(63): rng.uniform(0, 10 ** 6) for _ in range(users)}
+        for _ in range(channels)
+    }
+
+
+def run_variant(directory, data, storage_format, packed_tables):
+    start = time.perf_counter()
+    backend = TinyDBBackend(directory, storage_format=storage_format, packed_tables=packed_tables)
+    for chan, counts in data.items():
+        backend.track_channel(1, chan)
+        for user in counts:
+            backend.add_subscriber(1, chan, user)
+        backend._counts[chan] = {str(user): secs for user, secs in counts.items()}
+    backend.close()
+    written = time.perf_counter()
+    backend = TinyDBBackend(directory, storage_format=storage_format, packed_tables=packed_tables)
+    backend.close()
+    opened = time.perf_counter()
+    size = sum(entry.stat().st_size for entry in os.scandir(directory))
+    return size, written - start, opened - written
+
+
+def main():
+    channels = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    users = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    data = generate(channels, users)
+    print(f"{channels} channels with {users} users each")
+    for storage_format, packed_tables in VARIANTS:
+        name = f"{storage_format} {'packed' if packed_tables else 'plain'}"
+        if storage_format == "msgpack" and msgpack is None:
+            print(f"{name:<16} skipped, msgpack is not installed")
+            continue
+        with tempfile.TemporaryDirectory() as directory:
+            size, write, read = run_variant(directory, data, storage_format, packed_tables)
+        print(f"{name:<16} {size / 1024:9.1f} KiB, write {write * 1000:8.1f} ms, open {read * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
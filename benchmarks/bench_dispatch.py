@@ -0,0 +1,88 @@
+"""
+Microbenchmark of command parsing and dispatch.
+
+Runs `VoiceActivity._run_cmd` on a mix of valid, unknown and
+malformed commands against no-op commands and reports how many
+messages per second get parsed and dispatched.
+
+    python -m benchmarks.bench_dispatch [iterations]
+"""
+import asyncio
+import sys
+import time
+
+from voice_activity.abc import AbstractCommand
+from voice_activity.bot import VoiceActivity
+
+MESSAGES = [
+    "help",
+    "sub General",
+    'sub "Voice Channel"',
+    "track-stats General",
+    "track-channels",
+    "unknown-command with args",
+    "hello there, how are you?",
+    "sub",
+]
+
+
+class Sink:
+    id = 0
+    name = "bench"
+
+    async def send(self, content):
+        pass
+
+
+class NoArgs(AbstractCommand):
+
+    def __init__(self, bot, name):
+        super().__init__(bot)
+        self._name = name
+
+    def name(self):
+        return self._name
+
+    async def run(self, ctx):
+        pass
+
+
+class OneArg(NoArgs):
+
+    async def run(self, ctx, chan: str):
+        pass
+
+
+def make_bot():
+    bot = VoiceActivity()
+    # replies are still queued, but sent right away
+    bot.outbox.rate = None
+    bot.outbox.coalesce_window = 0
+    for name in ("help", "track-channels"):
+        bot.add_module(NoArgs, name)
+    for name in ("sub", "unsub", "track", "untrack", "track-stats"):
+        bot.add_module(OneArg, name)
+    return bot
+
+
+async def bench(iterations):
+    bot = make_bot()
+    sink = Sink()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for mess in MESSAGES:
+            await bot._run_cmd(sink, None, sink, mess)
+    await bot.outbox.close()
+    return time.perf_counter() - start
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    elapsed = asyncio.run(bench(iterations))
+    total = iterations * len(MESSAGES)
+    print(f"{total} messages in {elapsed:.3f}s: {total / elapsed:,.0f} msg/s, "
+          f"{elapsed / total * 1e6:.2f} us/msg")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Cold start benchmark.
+
+Starts fresh interpreters which import the bot and create it with
+the enabled plugins, against an empty temporary data directory, and
+reports the median time of the imports, of creating the bot and of
+importing and starting each of the plugins.
+
+    python -m benchmarks.bench_startup [runs] [plugin ...]
+"""
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+from voice_activity.bot import create_bot
+from voice_activity.config import Config
+imported = time.perf_counter()
+config = Config()
+config.data_directory = sys.argv[1]
+config.metrics_port = None
+bot = create_bot(config=config, plugins=sys.argv[2:] or None)
+created = time.perf_counter()
+print(json.dumps({
+    "import": imported - start,
+    "create_bot": created - imported,
+    "plugins": bot.startup_timings,
+}))
+"""
+
+
+def run_once(plugins):
+    with tempfile.TemporaryDirectory() as data_directory:
+        out = subprocess.run(
+            [sys.executable, "-c", CHILD, data_directory, *plugins],
+            check=True, capture_output=True, text=True).stdout
+    return json.loads(out)
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    plugins = sys.argv[2:]
+    results = [run_once(plugins) for _ in range(runs)]
+    for phase in ("import", "create_bot"):
+        print(f"{phase:<12} {statistics.median(r[phase] for r in results) * 1000:8.1f} ms")
+    for name in results[0]["plugins"]:
+        imported = statistics.median(r["plugins"][name][0] for r in results) * 1000
+        started = statistics.median(r["plugins"][name][1] for r in results) * 1000
+        print(f"  {name:<12} import {imported:6.1f} ms, start {started:6.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+"""
+Offline replay of synthetic voice activity through the whole bot.
+
+Generates a reproducible stream of voice state updates and commands
+for a number of fake guilds and feeds it to `VoiceActivity` with all
+of the default modules and a real storage backend in a temporary data
+directory. Reports events per second, p50/p99 handler latency and the
+bytes written to storage.
+
+    python -m benchmarks.replay [--events N] [--guilds N] [--seed N] ...
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from dataclasses import (
+    asdict,
+    dataclass,
+)
+from types import SimpleNamespace
+
+from voice_activity.bot import create_bot
+from voice_activity.config import Config
+
+
+class FakeMember:
+
+    def __init__(self, guild, member_id):
+        self.id = member_id
+        self.name = f"member-{member_id}"
+        self.guild = guild
+        self.voice_channel = None
+        self.received = 0
+
+    async def send(self, content):
+        self.received += 1
+
+
+class FakeVoiceChannel:
+
+    def __init__(self, guild, channel_id, name):
+        self.id = channel_id
+        self.name = name
+        self.guild = guild
+        self.members = []
+
+    def __str__(self):
+        return self.name
+
+
+class FakeTextChannel:
+
+    def __init__(self, channel_id):
+        self.id = channel_id
+        self.sent = 0
+
+    async def send(self, content=None, embed=None):
+        self.sent += 1
+
+
+class FakeGuild:
+
+    def __init__(self, guild_id):
+        self.id = guild_id
+        self.voice_channels = []
+        self.text_channel = FakeTextChannel(guild_id + 1)
+        self.members = {}
+
+    def get_member(self, member_id):
+        return self.members.get(member_id)
+
+    def get_channel(self, channel_id):
+        for chan in self.voice_channels:
+            if chan.id == channel_id:
+                return chan
+        return None
+
+
+class FakeMessage:
+
+    def __init__(self, author, guild, bot_user, command):
+        self.author = author
+        self.guild = guild
+        self.channel = guild.text_channel
+        self.mentions = [bot_user]
+        self.content = f"<@{bot_user.id}> {command}"
+        self.clean_content = f"@{bot_user.name} {command}"
+
+
+@dataclass
+class Scenario:
+    guilds: int = 20
+    channels: int = 5
+    members: int = 50
+    # probability that a member already in a channel moves
+    # to another one instead of leaving
+    churn: float = 0.3
+    # members subscribed to every channel
+    subscribers: int = 5
+    tracked: float = 0.5
+    # fraction of the events which are commands
+    messages: float = 0.05
+    events: int = 20000
+    seed: int = 0
+
+
+@dataclass
+class ReplayResult:
+    events: int
+    voice_events: int
+    messages: int
+    elapsed: float
+    events_per_sec: float
+    p50_ms: float
+    p99_ms: float
+    bytes_written: int
+
+
+class World:
+    """
+    Fake guilds, their channels and members together with
+    a random but reproducible stream of events happening in them.
+    """
+
+    def __init__(self, scenario):
+        self.scenario = scenario
+        self._random = random.Random(scenario.seed)
+        self.bot_user = SimpleNamespace(id=1, name="VoiceActivity")
+        self.guilds = []
+        next_id = 1000
+        for _ in range(scenario.guilds):
+            guild = FakeGuild(next_id << 22)
+            next_id += 1
+            for i in range(scenario.channels):
+                guild.voice_channels.append(FakeVoiceChannel(guild, next_id, f"voice-{i}"))
+                next_id += 1
+            for _ in range(scenario.members):
+                guild.members[next_id] = FakeMember(guild, next_id)
+                next_id += 1
+            self.guilds.append(guild)
+
+    def setup(self):
+        """
+        Returns `(tracked, subscriptions)` as lists of
+        `(guild, channel)` and `(guild, channel, user)` rows.
+        """
+        tracked, subscriptions = [], []
+        for guild in self.guilds:
+            members = list(guild.members)
+            for chan in guild.voice_channels:
+                if self._random.random() < self.scenario.tracked:
+                    tracked.append((guild.id, chan.id))
+                for user in self._random.sample(members, min(self.scenario.subscribers, len(members))):
+                    subscriptions.append((guild.id, chan.id, user))
+        return tracked, subscriptions
+
+    def events(self):
+        """
+        Yields `("voice", member, before, after)` and `("message", message)`
+        events. Channel members are updated before the event is yielded,
+        just like discord.py does before dispatching it.
+        """
+        commands = ("track-stats {}", "track-stats {} 7d", "track-channels", "sub {}")
+        for _ in range(self.scenario.events):
+            guild = self._random.choice(self.guilds)
+            member = guild.members[self._random.choice(list(guild.members))]
+            if self._random.random() < self.scenario.messages:
+                chan = self._random.choice(guild.voice_channels)
+                command = self._random.choice(commands).format(chan.name)
+                yield "message", FakeMessage(member, guild, self.bot_user, command)
+                continue
+            before = member.voice_channel
+            if before is None or self._random.random() < self.scenario.churn:
+                after = self._random.choice([c for c in guild.voice_channels if c is not before])
+            else:
+                after = None
+            if before is not None:
+                before.members.remove(member)
+            if after is not None:
+                after.members.append(member)
+            member.voice_channel = after
+            yield (
+                "voice", member,
+                SimpleNamespace(channel=before), SimpleNamespace(channel=after))
+
+
+def written_bytes():
+    """
+    Bytes this process passed to write calls so far, None where unknown.
+    """
+    try:
+        with open("/proc/self/io") as io:
+            for line in io:
+                if line.startswith("wchar:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def directory_size(path):
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(path) for name in names)
+
+
+async def replay(scenario, config):
+    """
+    Replays the scenario against a bot using `config`,
+    returns the `ReplayResult` and the bot, already closed.
+    """
+    world = World(scenario)
+    bot = create_bot(config=config)
+    bot._connection.user = world.bot_user
+    tracked, subscriptions = world.setup()
+    for guild, chan in tracked:
+        await bot.storage.backend.track_channel(guild, chan)
+    for guild, chan, user in subscriptions:
+        await bot.storage.backend.add_subscriber(guild, chan, user)
+    bot._start_background_tasks()
+
+    written_before = written_bytes()
+    size_before = directory_size(config.data_directory)
+    latencies = []
+    voice_events = messages = 0
+    start = time.perf_counter()
+    for event in world.events():
+        event_start = time.perf_counter()
+        if event[0] == "voice":
+            _, member, before, after = event
+            await bot.on_voice_state_update(member, before, after)
+            voice_events += 1
+        else:
+            await bot.on_message(event[1])
+            messages += 1
+        latencies.append(time.perf_counter() - event_start)
+    elapsed = time.perf_counter() - start
+    # compacts the session log and flushes the storage
+    await bot.close()
+    written_after = written_bytes()
+    if written_before is None or written_after is None:
+        bytes_written = max(0, directory_size(config.data_directory) - size_before)
+    else:
+        bytes_written = written_after - written_before
+
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    result = ReplayResult(
+        events=len(latencies),
+        voice_events=voice_events,
+        messages=messages,
+        elapsed=elapsed,
+        events_per_sec=len(latencies) / elapsed if elapsed else 0.0,
+        p50_ms=quantiles[49] * 1000,
+        p99_ms=quantiles[98] * 1000,
+        bytes_written=bytes_written,
+    )
+    return result, bot
+
+
+def make_config(data_directory, backend):
+    config = Config()
+    config.data_directory = data_directory
+    config.storage_backend = backend
+    config.metrics_port = None
+    # the fake channels have no rate limits to respect
+    config.outbound_rate = None
+    config.outbound_coalesce_window = 0
+    return config
+
+
+def main():
+    defaults = Scenario()
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    for name, value in asdict(defaults).items():
+        parser.add_argument(f"--{name}", type=type(value), default=value)
+    parser.add_argument("--backend", choices=("sqlite", "tinydb", "partitioned"), default=Config.storage_backend)
+    parser.add_argument("--json", action="store_true", help="print the result as JSON")
+    args = parser.parse_args()
+    scenario = Scenario(**{name: getattr(args, name) for name in asdict(defaults)})
+
+    with tempfile.TemporaryDirectory() as data_directory:
+        result, _ = asyncio.run(replay(scenario, make_config(data_directory, args.backend)))
+    if args.json:
+        print(json.dumps({"scenario": asdict(scenario), "backend": args.backend, **asdict(result)}))
+        return
+    print(f"{result.events} events ({result.voice_events} voice, {result.messages} commands) "
+          f"in {result.elapsed:.3f}s: {result.events_per_sec:,.0f} events/s")
+    print(f"handler latency p50 {result.p50_ms:.3f} ms, p99 {result.p99_ms:.3f} ms")
+    print(f"storage bytes written: {result.bytes_written:,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+import asyncio
+import os
+
+import pytest
+
+from voice_activity.abc import StorageDump
+from voice_activity.backends.async_storage import AsyncStorage
+from voice_activity.backends.migration import migrate_tinydb
+from voice_activity.backends.partitioned_backend import PartitionedBackend
+from voice_activity.backends.sqlite_backend import SQLiteBackend
+from voice_activity.backends.storage_server import (
+    RemoteBackend,
+    StorageServer,
+)
+from voice_activity.backends.tinydb_backend import TinyDBBackend
+
+
+@pytest.fixture(params=["tinydb", "sqlite", "partitioned"])
+def backend(request, tmp_path):
+    if request.param == "tinydb":
+        backend = TinyDBBackend(str(tmp_path))
+    elif request.param == "partitioned":
+        backend = PartitionedBackend(str(tmp_path), TinyDBBackend, max_open=1)
+    else:
+        backend = SQLiteBackend(str(tmp_path / "test.sqlite3"))
+    yield backend
+    backend.close()
+
+
+def test_subscriptions(backend):
+    backend.add_subscriber(1, 10, 100)
+    backend.add_subscriber(1, 10, 101)
+    assert backend.subscribers(10) == {100, 101}
+    assert backend.remove_subscriber(1, 10, 100)
+    assert not backend.remove_subscriber(1, 10, 100)
+    assert backend.subscribers(10) == {101}
+    assert backend.subscribers(11) == set()
+
+
+def test_subscriptions_by_user(backend):
+    backend.add_subscriber(1, 10, 100)
+    backend.add_subscriber(1, 11, 100)
+    backend.add_subscriber(2, 20, 100)
+    backend.add_subscriber(1, 10, 101)
+    assert backend.subscriptions(100) == {10, 11, 20}
+    assert backend.subscriptions(100, 1) == {10, 11}
+    assert backend.remove_subscriptions(1, 100, [10, 11, 12]) == 2
+    assert backend.subscriptions(100) == {20}
+    assert backend.subscribers(10) == {101}
+
+
+def test_digest_subscriptions(backend):
+    backend.add_subscriber(1, 10, 100, True)
+    backend.add_subscriber(1, 10, 101)
+    assert backend.subscribers(10) == {100, 101}
+    assert backend.digest_subscribers(10) == {100}
+    backend.add_subscriber(2, 20, 100, True)
+    assert backend.digest_subscriptions(100) == {10, 20}
+    assert backend.digest_subscriptions(100, 1) == {10}
+    assert backend.digest_subscriptions(101) == set()
+    backend.add_subscriber(1, 10, 100, False)
+    assert backend.digest_subscribers(10) == set()
+    backend.add_subscriber(1, 10, 101, True)
+    assert backend.remove_subscriptions(1, 101, [10]) == 1
+    assert backend.digest_subscribers(10) == set()
+
+
+def test_digest_mode_is_dumped_and_loaded(backend, tmp_path):
+    backend.add_subscriber(1, 10, 100, True)
+    backend.add_subscriber(1, 10, 101)
+    dump = backend.dump()
+    assert sorted(dump.subscriptions) == [(1, 10, 100, 1), (1, 10, 101, 0)]
+    target = SQLiteBackend(str(tmp_path / "target.sqlite3"))
+    target.load(dump)
+    assert target.digest_subscribers(10) == {100}
+    backend.load(target.dump())
+    assert backend.digest_subscribers(10) == {100}
+    target.close()
+
+
+def test_dump_chunks_stream_every_table(backend):
+    for chan in (10, 20):
+        backend.track_channel(chan // 10, chan)
+        for user in range(5):
+            backend.add_subscriber(chan // 10, chan, user, user % 2)
+    closed = [(2, 20, user, 1000.0, 1060.0 + user) for user in range(5)]
+    backend.record_sessions(closed, [(1, 10, 100, 1000.0)], {})
+    dump = backend.dump()
+
+    def fail():
+        raise AssertionError("dump_chunks shouldn't dump everything")
+    backend.dump = fail
+    for table in StorageDump._fields:
+        chunks = list(backend.dump_chunks(table, 3))
+        assert all(0 < len(chunk) <= 3 for chunk in chunks)
+        assert sorted(row for chunk in chunks for row in chunk) == sorted(getattr(dump, table))
+
+
+def test_returned_sets_are_copies(backend):
+    backend.add_subscriber(1, 10, 100, True)
+    backend.subscribers(10).clear()
+    backend.digest_subscribers(10).clear()
+    assert backend.subscribers(10) == {100}
+    assert backend.digest_subscribers(10) == {100}
+
+
+def test_sessions_are_counted(backend):
+    backend.track_channel(1, 10)
+    assert backend.is_tracked(10)
+    assert backend.tracked_channels(1) == {10}
+    assert backend.tracked_channels(2) == set()
+    backend.record_sessions([], [(1, 10, 100, 1000.0)], {})
+    assert backend.open_sessions(10) == {100: 1000.0}
+    backend.record_sessions([(1, 10, 100, 1000.0, 1060.0)], [], {})
+    assert backend.open_sessions(10) == {}
+    assert backend.time_counts(10) == {100: 60.0}
+    backend.record_sessions([(1, 10, 100, 2000.0, 2030.0), (1, 11, 100, 2000.0, 2030.0)], [], {})
+    assert backend.time_counts(10) == {100: 90.0}
+    assert backend.time_counts(11) == {}
+    backend.untrack_channel(1, 10)
+    assert not backend.is_tracked(10)
+    assert backend.time_counts(10) == {}
+
+
+def test_migration_from_tinydb(tmp_path):
+    source = TinyDBBackend(str(tmp_path))
+    source.add_subscriber(1, 10, 100)
+    source.add_subscriber(1, 10, 101, True)
+    source.track_channel(1, 10)
+    source.record_sessions([(1, 10, 100, 1000.0, 1060.0)], [], {})
+    source.close()
+
+    target = SQLiteBackend(str(tmp_path / "test.sqlite3"))
+    assert migrate_tinydb(str(tmp_path), target)
+    assert target.subscribers(10) == {100, 101}
+    assert target.digest_subscribers(10) == {101}
+    assert target.tracked_channels(1) == {10}
+    assert target.time_counts(10) == {100: 60.0}
+    assert not os.path.exists(tmp_path / "subs.db")
+    assert not migrate_tinydb(str(tmp_path), target)
+    target.close()
+
+
+def test_async_storage_keeps_call_order(tmp_path):
+    storage = AsyncStorage(SQLiteBackend(str(tmp_path / "test.sqlite3")))
+
+    async def run():
+        writes = [storage.add_subscriber(1, 10, user) for user in range(50)]
+        subscribers = storage.subscribers(10)
+        await asyncio.gather(*writes)
+        return await subscribers
+
+    assert asyncio.run(run()) == set(range(50))
+    assert storage.queue_depth == 0
+    assert storage.peak_queue_depth >= 1
+    storage.close()
+
+
+def test_rollups_are_updated_on_session_close(backend):
+    day = 24 * 3600
+    backend.track_channel(1, 10)
+    backend.record_sessions([(1, 10, 100, 10 * day - 600, 10 * day + 600)], [], {})
+    assert backend.rollup_counts(10, 3600, 10 * day) == {100: 600}
+    assert backend.rollup_counts(10, day, 10 * day - 1) == {100: 1200}
+    assert backend.rollup_counts(10, day, 11 * day) == {}
+
+
+def test_expired_rollups_are_deleted(backend):
+    day = 24 * 3600
+    backend.track_channel(1, 10)
+    backend.record_sessions([(1, 10, 100, 100 * day - 600, 100 * day + 600)], [], {})
+    # a late session goes before the buckets already there
+    backend.record_sessions([(1, 10, 101, 100 * day - 4000, 100 * day - 3800)], [], {})
+    assert backend.rollup_counts(10, 3600, 100 * day - 2 * 3600) == {100: 1200, 101: 200}
+    assert backend.rollup_counts(10, 3600, 100 * day) == {100: 600}
+    backend.record_sessions([(1, 10, 100, 103 * day, 103 * day + 60)], [], {})
+    assert backend.rollup_counts(10, 3600, 0) == {100: 60}
+    assert backend.rollup_counts(10, day, 0) == {100: 1260, 101: 200}
+    backend.record_sessions([(1, 10, 100, 200 * day, 200 * day + 60)], [], {})
+    assert backend.rollup_counts(10, day, 0) == {100: 60}
+    assert backend.rollup_counts(10, 7 * day, 0) == {100: 1320, 101: 200}
+
+
+def test_record_sessions_only_replaces_own_shard(backend):
+    # guild ids shifted by 22 bits give the shard, 2 -> shard 0, 1 -> shard 1
+    guild_a, guild_b = 2 << 22, 1 << 22
+    backend.track_channel(guild_a, 10)
+    backend.track_channel(guild_b, 20)
+    backend.record_sessions([], [(guild_a, 10, 100, 1000.0), (guild_b, 20, 200, 1000.0)], {})
+    assert backend.all_open_sessions((1, 2)) == [(guild_b, 20, 200, 1000.0)]
+    backend.record_sessions([], [(guild_b, 20, 201, 1100.0)], {"seq:1": 5}, (1, 2))
+    assert backend.open_sessions(10) == {100: 1000.0}
+    assert backend.open_sessions(20) == {201: 1100.0}
+    assert backend.get_meta("seq:1") == 5
+
+
+def test_remote_backend(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "test.sqlite3"))
+    server = StorageServer(backend, str(tmp_path / "storage.sock"), authkey=b"secret")
+    server.start()
+    remote = RemoteBackend(server.address, authkey=b"secret")
+    try:
+        remote.add_subscriber(1, 10, 100)
+        assert remote.subscribers(10) == {100}
+        assert backend.subscribers(10) == {100}
+        with pytest.raises(AttributeError):
+            remote.close_everything()
+    finally:
+        remote.close()
+        server.close()
+        backend.close()
+
+
+def test_partitions_are_closed_when_idle(tmp_path):
+    now = [0.0]
+    backend = PartitionedBackend(str(tmp_path), TinyDBBackend, max_open=2, idle_timeout=60, clock=lambda: now[0])
+    for guild in (1, 2, 3):
+        backend.track_channel(guild, guild * 10)
+        backend.add_subscriber(guild, guild * 10, 100)
+    assert backend.open_partitions == 2
+    assert backend.tracked_channels(1) == {10}
+    assert backend.open_partitions == 2
+    now[0] = 100.0
+    backend.record_sessions([], [(2, 20, 100, 50.0)], {})
+    now[0] = 130.0
+    backend.flush()
+    assert backend.open_partitions == 1
+    assert backend.subscriptions(100) == {10, 20, 30}
+    backend.record_sessions([(2, 20, 100, 50.0, 80.0)], [], {})
+    assert backend.open_sessions(20) == {}
+    backend.close()
+
+    backend = PartitionedBackend(str(tmp_path), TinyDBBackend)
+    assert backend.tracked_channels() == {10, 20, 30}
+    assert backend.open_partitions == 0
+    assert backend.time_counts(20) == {100: 30.0}
+    backend.close()
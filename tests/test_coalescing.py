@@ -0,0 +1,53 @@
+import asyncio
+
+from types import SimpleNamespace
+
+from voice_activity.coalescing import (
+    VoiceCoalescer,
+    event_time,
+    EVENT_TIME,
+)
+from voice_activity.scheduler import Scheduler
+
+GUILD = SimpleNamespace(id=1)
+MEMBER = SimpleNamespace(id=100, guild=GUILD)
+CHAN_A = SimpleNamespace(id=10)
+CHAN_B = SimpleNamespace(id=11)
+
+
+def state(channel=None, self_mute=False):
+    return SimpleNamespace(channel=channel, self_mute=self_mute)
+
+
+def test_noops_are_dropped_and_flaps_merged():
+    delivered = []
+
+    async def emit(member, before, after, timestamp):
+        EVENT_TIME.set(timestamp)
+        delivered.append((before.channel, after.channel, event_time()))
+
+    async def run():
+        scheduler = Scheduler()
+        task = asyncio.create_task(scheduler.run())
+        coalescer = VoiceCoalescer(scheduler, emit, window=0.05)
+        await coalescer.push(MEMBER, state(), state(CHAN_A), 1.0)
+        await coalescer.push(MEMBER, state(CHAN_A), state(CHAN_A, self_mute=True), 2.0)
+        # leave and rejoin within the window is not delivered at all
+        await coalescer.push(MEMBER, state(CHAN_A), state(), 3.0)
+        await coalescer.push(MEMBER, state(), state(CHAN_A), 3.01)
+        # joining another channel delivers the held leave first
+        await coalescer.push(MEMBER, state(CHAN_A), state(), 4.0)
+        await coalescer.push(MEMBER, state(), state(CHAN_B), 4.01)
+        # leave not followed by a rejoin is delivered after the window
+        await coalescer.push(MEMBER, state(CHAN_B), state(), 5.0)
+        assert len(delivered) == 3
+        await asyncio.sleep(0.1)
+        task.cancel()
+
+    asyncio.run(run())
+    assert delivered == [
+        (None, CHAN_A, 1.0),
+        (CHAN_A, None, 4.0),
+        (None, CHAN_B, 4.01),
+        (CHAN_B, None, 5.0),
+    ]
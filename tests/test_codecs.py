@@ -0,0 +1,86 @@
+import json
+
+import pytest
+
+from voice_activity.backends.migration import recode_tinydb
+from voice_activity.backends.tinydb_backend import TinyDBBackend
+from voice_activity.config import Config
+from voice_activity.modules.storage import create_backend
+from voice_activity.tinydb_exts.codecs import (
+    IdSetCodec,
+    SecondsMapCodec,
+)
+
+
+@pytest.mark.parametrize("binary", [False, True])
+def test_codecs_round_trip(binary):
+    ids = IdSetCodec(binary)
+    assert ids.deserialize(ids.serialize({2 ** 63 + 5, 1, 700})) == {2 ** 63 + 5, 1, 700}
+    assert ids.deserialize(ids.serialize(set())) == set()
+    seconds = SecondsMapCodec(binary)
+    encoded = seconds.serialize({"10": 59.6, str(2 ** 60): 3.2})
+    assert seconds.deserialize(encoded) == {"10": 60.0, str(2 ** 60): 3.0}
+
+
+def test_codecs_read_plain_values():
+    assert IdSetCodec().deserialize([1, 2]) == {1, 2}
+    assert SecondsMapCodec().deserialize({"1": 2.5}) == {"1": 2.5}
+
+
+def fill(backend):
+    backend.track_channel(1, 10)
+    backend.add_subscriber(1, 10, 100)
+    backend.add_subscriber(1, 10, 101)
+    backend.record_sessions([(1, 10, 100, 1000.0, 1090.0)], [], {})
+
+
+def test_recode_to_packed_tables(tmp_path):
+    backend = TinyDBBackend(str(tmp_path))
+    fill(backend)
+    backend.close()
+
+    assert recode_tinydb(str(tmp_path), packed_tables=("subscriptions", "time_counts")) == [str(tmp_path)]
+    backend = TinyDBBackend(str(tmp_path), packed_tables=("subscriptions", "time_counts"))
+    assert backend.subscribers(10) == {100, 101}
+    assert backend.subscriptions(101) == {10}
+    assert backend.time_counts(10) == {100: 90.0}
+    backend.close()
+    assert '"value": [' not in (tmp_path / "subs.db").read_text()
+    [counts] = json.loads((tmp_path / "time_count.db").read_text())["time_counts"].values()
+    assert isinstance(counts["value"], str)
+
+
+def test_msgpack_storage(tmp_path):
+    pytest.importorskip("msgpack")
+    backend = TinyDBBackend(str(tmp_path))
+    fill(backend)
+    backend.close()
+    recode_tinydb(str(tmp_path), "msgpack", ("subscriptions",))
+    backend = TinyDBBackend(str(tmp_path), storage_format="msgpack", packed_tables=("subscriptions",))
+    assert backend.subscribers(10) == {100, 101}
+    assert backend.time_counts(10) == {100: 90.0}
+    backend.close()
+
+
+@pytest.mark.parametrize("storage_format", ["json", "msgpack"])
+def test_migration_from_packed_tables(tmp_path, storage_format):
+    if storage_format == "msgpack":
+        pytest.importorskip("msgpack")
+    packed = ("subscriptions", "time_counts")
+    backend = TinyDBBackend(str(tmp_path), storage_format=storage_format, packed_tables=packed)
+    fill(backend)
+    backend.close()
+    config = Config()
+    config.data_directory = str(tmp_path)
+    config.storage_backend = "sqlite"
+    config.tinydb_format = storage_format
+    config.tinydb_packed_tables = packed
+    backend = create_backend(config)
+    assert backend.subscribers(10) == {100, 101}
+    assert backend.time_counts(10) == {100: 90.0}
+    backend.close()
+
+
+def test_unknown_packed_table(tmp_path):
+    with pytest.raises(ValueError):
+        TinyDBBackend(str(tmp_path), packed_tables=("rollups",))
@@ -0,0 +1,39 @@
+import pytest
+
+from voice_activity.abc import AbstractCommand
+from voice_activity.commands import (
+    ArgumentError,
+    ArgumentParser,
+    CommandRouter,
+)
+
+
+class Track(AbstractCommand):
+
+    def name(self):
+        return "track"
+
+    async def run(self, ctx, chan, limit: int = 10):
+        pass
+
+
+def test_parser_converts_and_checks_arguments():
+    parser = ArgumentParser(Track(None))
+    assert parser.parse(" General") == ["General"]
+    assert parser.parse('"Voice Channel" 5') == ["Voice Channel", 5]
+    with pytest.raises(ArgumentError):
+        parser.parse("")
+    with pytest.raises(ArgumentError):
+        parser.parse("General five")
+
+
+def test_router_matches_longest_name_on_word_boundary():
+    router = CommandRouter()
+    for name in ("track", "track-stats", "t"):
+        router.add(name, name, None)
+    assert router.match("track General") == ("track", None, " General")
+    assert router.match("track-stats General") == ("track-stats", None, " General")
+    assert router.match("track-stats") == ("track-stats", None, "")
+    assert router.match("t x") == ("t", None, " x")
+    assert router.match("tracking") is None
+    assert router.match("hello") is None
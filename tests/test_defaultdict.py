@@ -0,0 +1,63 @@
+from tinydb import TinyDB
+from tinydb.storages import MemoryStorage
+
+from voice_activity.tinydb_exts.defaultdict import (
+    CachedDefaultDict,
+    DefaultDict,
+)
+
+
+def make_db():
+    return TinyDB(storage=MemoryStorage)
+
+
+def test_cached_reads_existing_values():
+    db = make_db()
+    DefaultDict(db, set, list, set)[1] = {1, 2}
+    cached = CachedDefaultDict(db, set, list, set)
+    assert cached[1] == {1, 2}
+    assert cached[2] == set()
+    assert 1 in cached and 2 not in cached
+
+
+def test_cached_writes_are_deferred_until_flush():
+    db = make_db()
+    cached = CachedDefaultDict(db, dict)
+    cached["a"] = {"x": 1}
+    cached["b"] = {}
+    assert len(db) == 0
+    assert cached.dirty == 2
+    cached.flush()
+    assert cached.dirty == 0
+    assert DefaultDict(db, dict)["a"] == {"x": 1}
+    del cached["b"]
+    cached.flush()
+    assert list(DefaultDict(db, dict)) == ["a"]
+
+
+def test_cached_flushes_after_max_dirty():
+    db = make_db()
+    cached = CachedDefaultDict(db, dict, max_dirty=2)
+    cached["a"] = {}
+    assert len(db) == 0
+    cached["b"] = {}
+    assert len(db) == 2
+
+
+def test_cached_flush_is_a_single_write():
+    writes = []
+
+    class CountingStorage(MemoryStorage):
+        def write(self, data):
+            writes.append({name: len(table) for name, table in data.items()})
+            super().write(data)
+
+    db = TinyDB(storage=CountingStorage)
+    cached = CachedDefaultDict(db.table("t"), dict)
+    for key in range(3):
+        cached[key] = {}
+    cached.flush()
+    del cached[0]
+    cached.flush()
+    assert writes == [{"t": 3}, {"t": 2}]
+    assert sorted(DefaultDict(db.table("t"), dict)) == [1, 2]
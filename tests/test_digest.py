@@ -0,0 +1,111 @@
+import asyncio
+
+from types import SimpleNamespace
+
+from voice_activity.digest import ActivityDigest
+from voice_activity.modules.sub import NotificationListener
+from voice_activity.scheduler import Scheduler
+
+
+class Dispatcher:
+
+    def __init__(self):
+        self.sent = []
+
+    def dispatch_each(self, guild, contents):
+        self.sent.append((guild.id, contents))
+
+
+def test_digest_sends_one_message_per_user():
+    dispatcher = Dispatcher()
+    digest = ActivityDigest(dispatcher)
+    guild = SimpleNamespace(id=1)
+    general = SimpleNamespace(id=10, name="General")
+    games = SimpleNamespace(id=20, name="Games")
+    digest.add(guild, general, "ann", {100, 101})
+    digest.add(guild, general, "bob", {100})
+    digest.add(guild, games, "ann", {100})
+    assert len(digest) == 2
+    digest.flush()
+    assert dispatcher.sent == [(1, {
+        100: "Activity since the last digest:\n"
+             "Games: started once by ann\n"
+             "General: started 2 times by ann, bob",
+        101: "Activity since the last digest:\nGeneral: started once by ann",
+    })]
+    assert len(digest) == 0
+    assert digest.flush() == []
+
+
+def test_digest_is_sent_per_guild():
+    dispatcher = Dispatcher()
+    digest = ActivityDigest(dispatcher)
+    digest.add(SimpleNamespace(id=1), SimpleNamespace(id=10, name="General"), "ann", {100})
+    digest.add(SimpleNamespace(id=2), SimpleNamespace(id=20, name="Lobby"), "bob", {100})
+    assert len(digest) == 2
+    digest.flush()
+    assert dispatcher.sent == [
+        (1, {100: "Activity since the last digest:\nGeneral: started once by ann"}),
+        (2, {100: "Activity since the last digest:\nLobby: started once by bob"}),
+    ]
+
+
+def test_digest_is_sent_on_close():
+    sent = []
+
+    class AsyncDispatcher:
+
+        def dispatch_each(self, guild, contents):
+            async def deliver():
+                await asyncio.sleep(0.01)
+                sent.append(contents)
+            return asyncio.ensure_future(deliver())
+
+    async def run():
+        digest = ActivityDigest(AsyncDispatcher())
+        digest.add(SimpleNamespace(id=1), SimpleNamespace(id=10, name="General"), "ann", {100})
+        await digest.close()
+        await digest.close()
+
+    asyncio.run(run())
+    assert sent == [{100: "Activity since the last digest:\nGeneral: started once by ann"}]
+
+
+class Backend:
+    """
+    Hands out its stored sets like the cached backends used to.
+    """
+
+    def __init__(self, subs, digests):
+        self.subs = subs
+        self.digests = digests
+
+    async def subscribers(self, channel_id):
+        return self.subs[channel_id]
+
+    async def digest_subscribers(self, channel_id):
+        return self.digests[channel_id]
+
+
+class ImmediateDispatcher(Dispatcher):
+
+    def dispatch(self, guild, user_ids, content):
+        self.sent.append((guild.id, set(user_ids), content))
+
+
+def test_listener_leaves_the_stored_subscribers_untouched():
+    backend = Backend({10: {100, 101, 102}}, {10: {101}})
+    dispatcher = ImmediateDispatcher()
+    digest = ActivityDigest(dispatcher)
+    bot = SimpleNamespace(scheduler=Scheduler(), storage=SimpleNamespace(backend=backend))
+    listener = NotificationListener(bot, dispatcher, digest)
+    guild = SimpleNamespace(id=1)
+    channel = SimpleNamespace(id=10, name="General", members=[None])
+    member = SimpleNamespace(id=100, name="ann", guild=guild)
+
+    asyncio.run(listener.on_voice_state_update(
+        member, SimpleNamespace(channel=None), SimpleNamespace(channel=channel)))
+    assert backend.subs == {10: {100, 101, 102}}
+    assert backend.digests == {10: {101}}
+    assert [(guild_id, users) for guild_id, users, _ in dispatcher.sent] == [(1, {102})]
+    assert len(digest) == 1
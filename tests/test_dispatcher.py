@@ -0,0 +1,88 @@
+import asyncio
+
+from types import SimpleNamespace
+
+import discord
+
+from voice_activity.dispatcher import NotificationDispatcher
+from voice_activity.members import MemberCache
+
+
+class FakeUser:
+
+    def __init__(self, user_id, fail_times=0):
+        self.id = user_id
+        self.name = str(user_id)
+        self.fail_times = fail_times
+        self.received = []
+
+    async def send(self, content):
+        if self.fail_times:
+            self.fail_times -= 1
+            response = SimpleNamespace(status=429, reason="Too Many Requests", headers={"Retry-After": "0.01"})
+            raise discord.HTTPException(response, "rate limited")
+        self.received.append(content)
+
+
+class FakeGuild:
+
+    id = 1
+
+    def __init__(self, users):
+        self.users = {u.id: u for u in users}
+
+    def get_member(self, user_id):
+        return self.users.get(user_id)
+
+    async def fetch_member(self, user_id):
+        response = SimpleNamespace(status=404, reason="Not Found")
+        raise discord.NotFound(response, "unknown member")
+
+
+def test_dispatch_delivers_to_everyone_and_retries_rate_limited():
+    users = [FakeUser(i) for i in range(20)] + [FakeUser(20, fail_times=1), FakeUser(21, fail_times=5)]
+    guild = FakeGuild(users)
+    dispatcher = NotificationDispatcher(MemberCache(query_members=False), concurrency=4, max_retries=2)
+
+    async def run():
+        return await dispatcher.dispatch(guild, list(guild.users) + [404], "hello")
+
+    stats = asyncio.run(run())
+    assert stats.sent == 21
+    assert stats.failed == 2
+    assert stats.retried == 3
+    assert all(u.received == ["hello"] for u in users[:21])
+
+
+class FetchOnlyGuild:
+
+    id = 2
+
+    def __init__(self):
+        self.fetched = []
+
+    def get_member(self, user_id):
+        return None
+
+    async def query_members(self, user_ids, limit):
+        raise asyncio.TimeoutError()
+
+    async def fetch_member(self, user_id):
+        self.fetched.append(user_id)
+        return FakeUser(user_id)
+
+
+def test_member_cache_fetches_misses_once():
+    guild = FetchOnlyGuild()
+    cache = MemberCache(ttl=60, max_size=3)
+
+    async def run():
+        first = await cache.get_many(guild, [1, 2, 3])
+        second = await cache.get_many(guild, [1, 2, 3])
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert sorted(first) == sorted(second) == [1, 2, 3]
+    assert sorted(guild.fetched) == [1, 2, 3]
+    cache.invalidate(guild.id, 1)
+    assert len(cache) == 2
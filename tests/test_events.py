@@ -0,0 +1,62 @@
+import asyncio
+
+from types import SimpleNamespace
+
+from voice_activity.abc import (
+    AbstractListener,
+    ListenerMode,
+)
+from voice_activity.events import EventBus
+
+
+class Recorder(AbstractListener):
+
+    def __init__(self, calls, name, delay=0, fail=False, veto=None):
+        super().__init__(None)
+        self.calls = calls
+        self.name = name
+        self.delay = delay
+        self.fail = fail
+        self.veto = veto
+
+    async def on_message(self, message):
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("boom")
+        self.calls.append(self.name)
+        return self.veto
+
+
+def test_bus_runs_ordered_first_and_isolates_failures():
+    calls = []
+    slow = Recorder(calls, "slow", delay=1)
+    slow.timeout = 0.05
+    ordered = Recorder(calls, "ordered")
+    ordered.mode = ListenerMode.ORDERED
+    veto = Recorder(calls, "veto", veto=True)
+    veto.mode = ListenerMode.VETO
+    bus = EventBus()
+    for listener in (slow, Recorder(calls, "failing", fail=True), Recorder(calls, "fast"), ordered, veto):
+        bus.add(listener)
+
+    vetoed = asyncio.run(bus.emit("on_message", None))
+    assert vetoed
+    assert calls == ["ordered", "veto", "fast"]
+
+
+def test_bus_filters_by_guild_and_channel():
+    calls = []
+    listener = Recorder(calls, "filtered")
+    listener.guilds = {1}
+    listener.channels = {10}
+    bus = EventBus()
+    bus.add(listener)
+    assert bus.listeners("on_voice_state_update") == []
+
+    async def run():
+        await bus.emit("on_message", None, guild=SimpleNamespace(id=2), channels=(10,))
+        await bus.emit("on_message", None, guild=SimpleNamespace(id=1), channels=(11,))
+        await bus.emit("on_message", None, guild=SimpleNamespace(id=1), channels=(10,))
+
+    asyncio.run(run())
+    assert calls == ["filtered"]
@@ -0,0 +1,60 @@
+import pytest
+
+from voice_activity.abc import StorageDump
+from voice_activity.backends.sqlite_backend import SQLiteBackend
+from voice_activity.backends.tinydb_backend import TinyDBBackend
+from voice_activity.export import (
+    WRITERS,
+    export_storage,
+    import_storage,
+)
+
+
+def make_source(path):
+    backend = SQLiteBackend(str(path))
+    backend.track_channel(1, 10)
+    backend.add_subscriber(1, 10, 100)
+    backend.add_subscriber(1, 10, 102, True)
+    backend.record_sessions(
+        [(1, 10, 1000 + user, 1000.0, 1000.0 + user) for user in range(25)],
+        [(1, 10, 101, 500.0)], {})
+    return backend
+
+
+@pytest.mark.parametrize("fmt", ["csv", "binary", "parquet"])
+def test_export_import_round_trip(tmp_path, fmt):
+    if fmt == "parquet":
+        pytest.importorskip("pyarrow")
+    source = make_source(tmp_path / "source.sqlite3")
+    counts = export_storage(source, str(tmp_path / "out"), [fmt], chunk_size=7)
+    assert counts["time_counts"] == 25
+    target = TinyDBBackend(str(tmp_path))
+    try:
+        import_storage(target, str(tmp_path / "out"), chunk_size=4)
+        assert target.dump().time_counts == source.dump().time_counts
+        assert target.subscribers(10) == {100, 102}
+        assert target.digest_subscribers(10) == {102}
+        assert target.open_sessions(10) == {101: 500.0}
+        # importing again merges the counts
+        import_storage(target, str(tmp_path / "out"))
+        assert target.time_counts(10)[1024] == 48.0
+    finally:
+        target.close()
+        source.close()
+
+
+@pytest.mark.parametrize("fmt", ["csv", "binary"])
+def test_import_of_exports_without_digest_mode(tmp_path, fmt):
+    schema = (("guild", "q"), ("channel", "q"), ("user", "q"))
+    writer = WRITERS[fmt](str(tmp_path / ("subscriptions." + ("csv" if fmt == "csv" else "bin"))), schema)
+    writer.write([(1, 10, 100), (1, 10, 101)])
+    writer.close()
+    target = SQLiteBackend(str(tmp_path / "target.sqlite3"))
+    target.add_subscriber(1, 10, 101, True)
+    try:
+        assert import_storage(target, str(tmp_path)) == {"subscriptions": 2}
+        assert target.subscribers(10) == {100, 101}
+        assert target.digest_subscribers(10) == set()
+        assert target.dump() == StorageDump([(1, 10, 100, 0), (1, 10, 101, 0)], [], [], [], [])
+    finally:
+        target.close()
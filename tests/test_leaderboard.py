@@ -0,0 +1,71 @@
+import asyncio
+
+from types import SimpleNamespace
+
+from voice_activity.leaderboard import (
+    format_duration,
+    top_users,
+)
+from voice_activity.modules.time_count import ShowStats
+from voice_activity.response_cache import ResponseCache
+
+
+def test_format_duration_does_not_wrap_at_a_day():
+    assert format_duration(59.9) == "0:00:59"
+    assert format_duration(3661) == "1:01:01"
+    assert format_duration(30 * 3600 + 5) == "30:00:05"
+
+
+def test_top_users():
+    stats = {user: float(user % 7) for user in range(100)}
+    top = top_users(stats, 3)
+    assert [seconds for _, seconds in top] == [6.0, 6.0, 6.0]
+
+
+class Channel:
+
+    def __init__(self):
+        self.embeds = []
+
+    async def send(self, content=None, embed=None):
+        self.embeds.append(embed)
+
+
+def run_stats(order):
+    stats = {user: user * 3600.0 for user in range(1, 31)}
+
+    async def is_tracked(chan_id):
+        return True
+
+    async def time_counts(chan_id):
+        return dict(stats)
+
+    async def get_many(guild, user_ids):
+        requested.append(list(user_ids))
+        return {user: SimpleNamespace(name=f"user {user}") for user in user_ids}
+
+    requested = []
+    bot = SimpleNamespace(
+        storage=SimpleNamespace(backend=SimpleNamespace(is_tracked=is_tracked)),
+        members=SimpleNamespace(get_many=get_many),
+        responses=ResponseCache())
+    command = ShowStats(bot, SimpleNamespace(time_counts=time_counts), size=10, page_size=4)
+    chan = Channel()
+    guild = SimpleNamespace(id=1, voice_channels=[SimpleNamespace(id=5, name="General")])
+    asyncio.run(command.run({"user": None, "guild": guild, "resp_chan": chan}, "General", None, order))
+    return chan.embeds, requested
+
+
+def test_stats_are_paginated_by_time():
+    embeds, requested = run_stats("time")
+    assert len(embeds) == 3
+    assert embeds[0].description.splitlines()[0] == "1. user 30: 30:00:00"
+    assert embeds[2].footer.text == "page 3/3, top 10 of 30 users"
+    # members are resolved page by page, only for the top users
+    assert requested == [[30, 29, 28, 27], [26, 25, 24, 23], [22, 21]]
+
+
+def test_stats_sorted_by_name():
+    embeds, requested = run_stats("name")
+    assert embeds[0].description.splitlines()[0] == "10. user 21: 21:00:00"
+    assert len(requested) == 1
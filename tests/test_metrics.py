@@ -0,0 +1,55 @@
+import asyncio
+
+from voice_activity.metrics import (
+    Registry,
+    serve_metrics,
+)
+
+
+def test_histogram_is_rendered_cumulatively():
+    registry = Registry()
+    hist = registry.histogram("cmd_seconds", "Command time.", ["command"], buckets=(0.1, 1.0))
+    hist.observe(0.05, "sub")
+    hist.observe(0.5, "sub")
+    hist.observe(5.0, "sub")
+    registry.counter("calls", "Calls.", ["endpoint"]).inc('GET "x"')
+    assert registry.histogram("cmd_seconds", "Command time.") is hist
+    assert hist.count("sub") == 3
+    lines = registry.render().splitlines()
+    assert 'cmd_seconds_bucket{command="sub",le="0.1"} 1' in lines
+    assert 'cmd_seconds_bucket{command="sub",le="1.0"} 2' in lines
+    assert 'cmd_seconds_bucket{command="sub",le="+Inf"} 3' in lines
+    assert 'cmd_seconds_count{command="sub"} 3' in lines
+    assert 'calls_total{endpoint="GET \\"x\\""} 1' in lines
+
+
+def test_metrics_endpoint():
+    registry = Registry()
+    registry.gauge("queue_depth", "Queue depth.", lambda: 7)
+
+    async def fetch():
+        server = await asyncio.start_server(lambda r, w: None, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        server.close()
+        await server.wait_closed()
+        task = asyncio.create_task(serve_metrics("127.0.0.1", port, registry))
+        for _ in range(100):
+            try:
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                break
+            except OSError:
+                await asyncio.sleep(0.01)
+        writer.write(b"GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n")
+        response = await reader.read()
+        writer.close()
+        task.cancel()
+        return response.decode()
+
+    response = asyncio.run(fetch())
+    assert response.startswith("HTTP/1.1 200 OK")
+    assert "queue_depth 7" in response
+
+
+def test_modules_share_metrics_by_name():
+    from voice_activity import bot, members
+    assert members.DISCORD_API_CALLS is bot.DISCORD_API_CALLS
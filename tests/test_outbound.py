@@ -0,0 +1,69 @@
+import asyncio
+
+from voice_activity.outbound import (
+    Outbox,
+    split_message,
+)
+
+
+class Message:
+
+    def __init__(self, channel, content, embed):
+        self.channel = channel
+        self.content = content
+        self.embed = embed
+
+
+class Channel:
+
+    def __init__(self, id=1):
+        self.id = id
+        self.sent = []
+
+    async def send(self, content=None, embed=None):
+        self.sent.append((content, embed))
+        return Message(self, content, embed)
+
+
+def test_split_message_between_lines():
+    text = "\n".join(["a" * 30] * 10)
+    chunks = split_message(text, limit=100)
+    assert chunks == ["\n".join(["a" * 30] * 3)] * 3 + ["a" * 30]
+    assert split_message("b" * 250, limit=100) == ["b" * 100, "b" * 100, "b" * 50]
+    assert split_message("short") == ["short"]
+
+
+def test_quick_replies_are_coalesced():
+    chan = Channel()
+
+    async def run():
+        outbox = Outbox(coalesce_window=0.01)
+        out = outbox.channel(chan)
+        first = await out.send("one")
+        await out.send("two")
+        await out.send(embed="embed")
+        await out.send("three")
+        await outbox.close()
+        return first.result()
+
+    message = asyncio.run(run())
+    assert chan.sent == [("one\ntwo", None), (None, "embed"), ("three", None)]
+    assert message.content == "one\ntwo"
+
+
+def test_sends_wait_for_the_rate_limit():
+    chan = Channel()
+
+    async def run():
+        loop = asyncio.get_event_loop()
+        outbox = Outbox(rate=2, per=0.2, coalesce_window=0)
+        out = outbox.channel(chan)
+        start = loop.time()
+        await out.send(embed=1)
+        await out.send(embed=2)
+        await out.send(embed=3)
+        await outbox.close()
+        return loop.time() - start
+
+    assert asyncio.run(run()) >= 0.09
+    assert len(chan.sent) == 3
@@ -0,0 +1,37 @@
+import pytest
+
+from voice_activity.plugins import (
+    MANIFEST,
+    PluginRegistry,
+    PluginSpec,
+)
+
+
+def test_dependencies_start_first():
+    registry = PluginRegistry([
+        PluginSpec("sub", "x:Sub", requires=("storage", "members")),
+        PluginSpec("members", "x:Members"),
+        PluginSpec("storage", "x:Storage", requires=("metrics",)),
+        PluginSpec("metrics", "x:Metrics"),
+        PluginSpec("unused", "x:Unused"),
+    ])
+    names = [spec.name for spec in registry.resolve(["sub"])]
+    assert names == ["metrics", "storage", "members", "sub"]
+    assert len(registry.resolve()) == 5
+
+
+def test_unknown_plugins_and_cycles_are_rejected():
+    registry = PluginRegistry([
+        PluginSpec("a", "x:A", requires=("b",)),
+        PluginSpec("b", "x:B", requires=("a",)),
+        PluginSpec("c", "x:C", requires=("missing",)),
+    ])
+    with pytest.raises(ValueError, match="cycle"):
+        registry.resolve(["a"])
+    with pytest.raises(ValueError, match="required by 'c'"):
+        registry.resolve(["c"])
+
+
+def test_manifest_plugins_can_be_loaded():
+    for spec in PluginRegistry(MANIFEST).resolve():
+        assert spec.load().__name__ == spec.path.split(":")[1]
@@ -0,0 +1,23 @@
+import asyncio
+
+from types import SimpleNamespace
+
+from voice_activity.presence import Presence
+
+
+def test_presence_tracks_channels_and_members():
+    sessions = SimpleNamespace(open_sessions=lambda chan_id: {100: 5.0})
+
+    async def tracked_channels():
+        return {10, 20}
+
+    presence = Presence(sessions)
+    asyncio.run(presence.load(SimpleNamespace(tracked_channels=tracked_channels)))
+    snapshot = presence.tracked
+    presence.track(30)
+    presence.untrack(10)
+    assert snapshot == {10, 20}
+    assert set(presence) == {20, 30}
+    assert 10 not in presence and 30 in presence
+    assert presence.members(20) == {100: 5.0}
+    assert presence.members(10) == {}
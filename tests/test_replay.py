@@ -0,0 +1,51 @@
+import asyncio
+
+from benchmarks.replay import (
+    Scenario,
+    World,
+    make_config,
+    replay,
+)
+from voice_activity.backends.partitioned_backend import PartitionedBackend
+from voice_activity.backends.sqlite_backend import SQLiteBackend
+from voice_activity.backends.tinydb_backend import TinyDBBackend
+
+
+def test_replay_is_reproducible_and_tracks_sessions(tmp_path):
+    scenario = Scenario(guilds=3, channels=3, members=10, events=300, tracked=1.0, seed=7)
+    results = []
+    for run in ("a", "b"):
+        data_directory = tmp_path / run
+        data_directory.mkdir()
+        result, _ = asyncio.run(replay(scenario, make_config(str(data_directory), "sqlite")))
+        results.append(result)
+    assert results[0].events == results[1].events == 300
+    assert results[0].voice_events == results[1].voice_events
+    assert results[0].bytes_written > 0
+
+    # replaying the world again gives who is where at the end
+    world = World(scenario)
+    world.setup()
+    for _ in world.events():
+        pass
+    present = sorted(
+        member.id for guild in world.guilds
+        for chan in guild.voice_channels for member in chan.members)
+    backend = SQLiteBackend(str(tmp_path / "b" / "voice_activity.sqlite3"))
+    try:
+        assert sorted(row[2] for row in backend.all_open_sessions()) == present
+        assert sum(len(backend.time_counts(chan)) for chan in backend.tracked_channels()) > 0
+    finally:
+        backend.close()
+
+
+def test_replay_on_partitioned_backend(tmp_path):
+    scenario = Scenario(guilds=3, channels=2, members=5, events=100, tracked=1.0, seed=3)
+    result, _ = asyncio.run(replay(scenario, make_config(str(tmp_path), "partitioned")))
+    assert result.events == 100
+    backend = PartitionedBackend(str(tmp_path), TinyDBBackend)
+    try:
+        assert len(backend.tracked_channels()) == 6
+        assert sum(len(backend.time_counts(chan)) for chan in backend.tracked_channels()) > 0
+    finally:
+        backend.close()
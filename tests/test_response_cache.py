@@ -0,0 +1,54 @@
+import asyncio
+
+from voice_activity.response_cache import ResponseCache
+
+
+class Channel:
+
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, content=None, embed=None):
+        self.sent.append(content)
+
+
+def respond(cache, key, tags, computed, text):
+    async def compute(resp_chan):
+        computed.append(key)
+        await resp_chan.send(text)
+
+    chan = Channel()
+    asyncio.run(cache.respond(key, tags, chan, compute))
+    return chan.sent
+
+
+def test_responses_are_replayed_until_invalidated():
+    cache = ResponseCache()
+    computed = []
+    assert respond(cache, ("stats", 1, ("a",)), [("channel", 5)], computed, "x") == ["x"]
+    assert respond(cache, ("stats", 1, ("a",)), [("channel", 5)], computed, "y") == ["x"]
+    cache.invalidate(("channel", 6))
+    assert respond(cache, ("stats", 1, ("a",)), [("channel", 5)], computed, "y") == ["x"]
+    cache.invalidate(("channel", 5))
+    assert respond(cache, ("stats", 1, ("a",)), [("channel", 5)], computed, "y") == ["y"]
+    assert len(computed) == 2
+
+
+def test_least_recently_used_are_evicted():
+    cache = ResponseCache(max_size=2)
+    computed = []
+    for key in ("a", "b", "a", "c", "a", "b"):
+        respond(cache, key, [], computed, key)
+    assert computed == ["a", "b", "c", "b"]
+    assert len(cache) == 2
+
+
+def test_response_invalidated_while_computed_is_not_cached():
+    cache = ResponseCache()
+
+    async def compute(resp_chan):
+        cache.invalidate(("channel", 5))
+        await resp_chan.send("stale")
+
+    asyncio.run(cache.respond("key", [("channel", 5)], Channel(), compute))
+    assert len(cache) == 0
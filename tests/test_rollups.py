@@ -0,0 +1,52 @@
+import pytest
+
+from voice_activity.rollups import (
+    DAY,
+    HOUR,
+    WEEK,
+    bucket_start,
+    expired_before,
+    format_window,
+    granularity_for,
+    parse_window,
+    split_session,
+)
+
+# Monday, 2021-01-04 00:00:00 UTC
+MONDAY = 1609718400
+
+
+def test_buckets_are_aligned():
+    assert bucket_start(MONDAY + 3 * DAY + 5, WEEK) == MONDAY
+    assert bucket_start(MONDAY + 90 * 60, HOUR) == MONDAY + HOUR
+    assert bucket_start(MONDAY - 1, DAY) == MONDAY - DAY
+
+
+def test_session_is_split_on_bucket_boundaries():
+    start = MONDAY - 30 * 60
+    end = MONDAY + HOUR + 15 * 60
+    assert split_session(start, end, HOUR) == [
+        (MONDAY - HOUR, 30 * 60), (MONDAY, HOUR), (MONDAY + HOUR, 15 * 60)]
+    assert split_session(start, end, DAY) == [(MONDAY - DAY, 30 * 60), (MONDAY, HOUR + 15 * 60)]
+    assert split_session(start, end, WEEK) == [(MONDAY - WEEK, 30 * 60), (MONDAY, HOUR + 15 * 60)]
+    assert split_session(start, start, HOUR) == []
+
+
+def test_windows():
+    assert parse_window("7d") == 7 * DAY
+    assert format_window(parse_window("24h")) == "1d"
+    assert granularity_for(parse_window("12h")) == HOUR
+    assert granularity_for(parse_window("30d")) == DAY
+    assert granularity_for(parse_window("52w")) == WEEK
+    with pytest.raises(ValueError):
+        parse_window("yesterday")
+
+
+def test_buckets_expire_after_their_window():
+    assert expired_before(HOUR, MONDAY + 2 * DAY + 90 * 60) == MONDAY + HOUR
+    assert expired_before(DAY, MONDAY + 8 * WEEK + HOUR) == MONDAY
+    assert expired_before(WEEK, MONDAY) is None
+    # the windows answered by a granularity never reach expired buckets
+    now = MONDAY + 12345
+    assert expired_before(HOUR, now) <= bucket_start(now - 2 * DAY, granularity_for(2 * DAY))
+    assert expired_before(DAY, now) <= bucket_start(now - 8 * WEEK, granularity_for(8 * WEEK))
@@ -0,0 +1,57 @@
+import asyncio
+
+from voice_activity.scheduler import Scheduler
+
+
+def test_scheduler_fires_in_deadline_order():
+    fired = []
+
+    async def run():
+        scheduler = Scheduler()
+        task = asyncio.create_task(scheduler.run())
+        scheduler.schedule("b", 0.02, fired.append, "b")
+        scheduler.schedule("a", 0.01, fired.append, "a")
+        scheduler.schedule("c", 0.01, fired.append, "c")
+        assert scheduler.cancel("c")
+        assert not scheduler.cancel("c")
+        await asyncio.sleep(0.05)
+        assert len(scheduler) == 0
+        task.cancel()
+        scheduler.close()
+
+    asyncio.run(run())
+    assert fired == ["a", "b"]
+
+
+def test_scheduler_reschedule_replaces_timer():
+    fired = []
+
+    async def run():
+        scheduler = Scheduler()
+        task = asyncio.create_task(scheduler.run())
+        scheduler.schedule("key", 0.01, fired.append, 1)
+        scheduler.schedule("key", 0.03, fired.append, 2)
+        await asyncio.sleep(0.02)
+        assert fired == [] and "key" in scheduler
+        await asyncio.sleep(0.03)
+        assert "key" not in scheduler
+        task.cancel()
+        scheduler.close()
+
+    asyncio.run(run())
+    assert fired == [2]
+
+
+def test_scheduler_timer_without_callback_expires():
+
+    async def run():
+        scheduler = Scheduler()
+        task = asyncio.create_task(scheduler.run())
+        scheduler.schedule("cooldown", 0.01)
+        assert "cooldown" in scheduler
+        await asyncio.sleep(0.03)
+        assert "cooldown" not in scheduler
+        task.cancel()
+        scheduler.close()
+
+    asyncio.run(run())
@@ -0,0 +1,127 @@
+import asyncio
+import time
+
+from types import SimpleNamespace
+
+from voice_activity.backends.async_storage import AsyncStorage
+from voice_activity.backends.sqlite_backend import SQLiteBackend
+from voice_activity.modules.time_count import TimeListener
+from voice_activity.presence import Presence
+from voice_activity.response_cache import ResponseCache
+from voice_activity.session_log import SessionLog
+
+
+def test_session_log_replays_and_compacts(tmp_path):
+    log_path = str(tmp_path / "sessions.log")
+    storage = AsyncStorage(SQLiteBackend(str(tmp_path / "test.sqlite3")))
+    storage.backend.track_channel(1, 10)
+
+    async def first_run():
+        log = SessionLog(log_path, storage)
+        await log.load()
+        await log.join(1, 10, 100, 1000.0)
+        assert await log.leave(1, 10, 100, 1060.0) == 60.0
+        assert await log.leave(1, 10, 100, 1070.0) is None
+        await log.join(1, 10, 101, 1100.0)
+        assert await log.time_counts(10) == {100: 60.0}
+        # crash, nothing was compacted
+
+    async def second_run():
+        log = SessionLog(log_path, storage)
+        await log.load()
+        assert log.pending_records == 3
+        assert log.open_sessions(10) == {101: 1100.0}
+        await log.compact()
+        assert log.pending_records == 0
+        assert storage.backend.time_counts(10) == {100: 60.0}
+        await log.leave(1, 10, 101, 1200.0)
+        await log.close()
+
+    async def third_run():
+        log = SessionLog(log_path, storage)
+        await log.load()
+        assert log.pending_records == 0
+        assert await log.time_counts(10) == {100: 60.0, 101: 100.0}
+        assert log.open_sessions(10) == {}
+
+    asyncio.run(first_run())
+    asyncio.run(second_run())
+    asyncio.run(third_run())
+    storage.close()
+
+
+def test_session_log_recovers_in_one_compaction(tmp_path):
+    storage = AsyncStorage(SQLiteBackend(str(tmp_path / "test.sqlite3")))
+    storage.backend.track_channel(1, 10)
+    storage.backend.record_sessions([], [(1, 10, 100, 1000.0), (1, 10, 101, 1000.0)], {})
+
+    async def run():
+        log = SessionLog(str(tmp_path / "sessions.log"), storage)
+        await log.load()
+        # 102 had no open session, its leave is ignored
+        await log.recover(
+            [(1, 10, 100, 1030.0), (1, 10, 102, 1030.0)],
+            [(1, 10, 103, 1100.0)])
+        assert log.pending_records == 0
+        assert log.open_sessions(10) == {101: 1000.0, 103: 1100.0}
+        await log.close()
+
+    asyncio.run(run())
+    assert storage.backend.time_counts(10) == {100: 30.0}
+    assert sorted(storage.backend.open_sessions(10)) == [101, 103]
+    storage.close()
+
+
+def test_session_log_keeps_order_of_concurrent_writes(tmp_path):
+    log_path = str(tmp_path / "sessions.log")
+    storage = AsyncStorage(SQLiteBackend(str(tmp_path / "test.sqlite3")))
+    storage.backend.track_channel(1, 10)
+
+    async def first_run():
+        log = SessionLog(log_path, storage, max_records=50)
+        await log.load()
+        await asyncio.gather(*(log.join(1, 10, user, 1000.0 + user) for user in range(200)))
+        await asyncio.gather(*(log.leave(1, 10, user, 2000.0) for user in range(0, 200, 2)))
+        # crash, whatever was not compacted is in the log
+
+    async def second_run():
+        log = SessionLog(log_path, storage)
+        await log.load()
+        assert log.open_sessions(10) == {user: 1000.0 + user for user in range(1, 200, 2)}
+        assert await log.time_counts(10) == {user: 1000.0 - user for user in range(0, 200, 2)}
+        await log.close()
+
+    asyncio.run(first_run())
+    asyncio.run(second_run())
+    storage.close()
+
+
+def test_sessions_are_recovered_after_the_log_is_loaded(tmp_path):
+    storage = AsyncStorage(SQLiteBackend(str(tmp_path / "test.sqlite3")))
+    storage.backend.track_channel(1, 10)
+    now = time.time()
+    storage.backend.record_sessions([], [(1, 10, 100, now - 100)], {"heartbeat": now})
+    channel = SimpleNamespace(id=10, guild=SimpleNamespace(id=1), members=[SimpleNamespace(id=101)])
+    bot = SimpleNamespace(
+        storage=SimpleNamespace(backend=storage),
+        get_channel={10: channel}.get,
+        responses=ResponseCache(),
+        add_background_task=lambda *args: None,
+        add_cleanup=lambda func: None)
+
+    async def run():
+        log = SessionLog(str(tmp_path / "sessions.log"), storage)
+        presence = Presence(log)
+        listener = TimeListener(bot, presence, log, 60, "heartbeat")
+        # connected before the log finished loading
+        ready = asyncio.ensure_future(listener.on_ready())
+        await asyncio.sleep(0.01)
+        await log.load()
+        await ready
+        await log.close()
+
+    asyncio.run(run())
+    # 100 left while the bot was disconnected, 101 joined
+    assert storage.backend.open_sessions(10).keys() == {101}
+    assert 100 in storage.backend.time_counts(10)
+    storage.close()
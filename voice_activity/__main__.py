@@ -1,25 +1,98 @@
+import argparse
 import dotenv
 import os
 import logging
 
 import voice_activity
-import voice_activity.modules
 from voice_activity.config import Config
+from voice_activity.export import (
+    WRITERS,
+    export_storage,
+    import_storage,
+)
+from voice_activity.backends.migration import recode_tinydb
+from voice_activity.launcher import run_sharded
+from voice_activity.modules.storage import create_backend
 
-logging.basicConfig(level=logging.DEBUG)
 LOGGER = logging.getLogger(__name__)
 
 
-def main():
+def run(config, args):
     dotenv.load_dotenv()
     token = os.getenv("BOT_TOKEN")
     if token is None:
         raise RuntimeError("BOT_TOKEN env variable has to be set")
     LOGGER.info("Running bot...")
-    config = Config()
+    if config.shard_count > 1:
+        run_sharded(token, config)
+        return
     bot = voice_activity.bot.create_bot(config=config)
     bot.run(token)
 
 
+def export(config, args):
+    backend = create_backend(config)
+    try:
+        counts = export_storage(backend, args.directory, args.format, args.chunk_size)
+    finally:
+        backend.close()
+    for table, count in counts.items():
+        print(f"{table}: {count} rows")
+
+
+def import_(config, args):
+    backend = create_backend(config)
+    try:
+        counts = import_storage(backend, args.directory, args.chunk_size)
+    finally:
+        backend.close()
+    for table, count in counts.items():
+        print(f"{table}: {count} rows")
+
+
+def recode(config, args):
+    directories = recode_tinydb(config.data_directory, config.tinydb_format, config.tinydb_packed_tables)
+    print(f"rewrote {len(directories)} directories")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m voice_activity")
+    parser.add_argument("--data-directory", help="overrides the configured data directory")
+    commands = parser.add_subparsers(dest="command")
+    commands.add_parser("run", help="run the bot (default)").set_defaults(func=run)
+
+    export_parser = commands.add_parser(
+        "export", help="export the stored data, the bot should not be running")
+    export_parser.add_argument("directory")
+    export_parser.add_argument(
+        "--format", action="append", choices=sorted(WRITERS),
+        help="can be repeated, defaults to csv and parquet if pyarrow is installed or binary if not")
+    export_parser.set_defaults(func=export)
+
+    import_parser = commands.add_parser(
+        "import", help="merge exported data into the storage, the bot should not be running")
+    import_parser.add_argument("directory")
+    import_parser.set_defaults(func=import_)
+
+    commands.add_parser(
+        "recode", help="rewrite the TinyDB files with the configured format and packed tables, "
+                       "the bot should not be running",
+    ).set_defaults(func=recode)
+
+    for sub in (export_parser, import_parser):
+        sub.add_argument("--chunk-size", type=int, default=10000, help="rows held in memory at once")
+    parser.set_defaults(func=run)
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    config = Config()
+    if args.data_directory is not None:
+        config.data_directory = args.data_directory
+    logging.basicConfig(level=config.log_level)
+    args.func(config, args)
+
+
 if __name__ == '__main__':
     main()
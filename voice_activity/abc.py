@@ -1,5 +1,7 @@
+import enum
 import inspect
 
+from collections import namedtuple
 from abc import (
     ABC,
     abstractmethod,
@@ -28,6 +30,12 @@ class AbstractCommand(ABC):
         """
         ...
 
+    def aliases(self):
+        """
+        Other names the command can be invoked with.
+        """
+        return ()
+
     @abstractmethod
     async def run(self, ctx, *args):
         ...
@@ -43,30 +51,22 @@ class AbstractCommand(ABC):
         if len(sig.parameters) < 2:
             raise TypeError(
                 "Commands `run` method should take at least two arguments, `self` and `ctx`")
+        # converters of the arguments after `self` and `ctx`
+        # and how many of them are required, the argument
+        # parsers are built from these when commands are added.
         conventers = []
-        for (name, param) in sig.parameters.items():
+        required = 0
+        for param in list(sig.parameters.values())[2:]:
+            if param.kind == param.VAR_POSITIONAL:
+                raise TypeError(
+                    "Commands `run` method cannot take variable number of arguments")
             conv = param.annotation
             if conv is inspect.Signature.empty:
                 conv = _id_conv
             conventers.append(conv)
-        cls._subclasses[cls] = conventers
-
-        old_run = cls.run
-        async def run(self, *args):
-            conventers = self._subclasses[self.__class__]
-            ctx, *args = args
-            if len(conventers)-2 != len(args):
-                await ctx['user'].send(
-                    "wrong number of arguments, expected {} got {}".format(
-                        len(conventers)-2, len(args)))
-                return
-            try:
-                args = [conv(arg) for (conv, arg) in zip(conventers, args)]
-            except ValueError as e:
-                ctx["user"].send(str(e))
-            await old_run(self, ctx, *args)
-
-        cls.run = run
+            if param.default is inspect.Parameter.empty:
+                required += 1
+        cls._subclasses[cls] = (conventers, required)
 
     async def __call__(self, *args):
         await self.run(*args)
@@ -76,20 +76,258 @@ class AbstractCommand(ABC):
         return cls._subclasses.keys()
 
 
+class ListenerMode(enum.Enum):
+    # awaited one after another, before the concurrent listeners
+    ORDERED = "ordered"
+    # like ordered but returning True from `on_message`
+    # prevents the bot from handling the message
+    VETO = "veto"
+    # awaited concurrently with the other concurrent listeners
+    CONCURRENT = "concurrent"
+    # started in the background, nobody waits for them
+    FIRE_AND_FORGET = "fire_and_forget"
+
+
 class AbstractListener(ABC):
+    """
+    Base class for the bot event listeners.
+
+    Listener is only called for the events it overrides the
+    handlers of. `guilds` and `channels` can be set to containers
+    of ids to only receive the events from those guilds or
+    concerning those channels, None means no filtering. Events which
+    do not concern any channel, like `on_ready`, are not filtered
+    by `channels`.
+    Handlers running longer than `timeout` seconds are cancelled.
+    """
+
+    mode = ListenerMode.CONCURRENT
+    timeout = 30
+    guilds = None
+    channels = None
 
     def __init__(self, bot):
         self._bot = bot
 
+    async def on_ready(self):
+        return None
+
     async def on_message(self, message) -> bool:
         return None
 
     async def on_voice_state_update(self, member, before, after) -> bool:
         return None
 
+    async def on_member_update(self, before, after):
+        return None
+
+    async def on_member_remove(self, member):
+        return None
+
 
 class AbstractPlugin(ABC):
 
-    auto_discovery = True
+    # names of the plugins which have to be started before this one,
+    # only used for plugins installed as entry points, the ones shipped
+    # with the bot declare it in `voice_activity.plugins.MANIFEST`
+    requires = ()
 
     def __init__(self, bot, *args, **kwargs): ...
+
+
+# Whole contents of a storage backend as lists of rows:
+#   subscriptions - (guild, channel, user, digest), digest is 1 for the digest mode
+#   tracked_channels - (guild, channel)
+#   open_sessions - (guild, channel, user, joined_at)
+#   time_counts - (guild, channel, user, seconds)
+#   rollups - (guild, channel, user, granularity, bucket, seconds)
+StorageDump = namedtuple(
+    "StorageDump",
+    ["subscriptions", "tracked_channels", "open_sessions", "time_counts", "rollups"],
+    defaults=[()])
+
+
+class AbstractStorageBackend(ABC):
+    """
+    Persistence used by the plugins.
+
+    All of the ids are discord snowflakes (ints). Channel ids
+    are globally unique so lookups are done by channel alone,
+    guild id is stored alongside so the data can be partitioned.
+    Guild id 0 marks rows for which the guild is not known (yet).
+    Timestamps are unix timestamps and durations are in seconds.
+    Returned sets and dicts belong to the caller, they are handed to
+    the event loop while the storage thread keeps writing.
+    """
+
+    @abstractmethod
+    def subscribers(self, channel_id) -> set:
+        """
+        Returns ids of the users subscribed to the channel.
+        """
+        ...
+
+    @abstractmethod
+    def add_subscriber(self, guild_id, channel_id, user_id, digest=False):
+        """
+        Subscribes the user or changes their delivery mode, with
+        `digest` the activations are sent in the periodic digest
+        instead of right away.
+        """
+        ...
+
+    @abstractmethod
+    def digest_subscribers(self, channel_id) -> set:
+        """
+        Returns ids of the users subscribed to the channel in digest mode.
+        """
+        ...
+
+    @abstractmethod
+    def remove_subscriber(self, guild_id, channel_id, user_id) -> bool:
+        """
+        Returns False if the user was not subscribed.
+        """
+        ...
+
+    @abstractmethod
+    def subscriptions(self, user_id, guild_id=None) -> set:
+        """
+        Returns ids of the channels the user is subscribed to in the
+        guild, or in all of the guilds if `guild_id` is None.
+        """
+        ...
+
+    @abstractmethod
+    def digest_subscriptions(self, user_id, guild_id=None) -> set:
+        """
+        Like `subscriptions` but only the channels the user
+        is subscribed to in digest mode.
+        """
+        ...
+
+    @abstractmethod
+    def remove_subscriptions(self, guild_id, user_id, channel_ids) -> int:
+        """
+        Unsubscribes the user from all of the given channels at once,
+        returns how many subscriptions were removed.
+        """
+        ...
+
+    @abstractmethod
+    def tracked_channels(self, guild_id=None) -> set:
+        """
+        Returns ids of the time-tracked channels in the guild,
+        or in all of the guilds if `guild_id` is None.
+        """
+        ...
+
+    @abstractmethod
+    def is_tracked(self, channel_id) -> bool:
+        ...
+
+    @abstractmethod
+    def track_channel(self, guild_id, channel_id):
+        ...
+
+    @abstractmethod
+    def untrack_channel(self, guild_id, channel_id):
+        """
+        Stops tracking the channel and removes its time counts.
+        """
+        ...
+
+    @abstractmethod
+    def open_sessions(self, channel_id) -> dict:
+        """
+        Returns mapping of user id to the timestamp the user
+        appeared on the channel at.
+        """
+        ...
+
+    @abstractmethod
+    def all_open_sessions(self, shard=None) -> list:
+        """
+        Returns open sessions of all of the channels
+        as `(guild, channel, user, joined_at)` rows.
+        If `shard` is given as `(shard_id, shard_count)` only
+        sessions in the guilds of that shard are returned.
+        """
+        ...
+
+    @abstractmethod
+    def record_sessions(self, closed, open_sessions, meta, shard=None):
+        """
+        Applies a batch of session changes in a single transaction.
+
+        Closed sessions, `(guild, channel, user, start, end)` rows, are
+        added to the time counts and to the time buckets they overlap
+        (see `voice_activity.rollups`), open sessions are replaced
+        with `open_sessions` rows and `meta` entries are stored. With
+        `shard` only the open sessions of that shard are replaced.
+        """
+        ...
+
+    @abstractmethod
+    def get_meta(self, key, default=None):
+        """
+        Returns value stored with `set_meta`.
+        """
+        ...
+
+    @abstractmethod
+    def set_meta(self, key, value):
+        """
+        Stores small JSON serializable value under `key`.
+        """
+        ...
+
+    @abstractmethod
+    def time_counts(self, channel_id) -> dict:
+        """
+        Returns mapping of user id to the total time the user
+        spent on the channel.
+        """
+        ...
+
+    @abstractmethod
+    def rollup_counts(self, channel_id, granularity, since) -> dict:
+        """
+        Returns mapping of user id to the time the user spent on
+        the channel in the buckets of the given granularity starting
+        with the one containing `since`.
+        """
+        ...
+
+    @abstractmethod
+    def dump(self) -> StorageDump:
+        """
+        Returns the whole contents of the backend.
+        """
+        ...
+
+    @abstractmethod
+    def load(self, dump: StorageDump):
+        """
+        Merges the dump into the backend, time counts
+        are added to the already stored ones.
+        """
+        ...
+
+    def dump_chunks(self, table, chunk_size=10000):
+        """
+        Yields the rows of one of the `StorageDump` tables
+        in lists of at most `chunk_size` rows.
+        """
+        rows = getattr(self.dump(), table)
+        for i in range(0, len(rows), chunk_size):
+            yield list(rows[i:i + chunk_size])
+
+    def flush(self):
+        """
+        Makes sure all of the writes reached the disk.
+        """
+        ...
+
+    def close(self):
+        self.flush()
@@ -0,0 +1,97 @@
+import asyncio
+import logging
+import queue
+import threading
+import traceback
+
+from concurrent.futures import Future
+
+from voice_activity.abc import AbstractStorageBackend
+from voice_activity.metrics import REGISTRY
+
+LOGGER = logging.getLogger(__name__)
+STORAGE_SECONDS = REGISTRY.histogram(
+    "storage_seconds", "Time spent executing the storage calls.", ["method"])
+
+_STOP = object()
+
+
+class AsyncStorage:
+    """
+    Asynchronous facade over a storage backend.
+
+    Every backend method is available here as a coroutine-like
+    call returning an awaitable. The calls are put into a queue
+    and executed one at a time, in the order they were made, by a
+    single dedicated thread, so the disk I/O never blocks the event
+    loop and reads always see the writes issued before them.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._queue = queue.Queue()
+        self._peak_queue_depth = 0
+        self._thread = threading.Thread(
+            target=self._worker, name="storage-writer", daemon=True)
+        self._thread.start()
+
+    @property
+    def queue_depth(self) -> int:
+        """
+        Number of calls waiting to be executed.
+        """
+        return self._queue.qsize()
+
+    @property
+    def peak_queue_depth(self) -> int:
+        """
+        Highest queue depth seen since the facade was created.
+        """
+        return self._peak_queue_depth
+
+    def submit(self, method, *args):
+        """
+        Schedules `method` of the backend to be called with `args`
+        and returns a future with its result.
+        """
+        fut = Future()
+        self._queue.put((fut, method, args))
+        depth = self._queue.qsize()
+        if depth > self._peak_queue_depth:
+            self._peak_queue_depth = depth
+        return asyncio.wrap_future(fut)
+
+    def __getattr__(self, name):
+        if not callable(getattr(AbstractStorageBackend, name, None)):
+            raise AttributeError(name)
+
+        def call(*args):
+            return self.submit(name, *args)
+        call.__name__ = name
+        return call
+
+    def close(self):
+        """
+        Waits for all of the queued calls and closes the backend.
+        """
+        if not self._thread.is_alive():
+            return
+        self._queue.put((Future(), "close", ()))
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            fut, method, args = item
+            if not fut.set_running_or_notify_cancel():
+                continue
+            try:
+                with STORAGE_SECONDS.time(method):
+                    res = getattr(self.backend, method)(*args)
+                fut.set_result(res)
+            except Exception as e:
+                LOGGER.debug("storage call %s failed: %s", method, traceback.format_exc())
+                fut.set_exception(e)
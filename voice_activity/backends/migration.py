@@ -0,0 +1,72 @@
+import os
+import os.path
+import logging
+
+from voice_activity.backends.partitioned_backend import PARTITIONS_DIRECTORY
+from voice_activity.backends.tinydb_backend import (
+    SUBS_FILE,
+    TIME_COUNT_FILE,
+    TinyDBBackend,
+)
+
+LOGGER = logging.getLogger(__name__)
+
+MIGRATED_SUFFIX = ".migrated"
+
+
+def migrate_tinydb(data_directory, target, **options):
+    """
+    Moves the data from the TinyDB files in `data_directory`
+    into the `target` backend. `options` are passed to
+    `TinyDBBackend`, they have to match the format and packed
+    tables the files were written with.
+
+    Migrated files are renamed so the migration runs only once.
+    Returns True if there was anything to migrate.
+    """
+    paths = [
+        os.path.join(data_directory, name)
+        for name in (SUBS_FILE, TIME_COUNT_FILE)
+    ]
+    if not any(os.path.exists(path) for path in paths):
+        return False
+    LOGGER.info("migrating TinyDB storage from %s", data_directory)
+    source = TinyDBBackend(data_directory, **{**options, "cached": False})
+    try:
+        dump = source.dump()
+    finally:
+        source.close()
+    target.load(dump)
+    for path in paths:
+        if os.path.exists(path):
+            os.replace(path, path + MIGRATED_SUFFIX)
+    LOGGER.info(
+        "migrated %d subscriptions, %d tracked channels and %d time counts",
+        len(dump.subscriptions), len(dump.tracked_channels), len(dump.time_counts))
+    return True
+
+
+def recode_tinydb(data_directory, storage_format="json", packed_tables=()):
+    """
+    Rewrites the TinyDB files in `data_directory` and in its guild
+    partitions with the given file format and packed tables.
+
+    Returns the directories which were rewritten.
+    """
+    partitions = os.path.join(data_directory, PARTITIONS_DIRECTORY)
+    directories = [data_directory]
+    if os.path.isdir(partitions):
+        directories.extend(
+            entry.path for entry in os.scandir(partitions) if entry.is_dir())
+    recoded = []
+    for directory in directories:
+        if not any(os.path.exists(os.path.join(directory, name)) for name in (SUBS_FILE, TIME_COUNT_FILE)):
+            continue
+        backend = TinyDBBackend(directory, storage_format=storage_format, packed_tables=packed_tables)
+        try:
+            backend.rewrite()
+        finally:
+            backend.close()
+        recoded.append(directory)
+    LOGGER.info("rewrote TinyDB storage of %d directories as %s", len(recoded), storage_format)
+    return recoded
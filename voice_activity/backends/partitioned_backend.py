@@ -0,0 +1,278 @@
+import os
+import os.path
+import logging
+import time
+
+from collections import OrderedDict
+
+from tinydb import TinyDB
+
+from voice_activity.abc import (
+    AbstractStorageBackend,
+    StorageDump,
+)
+from voice_activity.sharding import shard_of
+from voice_activity.tinydb_exts.defaultdict import CachedDefaultDict
+
+LOGGER = logging.getLogger(__name__)
+
+PARTITIONS_DIRECTORY = "guilds"
+CATALOGUE_FILE = "catalogue.db"
+
+
+class PartitionedBackend(AbstractStorageBackend):
+    """
+    Backend keeping the data of every guild in its own backend.
+
+    Partitions are created by `factory(directory)` in a directory per
+    guild, opened on first use and closed again once they were not
+    used for `idle_timeout` seconds or when more than `max_open` are
+    open, least recently used first. A write therefore only rewrites
+    the files of its own guild and memory is bounded by the number of
+    open partitions.
+
+    A small catalogue, always in memory, maps channels to their guilds
+    and remembers the tracked channels, the guilds with open sessions
+    and the meta entries, so that neither the tracked channels nor the
+    session compaction have to open every partition. Channels
+    whose guild was not known when first stored (0) stay in the
+    partition of guild 0.
+    """
+
+    def __init__(self, data_directory, factory, max_open=100, idle_timeout=600, clock=time.monotonic):
+        self._directory = os.path.join(data_directory, PARTITIONS_DIRECTORY)
+        os.makedirs(self._directory, exist_ok=True)
+        self._factory = factory
+        self._max_open = max_open
+        self._idle_timeout = idle_timeout
+        self._clock = clock
+        # guild -> (partition, last used)
+        self._open = OrderedDict()
+        self._catalogue_db = TinyDB(os.path.join(self._directory, CATALOGUE_FILE))
+        self._channels = CachedDefaultDict(self._catalogue_db.table("channel_guilds"), lambda: None)
+        self._tracked = CachedDefaultDict(self._catalogue_db.table("tracked"), bool)
+        self._meta = CachedDefaultDict(self._catalogue_db.table("meta"), lambda: None)
+        # guilds whose partitions may hold open sessions
+        self._session_guilds = CachedDefaultDict(self._catalogue_db.table("session_guilds"), bool)
+        self._catalogue = [self._channels, self._tracked, self._meta, self._session_guilds]
+        # guild -> ids of its tracked channels
+        self._guild_tracked = {}
+        for chan_id in self._tracked:
+            self._guild_tracked.setdefault(self._channels[chan_id], set()).add(chan_id)
+
+    @property
+    def open_partitions(self) -> int:
+        return len(self._open)
+
+    def subscribers(self, channel_id):
+        partition = self._partition_of(channel_id)
+        return set() if partition is None else partition.subscribers(channel_id)
+
+    def add_subscriber(self, guild_id, channel_id, user_id, digest=False):
+        self._partition_for(guild_id, channel_id).add_subscriber(guild_id, channel_id, user_id, digest)
+
+    def digest_subscribers(self, channel_id):
+        partition = self._partition_of(channel_id)
+        return set() if partition is None else partition.digest_subscribers(channel_id)
+
+    def remove_subscriber(self, guild_id, channel_id, user_id):
+        partition = self._partition_of(channel_id)
+        return partition is not None and partition.remove_subscriber(guild_id, channel_id, user_id)
+
+    def subscriptions(self, user_id, guild_id=None):
+        guilds = self._known_guilds() if guild_id is None else {guild_id, 0}
+        return {
+            chan_id
+            for guild in guilds if self._exists(guild)
+            for chan_id in self._partition(guild).subscriptions(user_id)
+        }
+
+    def digest_subscriptions(self, user_id, guild_id=None):
+        guilds = self._known_guilds() if guild_id is None else {guild_id, 0}
+        return {
+            chan_id
+            for guild in guilds if self._exists(guild)
+            for chan_id in self._partition(guild).digest_subscriptions(user_id)
+        }
+
+    def remove_subscriptions(self, guild_id, user_id, channel_ids):
+        return sum(self.remove_subscriber(guild_id, chan_id, user_id) for chan_id in channel_ids)
+
+    def tracked_channels(self, guild_id=None):
+        if guild_id is None:
+            return set(self._tracked)
+        return self._guild_tracked.get(guild_id, set()) | self._guild_tracked.get(0, set())
+
+    def is_tracked(self, channel_id):
+        return channel_id in self._tracked
+
+    def track_channel(self, guild_id, channel_id):
+        partition = self._partition_for(guild_id, channel_id)
+        partition.track_channel(guild_id, channel_id)
+        self._tracked[channel_id] = True
+        self._guild_tracked.setdefault(self._channels[channel_id], set()).add(channel_id)
+
+    def untrack_channel(self, guild_id, channel_id):
+        partition = self._partition_of(channel_id)
+        if partition is not None:
+            partition.untrack_channel(guild_id, channel_id)
+        if channel_id in self._tracked:
+            del self._tracked[channel_id]
+            self._guild_tracked.get(self._channels[channel_id], set()).discard(channel_id)
+
+    def open_sessions(self, channel_id):
+        partition = self._partition_of(channel_id)
+        return {} if partition is None else partition.open_sessions(channel_id)
+
+    def all_open_sessions(self, shard=None):
+        return [
+            row
+            for guild in self._session_guilds if self._in_shard(guild, shard)
+            for row in self._partition(guild).all_open_sessions()
+        ]
+
+    def record_sessions(self, closed, open_sessions, meta, shard=None):
+        """
+        Only the partitions of the guilds with closed sessions or with
+        open sessions before or after are updated. Partitions are
+        written before the catalogue so the meta entries are never
+        ahead of the sessions.
+        """
+        by_guild = {guild: ([], []) for guild in self._session_guilds if self._in_shard(guild, shard)}
+        for row in closed:
+            by_guild.setdefault(self._guild_of(row[1], row[0]), ([], []))[0].append(row)
+        for row in open_sessions:
+            by_guild.setdefault(self._guild_of(row[1], row[0]), ([], []))[1].append(row)
+        for guild, (guild_closed, guild_open) in by_guild.items():
+            if self._exists(guild):
+                self._partition(guild).record_sessions(guild_closed, guild_open, {})
+            if guild_open:
+                self._session_guilds[guild] = True
+            elif guild in self._session_guilds:
+                del self._session_guilds[guild]
+        for key, value in meta.items():
+            self._meta[key] = value
+        for mapping in self._catalogue:
+            mapping.flush()
+
+    def get_meta(self, key, default=None):
+        value = self._meta[key]
+        return default if value is None else value
+
+    def set_meta(self, key, value):
+        self._meta[key] = value
+
+    def time_counts(self, channel_id):
+        partition = self._partition_of(channel_id)
+        return {} if partition is None else partition.time_counts(channel_id)
+
+    def rollup_counts(self, channel_id, granularity, since):
+        partition = self._partition_of(channel_id)
+        return {} if partition is None else partition.rollup_counts(channel_id, granularity, since)
+
+    def dump(self):
+        dumps = [self._partition(guild).dump() for guild in self._known_guilds() if self._exists(guild)]
+        return StorageDump(*(
+            [row for dump in dumps for row in getattr(dump, table)]
+            for table in StorageDump._fields
+        ))
+
+    def dump_chunks(self, table, chunk_size=10000):
+        """
+        Streams the tables partition by partition. Tracked channels
+        and open sessions only come from the partitions which have
+        any, the catalogue knows which ones those are.
+        """
+        if table == "tracked_channels":
+            guilds = [guild for guild, channels in self._guild_tracked.items() if channels]
+        elif table == "open_sessions":
+            guilds = list(self._session_guilds)
+        else:
+            guilds = self._known_guilds()
+        for guild in guilds:
+            if self._exists(guild):
+                yield from self._partition(guild).dump_chunks(table, chunk_size)
+
+    def load(self, dump):
+        by_guild = {}
+        for table in StorageDump._fields:
+            for row in getattr(dump, table):
+                self._remember(row[0], row[1])
+                tables = by_guild.setdefault(self._channels[row[1]], {})
+                tables.setdefault(table, []).append(row)
+        for guild, tables in by_guild.items():
+            for guild_id, chan_id in tables.get("tracked_channels", ()):
+                if not self.is_tracked(chan_id):
+                    self.track_channel(guild_id, chan_id)
+            if tables.get("open_sessions"):
+                self._session_guilds[guild] = True
+            partition = self._partition(guild)
+            partition.load(StorageDump(**{
+                table: tables.get(table, ()) for table in StorageDump._fields
+            }))
+
+    def flush(self):
+        """
+        Flushes the open partitions and closes the idle ones.
+        """
+        for partition, _ in self._open.values():
+            partition.flush()
+        for mapping in self._catalogue:
+            mapping.flush()
+        now = self._clock()
+        for guild, (_, last_used) in list(self._open.items()):
+            if now - last_used > self._idle_timeout:
+                self._close_partition(guild)
+
+    def close(self):
+        for guild in list(self._open):
+            self._close_partition(guild)
+        for mapping in self._catalogue:
+            mapping.flush()
+        self._catalogue_db.close()
+
+    def _guild_of(self, channel_id, guild_id=0):
+        known = self._channels[channel_id]
+        return guild_id if known is None else known
+
+    def _remember(self, guild_id, channel_id):
+        if self._channels[channel_id] is None:
+            self._channels[channel_id] = guild_id
+
+    def _partition_for(self, guild_id, channel_id):
+        self._remember(guild_id, channel_id)
+        return self._partition(self._channels[channel_id])
+
+    def _partition_of(self, channel_id):
+        guild = self._channels[channel_id]
+        return None if guild is None else self._partition(guild)
+
+    def _in_shard(self, guild_id, shard):
+        return shard is None or shard_of(guild_id, shard[1]) == shard[0]
+
+    def _known_guilds(self):
+        return {self._channels[chan_id] for chan_id in self._channels}
+
+    def _path(self, guild_id):
+        return os.path.join(self._directory, str(guild_id))
+
+    def _exists(self, guild_id):
+        return guild_id in self._open or os.path.isdir(self._path(guild_id))
+
+    def _partition(self, guild_id):
+        entry = self._open.pop(guild_id, None)
+        if entry is None:
+            os.makedirs(self._path(guild_id), exist_ok=True)
+            LOGGER.debug("opening storage partition of guild %a", guild_id)
+            partition = self._factory(self._path(guild_id))
+        else:
+            partition = entry[0]
+        self._open[guild_id] = (partition, self._clock())
+        while len(self._open) > self._max_open:
+            self._close_partition(next(iter(self._open)))
+        return partition
+
+    def _close_partition(self, guild_id):
+        partition, _ = self._open.pop(guild_id)
+        LOGGER.debug("closing storage partition of guild %a", guild_id)
+        partition.close()
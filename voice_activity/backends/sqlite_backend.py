@@ -0,0 +1,323 @@
+import json
+import sqlite3
+import logging
+
+from voice_activity.abc import (
+    AbstractStorageBackend,
+    StorageDump,
+)
+from voice_activity.rollups import (
+    GRANULARITIES,
+    RETENTION,
+    bucket_start,
+    expired_before,
+    split_session,
+)
+from voice_activity.sharding import shard_of
+
+LOGGER = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS subscriptions (
+    guild INTEGER NOT NULL,
+    channel INTEGER NOT NULL,
+    user INTEGER NOT NULL,
+    PRIMARY KEY (channel, user)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS subscriptions_guild ON subscriptions (guild, channel);
+CREATE INDEX IF NOT EXISTS subscriptions_user ON subscriptions (user, guild);
+
+-- subscriptions delivered in the periodic digest
+CREATE TABLE IF NOT EXISTS digest_subscriptions (
+    channel INTEGER NOT NULL,
+    user INTEGER NOT NULL,
+    PRIMARY KEY (channel, user)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS tracked_channels (
+    guild INTEGER NOT NULL,
+    channel INTEGER NOT NULL PRIMARY KEY
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS tracked_channels_guild ON tracked_channels (guild, channel);
+
+CREATE TABLE IF NOT EXISTS open_sessions (
+    guild INTEGER NOT NULL,
+    channel INTEGER NOT NULL,
+    user INTEGER NOT NULL,
+    joined_at REAL NOT NULL,
+    PRIMARY KEY (channel, user)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS time_counts (
+    guild INTEGER NOT NULL,
+    channel INTEGER NOT NULL,
+    user INTEGER NOT NULL,
+    seconds REAL NOT NULL,
+    PRIMARY KEY (channel, user)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS time_counts_guild ON time_counts (guild, channel, user);
+
+CREATE TABLE IF NOT EXISTS rollups (
+    guild INTEGER NOT NULL,
+    channel INTEGER NOT NULL,
+    user INTEGER NOT NULL,
+    granularity INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    seconds REAL NOT NULL,
+    PRIMARY KEY (channel, granularity, bucket, user)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT NOT NULL PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+# Guild is not part of the keys as channel ids are globally
+# unique, this way rows migrated without knowing their guild
+# (guild 0) get it fixed on the next write.
+UPSERT_SUBSCRIPTION = """
+INSERT INTO subscriptions (guild, channel, user) VALUES (?, ?, ?)
+ON CONFLICT (channel, user) DO UPDATE SET guild = COALESCE(NULLIF(excluded.guild, 0), guild)
+"""
+
+UPSERT_TRACKED = """
+INSERT INTO tracked_channels (guild, channel) VALUES (?, ?)
+ON CONFLICT (channel) DO UPDATE SET guild = COALESCE(NULLIF(excluded.guild, 0), guild)
+"""
+
+UPSERT_SESSION = """
+INSERT INTO open_sessions (guild, channel, user, joined_at) VALUES (?, ?, ?, ?)
+ON CONFLICT (channel, user) DO UPDATE SET
+    guild = COALESCE(NULLIF(excluded.guild, 0), guild),
+    joined_at = excluded.joined_at
+"""
+
+UPSERT_TIME_COUNT = """
+INSERT INTO time_counts (guild, channel, user, seconds) VALUES (?, ?, ?, ?)
+ON CONFLICT (channel, user) DO UPDATE SET
+    guild = COALESCE(NULLIF(excluded.guild, 0), guild),
+    seconds = seconds + excluded.seconds
+"""
+
+UPSERT_ROLLUP = """
+INSERT INTO rollups (guild, channel, user, granularity, bucket, seconds) VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (channel, granularity, bucket, user) DO UPDATE SET
+    guild = COALESCE(NULLIF(excluded.guild, 0), guild),
+    seconds = seconds + excluded.seconds
+"""
+
+# queries of the `StorageDump` tables
+DUMP_QUERIES = {
+    "subscriptions": (
+        "SELECT guild, channel, user, digest_subscriptions.user IS NOT NULL"
+        " FROM subscriptions LEFT JOIN digest_subscriptions USING (channel, user)"),
+    "tracked_channels": "SELECT guild, channel FROM tracked_channels",
+    "open_sessions": "SELECT guild, channel, user, joined_at FROM open_sessions",
+    "time_counts": "SELECT guild, channel, user, seconds FROM time_counts",
+    "rollups": "SELECT guild, channel, user, granularity, bucket, seconds FROM rollups",
+}
+
+
+class SQLiteBackend(AbstractStorageBackend):
+    """
+    Backend storing one row per (guild, channel, user) in SQLite.
+
+    The database runs in WAL mode so a single user update is
+    one small UPSERT appended to the log instead of rewriting
+    the whole document. Expired rollup buckets of a channel are
+    deleted whenever one of its sessions is counted.
+    """
+
+    def __init__(self, path):
+        # the connection is created here but used by the storage
+        # thread, it is never used by two threads at once.
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def subscribers(self, channel_id):
+        rows = self._conn.execute(
+            "SELECT user FROM subscriptions WHERE channel = ?", (channel_id,))
+        return {user for (user,) in rows}
+
+    def add_subscriber(self, guild_id, channel_id, user_id, digest=False):
+        with self._conn:
+            self._conn.execute(UPSERT_SUBSCRIPTION, (guild_id, channel_id, user_id))
+            if digest:
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO digest_subscriptions (channel, user) VALUES (?, ?)",
+                    (channel_id, user_id))
+            else:
+                self._conn.execute(
+                    "DELETE FROM digest_subscriptions WHERE channel = ? AND user = ?",
+                    (channel_id, user_id))
+
+    def digest_subscribers(self, channel_id):
+        rows = self._conn.execute(
+            "SELECT user FROM digest_subscriptions WHERE channel = ?", (channel_id,))
+        return {user for (user,) in rows}
+
+    def remove_subscriber(self, guild_id, channel_id, user_id):
+        with self._conn:
+            cur = self._conn.execute(
+                "DELETE FROM subscriptions WHERE channel = ? AND user = ?",
+                (channel_id, user_id))
+            self._conn.execute(
+                "DELETE FROM digest_subscriptions WHERE channel = ? AND user = ?",
+                (channel_id, user_id))
+        return cur.rowcount > 0
+
+    def subscriptions(self, user_id, guild_id=None):
+        if guild_id is None:
+            rows = self._conn.execute(
+                "SELECT channel FROM subscriptions WHERE user = ?", (user_id,))
+        else:
+            rows = self._conn.execute(
+                "SELECT channel FROM subscriptions WHERE user = ? AND guild IN (?, 0)",
+                (user_id, guild_id))
+        return {chan for (chan,) in rows}
+
+    def digest_subscriptions(self, user_id, guild_id=None):
+        if guild_id is None:
+            rows = self._conn.execute(
+                "SELECT channel FROM subscriptions JOIN digest_subscriptions USING (channel, user)"
+                " WHERE user = ?", (user_id,))
+        else:
+            rows = self._conn.execute(
+                "SELECT channel FROM subscriptions JOIN digest_subscriptions USING (channel, user)"
+                " WHERE user = ? AND guild IN (?, 0)", (user_id, guild_id))
+        return {chan for (chan,) in rows}
+
+    def remove_subscriptions(self, guild_id, user_id, channel_ids):
+        rows = [(chan, user_id) for chan in channel_ids]
+        with self._conn:
+            cur = self._conn.executemany(
+                "DELETE FROM subscriptions WHERE channel = ? AND user = ?", rows)
+            removed = cur.rowcount
+            self._conn.executemany(
+                "DELETE FROM digest_subscriptions WHERE channel = ? AND user = ?", rows)
+        return removed
+
+    def tracked_channels(self, guild_id=None):
+        if guild_id is None:
+            rows = self._conn.execute("SELECT channel FROM tracked_channels")
+        else:
+            rows = self._conn.execute(
+                "SELECT channel FROM tracked_channels WHERE guild IN (?, 0)", (guild_id,))
+        return {chan for (chan,) in rows}
+
+    def is_tracked(self, channel_id):
+        row = self._conn.execute(
+            "SELECT 1 FROM tracked_channels WHERE channel = ?", (channel_id,)).fetchone()
+        return row is not None
+
+    def track_channel(self, guild_id, channel_id):
+        with self._conn:
+            self._conn.execute(UPSERT_TRACKED, (guild_id, channel_id))
+
+    def untrack_channel(self, guild_id, channel_id):
+        with self._conn:
+            for table in ("tracked_channels", "open_sessions", "time_counts", "rollups"):
+                self._conn.execute(f"DELETE FROM {table} WHERE channel = ?", (channel_id,))
+
+    def all_open_sessions(self, shard=None):
+        rows = self._conn.execute(
+            "SELECT guild, channel, user, joined_at FROM open_sessions").fetchall()
+        if shard is not None:
+            rows = [row for row in rows if shard_of(row[0], shard[1]) == shard[0]]
+        return rows
+
+    def record_sessions(self, closed, open_sessions, meta, shard=None):
+        with self._conn:
+            tracked = self.tracked_channels()
+            for guild, chan, user, start, end in closed:
+                if chan in tracked:
+                    self._count_session(guild, chan, user, start, end)
+            if shard is None:
+                self._conn.execute("DELETE FROM open_sessions")
+            else:
+                self._conn.execute(
+                    "DELETE FROM open_sessions WHERE (guild >> 22) % ? = ?", (shard[1], shard[0]))
+            self._conn.executemany(
+                UPSERT_SESSION, [row for row in open_sessions if row[1] in tracked])
+            for key, value in meta.items():
+                self._set_meta(key, value)
+
+    def get_meta(self, key, default=None):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return default if row is None else json.loads(row[0])
+
+    def set_meta(self, key, value):
+        with self._conn:
+            self._set_meta(key, value)
+
+    def open_sessions(self, channel_id):
+        rows = self._conn.execute(
+            "SELECT user, joined_at FROM open_sessions WHERE channel = ?", (channel_id,))
+        return dict(rows)
+
+    def time_counts(self, channel_id):
+        rows = self._conn.execute(
+            "SELECT user, seconds FROM time_counts WHERE channel = ?", (channel_id,))
+        return dict(rows)
+
+    def rollup_counts(self, channel_id, granularity, since):
+        rows = self._conn.execute(
+            "SELECT user, SUM(seconds) FROM rollups"
+            " WHERE channel = ? AND granularity = ? AND bucket >= ?"
+            " GROUP BY user",
+            (channel_id, granularity, bucket_start(since, granularity)))
+        return dict(rows)
+
+    def dump(self):
+        return StorageDump(**{
+            table: self._conn.execute(query).fetchall()
+            for table, query in DUMP_QUERIES.items()
+        })
+
+    def dump_chunks(self, table, chunk_size=10000):
+        cursor = self._conn.execute(DUMP_QUERIES[table])
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                return
+            yield rows
+
+    def load(self, dump):
+        with self._conn:
+            self._conn.executemany(UPSERT_TRACKED, dump.tracked_channels)
+            self._conn.executemany(UPSERT_SUBSCRIPTION, [row[:3] for row in dump.subscriptions])
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO digest_subscriptions (channel, user) VALUES (?, ?)",
+                [(chan, user) for _, chan, user, digest in dump.subscriptions if digest])
+            self._conn.executemany(
+                "DELETE FROM digest_subscriptions WHERE channel = ? AND user = ?",
+                [(chan, user) for _, chan, user, digest in dump.subscriptions if not digest])
+            self._conn.executemany(UPSERT_SESSION, dump.open_sessions)
+            self._conn.executemany(UPSERT_TIME_COUNT, dump.time_counts)
+            self._conn.executemany(UPSERT_ROLLUP, dump.rollups)
+
+    def close(self):
+        self._conn.close()
+
+    def _count_session(self, guild_id, channel_id, user_id, start, end):
+        duration = max(0.0, end - start)
+        self._conn.execute(UPSERT_TIME_COUNT, (guild_id, channel_id, user_id, duration))
+        self._conn.executemany(UPSERT_ROLLUP, [
+            (guild_id, channel_id, user_id, granularity, bucket, seconds)
+            for granularity in GRANULARITIES
+            for bucket, seconds in split_session(start, end, granularity)
+        ])
+        self._conn.executemany(
+            "DELETE FROM rollups WHERE channel = ? AND granularity = ? AND bucket < ?", [
+                (channel_id, granularity, expired_before(granularity, end))
+                for granularity in RETENTION
+            ])
+
+    def _set_meta(self, key, value):
+        self._conn.execute(
+            "INSERT INTO meta (key, value) VALUES (?, ?)"
+            " ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+            (key, json.dumps(value)))
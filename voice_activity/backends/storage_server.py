@@ -0,0 +1,116 @@
+import logging
+import threading
+import traceback
+
+from multiprocessing.connection import (
+    Client,
+    Listener,
+)
+
+from voice_activity.abc import AbstractStorageBackend
+
+LOGGER = logging.getLogger(__name__)
+
+
+class StorageServer:
+    """
+    Serves a storage backend to the other processes over a local socket.
+
+    Used by the sharded deployment so that only one process, the storage
+    owner, ever writes the storage files. Every connection is handled
+    by its own thread and the calls of all of the connections are
+    executed one at a time, so the backend sees a single writer.
+    """
+
+    def __init__(self, backend, address, authkey=None):
+        self.backend = backend
+        self.address = address
+        self.authkey = authkey
+        self._listener = Listener(address, authkey=authkey)
+        self._lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._accept, name="storage-server", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def close(self):
+        """
+        Stops accepting connections, the backend is left open.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread.is_alive():
+            # wake the accepting thread up
+            Client(self.address, authkey=self.authkey).close()
+            self._thread.join()
+        self._listener.close()
+
+    def _accept(self):
+        while True:
+            try:
+                conn = self._listener.accept()
+            except Exception:
+                if self._closed:
+                    return
+                LOGGER.warning("rejected storage connection: %s", traceback.format_exc())
+                continue
+            if self._closed:
+                conn.close()
+                return
+            threading.Thread(
+                target=self._serve, args=(conn,), name="storage-connection", daemon=True).start()
+
+    def _serve(self, conn):
+        with conn:
+            while True:
+                try:
+                    method, args = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    if not callable(getattr(AbstractStorageBackend, method, None)) or method == "close":
+                        raise AttributeError(f"storage method {method!r} is not available remotely")
+                    with self._lock:
+                        res = ("ok", getattr(self.backend, method)(*args))
+                except Exception as e:
+                    LOGGER.debug("remote storage call %s failed: %s", method, traceback.format_exc())
+                    res = ("error", e)
+                try:
+                    conn.send(res)
+                except (EOFError, OSError):
+                    return
+                except Exception:
+                    # the result or the exception could not be pickled
+                    conn.send(("error", RuntimeError(repr(res[1]))))
+
+
+class RemoteBackend:
+    """
+    Storage backend proxy forwarding the calls to a `StorageServer`.
+
+    Calls block until the server replies so it is meant to be wrapped
+    in `AsyncStorage` like the local backends. Closing it only closes
+    the connection, the storage stays open in the owner process.
+    """
+
+    def __init__(self, address, authkey=None):
+        self._conn = Client(address, authkey=authkey)
+
+    def __getattr__(self, name):
+        if not callable(getattr(AbstractStorageBackend, name, None)):
+            raise AttributeError(name)
+
+        def call(*args):
+            self._conn.send((name, args))
+            status, res = self._conn.recv()
+            if status == "error":
+                raise res
+            return res
+        call.__name__ = name
+        return call
+
+    def close(self):
+        self._conn.close()
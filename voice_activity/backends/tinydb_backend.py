@@ -0,0 +1,318 @@
+import os.path
+import logging
+
+from functools import partial
+
+from tinydb import TinyDB
+
+from voice_activity.abc import (
+    AbstractStorageBackend,
+    StorageDump,
+)
+from voice_activity.rollups import (
+    GRANULARITIES,
+    RETENTION,
+    bucket_start,
+    expired_before,
+    split_session,
+)
+from voice_activity.sharding import shard_of
+from voice_activity.tinydb_exts.codecs import (
+    PACKED_CODECS,
+    STORAGES,
+)
+from voice_activity.tinydb_exts.defaultdict import (
+    CachedDefaultDict,
+    DefaultDict,
+)
+from voice_activity.utility import chunked
+
+LOGGER = logging.getLogger(__name__)
+
+SUBS_FILE = "subs.db"
+TIME_COUNT_FILE = "time_count.db"
+
+
+class TinyDBBackend(AbstractStorageBackend):
+    """
+    Backend storing whole per-channel documents in TinyDB files.
+
+    Uses the same files and layout the plugins used before
+    the storage backends were introduced, with user ids as
+    string keys of the per-channel dicts. Guild of the channel
+    is remembered in a separate table when it becomes known.
+    Rollups of a channel are kept in a single document mapping
+    granularity to bucket to user to seconds, buckets in ascending
+    order so reads and expiry stop at the first bucket out of
+    their range. Channels every user
+    is subscribed to are indexed in memory, the index is built from
+    the subscription documents on start.
+
+    The files are JSON or msgpack depending on `storage_format` and
+    the tables named in `packed_tables` are stored with the compact
+    codecs of `PACKED_CODECS`. Files and tables written before are
+    converted when they are written next.
+    """
+
+    def __init__(self, data_directory, cached=True, max_dirty=None, storage_format="json", packed_tables=()):
+        unknown = set(packed_tables) - set(PACKED_CODECS)
+        if unknown:
+            raise ValueError(f"tables {sorted(unknown)} can't be packed, expected some of {list(PACKED_CODECS)}")
+        storage = STORAGES[storage_format]
+        self._subs_db = TinyDB(os.path.join(data_directory, SUBS_FILE), storage=storage)
+        self._time_db = TinyDB(os.path.join(data_directory, TIME_COUNT_FILE), storage=storage)
+        mapping = partial(CachedDefaultDict, max_dirty=max_dirty) if cached else DefaultDict
+        codecs = {
+            table: PACKED_CODECS[table](binary=storage_format != "json")
+            for table in packed_tables
+        }
+        subs_codec = codecs.get("subscriptions")
+        counts_codec = codecs.get("time_counts")
+        self._mappings = [
+            mapping(self._subs_db, set, *(
+                (list, set) if subs_codec is None else (subs_codec.serialize, subs_codec.deserialize))),
+            mapping(self._time_db.table("tracked_channels"), dict),
+            mapping(self._time_db.table("time_counts"), dict, *(
+                () if counts_codec is None else (counts_codec.serialize, counts_codec.deserialize))),
+            mapping(self._time_db.table("channel_guilds"), int),
+            mapping(self._time_db.table("rollups"), dict),
+            mapping(self._time_db.table("meta"), lambda: None),
+        ]
+        # users subscribed to the channels in digest mode
+        self._digests = mapping(self._subs_db.table("digest"), set, list, set)
+        self._mappings.append(self._digests)
+        (self._subs, self._tracked, self._counts,
+         self._guilds, self._rollups, self._meta, _) = self._mappings
+        # user -> ids of the channels they are subscribed to
+        self._user_subs = {}
+        for chan_id in self._subs:
+            for user_id in self._subs[chan_id]:
+                self._user_subs.setdefault(user_id, set()).add(chan_id)
+
+    def subscribers(self, channel_id):
+        return set(self._subs[channel_id])
+
+    def add_subscriber(self, guild_id, channel_id, user_id, digest=False):
+        self._remember_guild(guild_id, channel_id)
+        subs = self._subs[channel_id]
+        subs.add(user_id)
+        self._subs[channel_id] = subs
+        self._user_subs.setdefault(user_id, set()).add(channel_id)
+        self._set_digest(channel_id, user_id, digest)
+
+    def digest_subscribers(self, channel_id):
+        return set(self._digests[channel_id])
+
+    def remove_subscriber(self, guild_id, channel_id, user_id):
+        subs = self._subs[channel_id]
+        if user_id not in subs:
+            return False
+        subs.remove(user_id)
+        self._subs[channel_id] = subs
+        self._set_digest(channel_id, user_id, False)
+        channels = self._user_subs.get(user_id, set())
+        channels.discard(channel_id)
+        if not channels:
+            self._user_subs.pop(user_id, None)
+        return True
+
+    def subscriptions(self, user_id, guild_id=None):
+        return {
+            chan_id for chan_id in self._user_subs.get(user_id, ())
+            if guild_id is None or self._guilds[chan_id] in (guild_id, 0)
+        }
+
+    def digest_subscriptions(self, user_id, guild_id=None):
+        return {
+            chan_id for chan_id in self.subscriptions(user_id, guild_id)
+            if user_id in self._digests[chan_id]
+        }
+
+    def remove_subscriptions(self, guild_id, user_id, channel_ids):
+        return sum(
+            self.remove_subscriber(guild_id, chan_id, user_id) for chan_id in channel_ids)
+
+    def tracked_channels(self, guild_id=None):
+        return {
+            chan_id for chan_id in self._tracked
+            if guild_id is None or self._guilds[chan_id] in (guild_id, 0)
+        }
+
+    def is_tracked(self, channel_id):
+        return channel_id in self._tracked
+
+    def track_channel(self, guild_id, channel_id):
+        self._remember_guild(guild_id, channel_id)
+        self._tracked[channel_id] = {}
+        self._counts[channel_id] = {}
+
+    def untrack_channel(self, guild_id, channel_id):
+        for mapping in (self._tracked, self._counts, self._rollups):
+            if channel_id in mapping:
+                del mapping[channel_id]
+
+    def all_open_sessions(self, shard=None):
+        return [
+            (self._guilds[chan], chan, user, ts)
+            for chan in self._tracked if self._in_shard(chan, shard)
+            for user, ts in self.open_sessions(chan).items()
+        ]
+
+    def record_sessions(self, closed, open_sessions, meta, shard=None):
+        for guild, chan, user, start, end in closed:
+            if chan in self._tracked:
+                self._count_session(guild, chan, user, start, end)
+        by_channel = {chan: {} for chan in self._tracked if self._in_shard(chan, shard)}
+        for guild, chan, user, ts in open_sessions:
+            if chan in self._tracked:
+                self._remember_guild(guild, chan)
+                by_channel.setdefault(chan, {})[str(user)] = ts
+        for chan, sessions in by_channel.items():
+            if sessions != self._tracked[chan]:
+                self._tracked[chan] = sessions
+        for key, value in meta.items():
+            self._meta[key] = value
+        self.flush()
+
+    def get_meta(self, key, default=None):
+        value = self._meta[key]
+        return default if value is None else value
+
+    def set_meta(self, key, value):
+        self._meta[key] = value
+
+    def open_sessions(self, channel_id):
+        return {int(user): ts for user, ts in self._tracked[channel_id].items()}
+
+    def time_counts(self, channel_id):
+        return {int(user): secs for user, secs in self._counts[channel_id].items()}
+
+    def rollup_counts(self, channel_id, granularity, since):
+        first = bucket_start(since, granularity)
+        counts = {}
+        buckets = self._rollups[channel_id].get(str(granularity), {})
+        for bucket, users in reversed(buckets.items()):
+            if int(bucket) < first:
+                break
+            for user, seconds in users.items():
+                counts[int(user)] = counts.get(int(user), 0.0) + seconds
+        return counts
+
+    def dump(self):
+        return StorageDump(**{table: list(self._rows(table)) for table in StorageDump._fields})
+
+    def dump_chunks(self, table, chunk_size=10000):
+        """
+        Streams the rows channel by channel, only
+        the rows of a single chunk are held at once.
+        """
+        return chunked(self._rows(table), chunk_size)
+
+    def load(self, dump):
+        for guild, chan in dump.tracked_channels:
+            if not self.is_tracked(chan):
+                self.track_channel(guild, chan)
+        for guild, chan, user, digest in dump.subscriptions:
+            self.add_subscriber(guild, chan, user, bool(digest))
+        for guild, chan, user, ts in dump.open_sessions:
+            self._remember_guild(guild, chan)
+            sessions = self._tracked[chan]
+            sessions[str(user)] = ts
+            self._tracked[chan] = sessions
+        for guild, chan, user, secs in dump.time_counts:
+            counts = self._counts[chan]
+            counts[str(user)] = counts.get(str(user), 0.0) + secs
+            self._counts[chan] = counts
+        for guild, chan, user, granularity, bucket, secs in dump.rollups:
+            rollups = self._rollups[chan]
+            self._add_rollup(rollups, user, granularity, bucket, secs)
+            self._rollups[chan] = rollups
+
+    def flush(self):
+        for mapping in self._mappings:
+            if isinstance(mapping, CachedDefaultDict):
+                mapping.flush()
+
+    def rewrite(self):
+        """
+        Writes back every table with the current format and codecs.
+        """
+        for mapping in self._mappings:
+            mapping.rewrite()
+
+    def close(self):
+        self.flush()
+        self._subs_db.close()
+        self._time_db.close()
+
+    def _rows(self, table):
+        if table == "subscriptions":
+            for chan in self._subs:
+                digests = self._digests[chan]
+                for user in self._subs[chan]:
+                    yield (self._guilds[chan], chan, user, int(user in digests))
+        elif table == "tracked_channels":
+            for chan in self._tracked:
+                yield (self._guilds[chan], chan)
+        elif table == "open_sessions":
+            yield from self.all_open_sessions()
+        elif table == "time_counts":
+            for chan in self._counts:
+                for user, secs in self.time_counts(chan).items():
+                    yield (self._guilds[chan], chan, user, secs)
+        elif table == "rollups":
+            for chan in self._rollups:
+                for granularity, buckets in self._rollups[chan].items():
+                    for bucket, users in buckets.items():
+                        for user, secs in users.items():
+                            yield (self._guilds[chan], chan, int(user), int(granularity), int(bucket), secs)
+        else:
+            raise ValueError(f"unknown table {table!r}")
+
+    def _count_session(self, guild_id, channel_id, user_id, start, end):
+        duration = max(0.0, end - start)
+        counts = self._counts[channel_id]
+        counts[str(user_id)] = counts.get(str(user_id), 0.0) + duration
+        self._counts[channel_id] = counts
+        rollups = self._rollups[channel_id]
+        for granularity in GRANULARITIES:
+            for bucket, seconds in split_session(start, end, granularity):
+                self._add_rollup(rollups, user_id, granularity, bucket, seconds)
+        for granularity in RETENTION:
+            buckets = rollups.get(str(granularity), {})
+            first = expired_before(granularity, end)
+            while buckets and int(next(iter(buckets))) < first:
+                del buckets[next(iter(buckets))]
+        self._rollups[channel_id] = rollups
+
+    @staticmethod
+    def _add_rollup(rollups, user_id, granularity, bucket, seconds):
+        buckets = rollups.setdefault(str(granularity), {})
+        users = buckets.get(str(bucket))
+        if users is None:
+            last = next(reversed(buckets), None)
+            users = buckets[str(bucket)] = {}
+            if last is not None and int(last) > bucket:
+                rollups[str(granularity)] = dict(sorted(buckets.items(), key=lambda item: int(item[0])))
+        users[str(user_id)] = users.get(str(user_id), 0.0) + seconds
+
+    def _set_digest(self, channel_id, user_id, digest):
+        digests = self._digests[channel_id]
+        if (user_id in digests) == digest:
+            return
+        if digest:
+            digests.add(user_id)
+            self._digests[channel_id] = digests
+        else:
+            digests.discard(user_id)
+            if digests:
+                self._digests[channel_id] = digests
+            else:
+                del self._digests[channel_id]
+
+    def _in_shard(self, channel_id, shard):
+        return shard is None or shard_of(self._guilds[channel_id], shard[1]) == shard[0]
+
+    def _remember_guild(self, guild_id, channel_id):
+        if guild_id and self._guilds[channel_id] != guild_id:
+            self._guilds[channel_id] = guild_id
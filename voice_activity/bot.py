@@ -1,28 +1,44 @@
 import asyncio
-import re
 import logging
 import traceback
 import inspect
-import sys
+import time
 
 import discord
-from stdlib_list import stdlib_list
 
-import voice_activity
 from voice_activity.abc import (
     AbstractCommand,
     AbstractListener,
     AbstractPlugin,
 )
+from voice_activity.commands import (
+    ArgumentError,
+    ArgumentParser,
+    CommandRouter,
+)
+from voice_activity.coalescing import (
+    EVENT_TIME,
+    VoiceCoalescer,
+)
+from voice_activity.events import EventBus
+from voice_activity.metrics import REGISTRY
+from voice_activity.outbound import Outbox
+from voice_activity.plugins import PluginRegistry
+from voice_activity.response_cache import ResponseCache
+from voice_activity.scheduler import Scheduler
 
 
 USER_CTX_TIMEOUT = 1200 # in seconds
 
-COMMAND_REGEX = re.compile(r'([^"].*?|".*?")(?:\s|$)')
-
 LOGGER = logging.getLogger(__name__)
-PYTHON_VERSION = f"{sys.version_info[0]}.{sys.version_info[1]}"
-EXCLUDE_FROM_AUTODISCOVERY = {"discord"} | set(dir(__builtins__)) | set(sys.builtin_module_names) | set(stdlib_list(PYTHON_VERSION))
+COMMAND_SECONDS = REGISTRY.histogram(
+    "command_seconds", "Time spent running the commands.", ["command"])
+COMMAND_FAILURES = REGISTRY.counter(
+    "command_failures", "Commands which raised an exception.", ["command"])
+DISCORD_API_CALLS = REGISTRY.counter(
+    "discord_api_calls", "Discord HTTP API requests made.", ["endpoint"])
+DISCORD_API_SECONDS = REGISTRY.histogram(
+    "discord_api_seconds", "Time spent waiting for the Discord HTTP API.", ["endpoint"])
 
 class VoiceActivity(discord.Client):
 
@@ -30,33 +46,84 @@ class VoiceActivity(discord.Client):
         super().__init__(*args, **kwargs)
         self._users_context = {}
         self._bot_commands = {}
-        self._bot_listeners = []
-        self._registered_plugins = set()
-
-    def autodiscover_plugins(self, mod, *args, visited_modules=None, **kwargs):
-        if not inspect.ismodule(mod):
-            raise ValueError(f"Autodiscovery can only be done on modules. Passed {mode}")
-        keys = [k for k in vars(mod) if not k.startswith("_") and not k in EXCLUDE_FROM_AUTODISCOVERY]
-        if visited_modules is None:
-            visited_modules = set()
-        visited_modules.add(mod)
-        for k in keys:
-            val = vars(mod)[k]
-            if inspect.ismodule(val) and not val in visited_modules:
-                self.autodiscover_plugins(val, *args, visited_modules=visited_modules, **kwargs)
-            elif isinstance(val, type) and issubclass(val, AbstractPlugin):
-                autodiscover = (
-                    not val in self._registered_plugins
-                    and val.auto_discovery
-                    and not "Abstract" in val.__name__)
-                if not autodiscover:
-                    continue
-                plug = val(self, *args, **kwargs)
-                self._registered_plugins.add(val)
-                LOGGER.info(
-                    "Adding plugin %s from module: %s",
-                    plug.__class__.__name__,
-                    mod.__package__)
+        self._router = CommandRouter()
+        self._events = EventBus()
+        # plugin name -> (import seconds, start seconds)
+        self.startup_timings = {}
+        self._background_tasks = []
+        self._running_tasks = None
+        self._cleanups = []
+        # shared by everything that needs to expire or delay something
+        self.scheduler = Scheduler()
+        self.add_background_task(self.scheduler.run)
+        self.add_cleanup(self.scheduler.close)
+        self.http.request = _instrumented(self.http.request)
+        # voice state updates go through it before reaching the listeners
+        self.coalescer = VoiceCoalescer(self.scheduler, self._emit_voice_state_update)
+        # responses of the commands, invalidated by whatever changes their data
+        self.responses = ResponseCache()
+        # replies to the commands are queued and sent through it
+        self.outbox = Outbox()
+        self.add_cleanup(self.outbox.close)
+
+    def add_background_task(self, coro_func, *args):
+        """
+        Registers a coroutine function to be run as a task
+        for as long as the bot is running. If the bot is
+        already running the task is started right away.
+        """
+        if self._running_tasks is not None:
+            self._running_tasks.append(asyncio.create_task(coro_func(*args)))
+        else:
+            self._background_tasks.append((coro_func, args))
+
+    def add_cleanup(self, func):
+        """
+        Registers a function to be called when the bot is closing.
+        Cleanups are called in the reverse order of registration,
+        if a cleanup returns an awaitable it is awaited.
+        """
+        self._cleanups.append(func)
+
+    async def start(self, *args, **kwargs):
+        self._start_background_tasks()
+        await super().start(*args, **kwargs)
+
+    def _start_background_tasks(self):
+        self._running_tasks = [
+            asyncio.create_task(coro_func(*task_args))
+            for coro_func, task_args in self._background_tasks
+        ]
+
+    async def close(self):
+        for task in self._running_tasks or ():
+            task.cancel()
+        self._running_tasks = None
+        await self.coalescer.flush()
+        self._events.close()
+        while self._cleanups:
+            cleanup = self._cleanups.pop()
+            try:
+                res = cleanup()
+                if inspect.isawaitable(res):
+                    await res
+            except Exception:
+                LOGGER.error("cleanup %r failed, traceback: %s", cleanup, traceback.format_exc())
+        await super().close()
+
+    def load_plugins(self, specs, *args, **kwargs):
+        """
+        Imports and starts the plugins in the given order,
+        passing them `args` and `kwargs`. How long importing and
+        starting each of them took is kept in `startup_timings`.
+        """
+        for spec in specs:
+            start = time.perf_counter()
+            plugin_cls = spec.load()
+            imported = time.perf_counter()
+            plugin_cls(self, *args, **kwargs)
+            self.startup_timings[spec.name] = (imported - start, time.perf_counter() - imported)
+            LOGGER.info("Adding plugin %s from %s", spec.name, spec.path)
 
     def add_module(self, mod_cls, *args, **kwargs):
         objs = []
@@ -73,25 +140,45 @@ class VoiceActivity(discord.Client):
         for mod in objs:
             obj = mod(self, *args, **kwargs)
             if isinstance(obj, AbstractCommand):
-                self._bot_commands[obj.name()] = obj
+                self._add_command(obj)
             if isinstance(obj, AbstractListener):
-                self._bot_listeners.append(obj)
+                self._events.add(obj)
 
     async def _in_chan_callout(self, message):
         reply = message.author
-        if reply.id not in self._users_context:
-            self._users_context[reply.id] = reply
-            asyncio.create_task(self._remove_context(reply.id))
+        self._users_context[reply.id] = reply
+        # replaces the expiry of the previous callout, if any
+        self.scheduler.schedule(
+            ("user_context", reply.id), USER_CTX_TIMEOUT, self._remove_context, reply.id)
         await reply.send("What do you want from me?")
 
+    def _add_command(self, cmd):
+        parser = ArgumentParser(cmd)
+        self._bot_commands[cmd.name()] = cmd
+        self.responses.invalidate(("commands",))
+        for name in (cmd.name(), *cmd.aliases()):
+            self._router.add(name, cmd, parser)
+
     async def _run_cmd(self, user, guild, resp_chan, content):
+        resp_chan = self.outbox.channel(resp_chan)
+        ctx = {"user": user, "guild": guild, "resp_chan": resp_chan}
         try:
-            cmd, args = self._parse_cmd(content)
-            LOGGER.info("got command %s from user %s", cmd, user.name)
-            cmd = self._bot_commands.get(cmd, self._unknown_command)
-            ctx = {"user": user, "guild": guild, "resp_chan": resp_chan}
-            LOGGER.info("invoking command %s for user %s", cmd, user.name)
-            await cmd(ctx, *args)
+            try:
+                cmd, args = self._parse_cmd(content)
+            except ArgumentError as e:
+                LOGGER.info("wrong arguments from user %s: %s", user.name, e)
+                await user.send(str(e))
+                return
+            if cmd is None:
+                await self._unknown_command(ctx)
+                return
+            LOGGER.info("invoking command %s for user %s", cmd.name(), user.name)
+            try:
+                with COMMAND_SECONDS.time(cmd.name()):
+                    await cmd(ctx, *args)
+            except Exception:
+                COMMAND_FAILURES.inc(cmd.name())
+                raise
         except Exception as e:
             LOGGER.error("couldn't parse command %a, traceback: %s", e, traceback.format_exc())
             await resp_chan.send(str(e))
@@ -99,21 +186,19 @@ class VoiceActivity(discord.Client):
     def _parse_cmd(self, mess):
         """
         Here we should parse command and its arguments.
-        If anything is wrong (for example number of arguments
-        for the command does not match) then exception should
-        be raised.
+        Returns the command and its converted arguments or
+        `(None, None)` if the message does not start with any
+        of the commands. If the arguments do not match the command
+        `ArgumentError` is raised.
         """
-        try:
-            LOGGER.debug("parsing message: '%s'", mess)
-            ment, *rest = mess.split(" ")
-            if ment == f"@{self.user.name}":
-                mess = " ".join(rest).strip()
-            matches = COMMAND_REGEX.findall(mess)
-            matches = [x.strip('"') for x in matches]
-            cmd, *args = matches
-        except ValueError:
-            raise ValueError("wrong command format, expected `cmd arg2 arg2...`")
-        return cmd, args
+        LOGGER.debug("parsing message: '%s'", mess)
+        if self.user is not None and mess.startswith(f"@{self.user.name} "):
+            mess = mess[len(self.user.name) + 2:]
+        match = self._router.match(mess.strip())
+        if match is None:
+            return None, None
+        cmd, parser, rest = match
+        return cmd, parser.parse(rest)
 
     async def _unknown_command(self, ctx, *args):
         LOGGER.info("got unknown command from user %s", ctx['user'].name)
@@ -121,10 +206,8 @@ class VoiceActivity(discord.Client):
 
     async def on_message(self, message):
         LOGGER.debug("got new message: '%s' from '%s' guild is '%s'", message.content, message.author.name, message.guild)
-        prevent_default = False
-        for listener in self._bot_listeners:
-            res = await listener.on_message(message)
-            prevent_default = prevent_default or (res is not None and res)
+        prevent_default = await self._events.emit(
+            "on_message", message, guild=message.guild, channels=(message.channel.id,))
         if prevent_default:
             return
         if message.author == self.user:
@@ -153,17 +236,61 @@ class VoiceActivity(discord.Client):
                 await self._run_cmd(message.author, ctx.guild, dm_chan, message.content)
         LOGGER.debug("message not important for me")
 
+    async def on_ready(self):
+        LOGGER.info("connected as %s", self.user)
+        await self._events.emit("on_ready")
+
     async def on_voice_state_update(self, mem, bef, after):
-        for listener in self._bot_listeners:
-            await listener.on_voice_state_update(mem, bef, after)
+        await self.coalescer.push(mem, bef, after, time.time())
 
-    async def _remove_context(self, user_id):
-        await asyncio.sleep(USER_CTX_TIMEOUT)
+    async def _emit_voice_state_update(self, mem, bef, after, timestamp):
+        EVENT_TIME.set(timestamp)
+        channels = [state.channel.id for state in (bef, after) if state.channel is not None]
+        await self._events.emit(
+            "on_voice_state_update", mem, bef, after, guild=mem.guild, channels=channels)
+
+    async def on_member_update(self, before, after):
+        await self._events.emit("on_member_update", before, after, guild=after.guild)
+
+    async def on_member_remove(self, member):
+        await self._events.emit("on_member_remove", member, guild=member.guild)
+
+    def _remove_context(self, user_id):
         LOGGER.debug("removing user %a context", user_id)
-        del self._users_context[user_id]
+        self._users_context.pop(user_id, None)
+
+
+def _instrumented(request):
+
+    async def instrumented(route, **kwargs):
+        endpoint = f"{route.method} {route.path}"
+        DISCORD_API_CALLS.inc(endpoint)
+        with DISCORD_API_SECONDS.time(endpoint):
+            return await request(route, **kwargs)
+    return instrumented
 
 
-def create_bot(*args, **kwargs):
-    bot = VoiceActivity()
-    bot.autodiscover_plugins(voice_activity.modules, *args, **kwargs)
+def create_bot(*args, plugins=None, **kwargs):
+    """
+    Creates the bot with the enabled plugins, `config.plugins` unless
+    `plugins` are given, and the plugins they depend on.
+    """
+    config = kwargs.get("config")
+    if config is not None and config.shard_id is not None:
+        bot = VoiceActivity(shard_id=config.shard_id, shard_count=config.shard_count)
+    else:
+        bot = VoiceActivity()
+    if config is not None:
+        bot.coalescer.window = config.voice_flap_window
+        bot.responses.max_size = config.response_cache_size
+        bot.responses.ttl = config.response_cache_ttl
+        bot.outbox.rate = config.outbound_rate
+        bot.outbox.per = config.outbound_per
+        bot.outbox.coalesce_window = config.outbound_coalesce_window
+    if plugins is None and config is not None:
+        plugins = config.plugins
+    start = time.perf_counter()
+    bot.load_plugins(PluginRegistry().resolve(plugins), *args, **kwargs)
+    LOGGER.info(
+        "started %d plugins in %.3fs", len(bot.startup_timings), time.perf_counter() - start)
     return bot
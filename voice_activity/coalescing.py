@@ -0,0 +1,75 @@
+import contextvars
+import logging
+import time
+
+from voice_activity.metrics import REGISTRY
+
+LOGGER = logging.getLogger(__name__)
+COALESCED_EVENTS = REGISTRY.counter(
+    "voice_events_coalesced", "Voice state updates not delivered to the listeners.", ["reason"])
+
+# when the voice state update being handled happened, it can be
+# earlier than now if the update was held back by the coalescer
+EVENT_TIME = contextvars.ContextVar("event_time", default=None)
+
+
+def event_time():
+    timestamp = EVENT_TIME.get()
+    return time.time() if timestamp is None else timestamp
+
+
+def _channel_id(state):
+    return None if state.channel is None else state.channel.id
+
+
+class VoiceCoalescer:
+    """
+    Filters voice state updates before they reach the listeners.
+
+    Updates which do not change the channel (mute, deafen, streaming
+    and video toggles) are dropped. Leaves are held back for `window`
+    seconds: if the member rejoins the same channel within it both
+    updates are dropped and the session goes on as if they never
+    left, otherwise the leave is delivered with its original time
+    available through `event_time`.
+    """
+
+    def __init__(self, scheduler, emit, window=0):
+        self._scheduler = scheduler
+        self._emit = emit
+        self.window = window
+        # (guild, member) -> (member, before, after, timestamp) of the held leave
+        self._held = {}
+
+    async def push(self, member, before, after, timestamp):
+        if _channel_id(before) == _channel_id(after):
+            COALESCED_EVENTS.inc("noop")
+            return
+        key = (member.guild.id, member.id)
+        held = self._held.pop(key, None)
+        if held is not None:
+            self._scheduler.cancel(("voice_leave", key))
+            if before.channel is None and _channel_id(after) == _channel_id(held[1]):
+                LOGGER.debug("member %a rejoined channel %a", member.id, after.channel.id)
+                COALESCED_EVENTS.inc("flap", amount=2)
+                return
+            await self._emit(*held)
+        if self.window and after.channel is None:
+            self._held[key] = (member, before, after, timestamp)
+            self._scheduler.schedule(("voice_leave", key), self.window, self._release, key)
+            return
+        await self._emit(member, before, after, timestamp)
+
+    async def flush(self):
+        """
+        Delivers all of the held leaves right away.
+        """
+        for key in list(self._held):
+            self._scheduler.cancel(("voice_leave", key))
+            await self._emit(*self._held.pop(key))
+
+    def _release(self, key):
+        held = self._held.pop(key, None)
+        if held is not None:
+            return self._emit(*held)
+        return None
@@ -0,0 +1,82 @@
+import re
+
+from voice_activity.abc import AbstractCommand
+
+ARGUMENT_REGEX = re.compile(r'"([^"]*)"|(\S+)')
+
+
+class ArgumentError(ValueError):
+    """
+    Raised when the command's arguments do not match its `run` method.
+    """
+
+
+class ArgumentParser:
+    """
+    Splits and converts the arguments of a single command.
+
+    Built once per command from the converters collected
+    by `AbstractCommand` so invoking the command does not
+    inspect its signature again.
+    """
+
+    def __init__(self, command):
+        self._converters, self._required = AbstractCommand._subclasses[type(command)]
+
+    def parse(self, text):
+        if '"' in text:
+            args = [quoted or word for quoted, word in ARGUMENT_REGEX.findall(text)]
+        else:
+            args = text.split()
+        if not self._required <= len(args) <= len(self._converters):
+            if self._required == len(self._converters):
+                expected = self._required
+            else:
+                expected = f"{self._required} to {len(self._converters)}"
+            raise ArgumentError(
+                f"wrong number of arguments, expected {expected} got {len(args)}")
+        try:
+            return [conv(arg) for conv, arg in zip(self._converters, args)]
+        except ValueError as e:
+            raise ArgumentError(str(e)) from e
+
+
+class CommandRouter:
+    """
+    Finds the command a message starts with.
+
+    Names and aliases of the commands are kept in a character
+    trie so a message is matched in a single pass over its prefix,
+    messages which do not start with any command are rejected
+    as soon as their first characters do not match.
+    """
+
+    def __init__(self):
+        self._root = {}
+
+    def add(self, name, command, parser):
+        node = self._root
+        for char in name:
+            node = node.setdefault(char, {})
+        node[None] = (command, parser)
+
+    def match(self, text):
+        """
+        Returns `(command, parser, rest_of_text)` for the longest command
+        name followed by whitespace or the end of the text, or None.
+        """
+        node = self._root
+        found = None
+        for i, char in enumerate(text):
+            if char.isspace() and None in node:
+                found = node[None], i
+            node = node.get(char)
+            if node is None:
+                break
+        else:
+            if None in node:
+                found = node[None], len(text)
+        if found is None:
+            return None
+        (command, parser), end = found
+        return command, parser, text[end:]
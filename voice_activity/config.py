@@ -4,3 +4,59 @@ from dataclasses import dataclass
 @dataclass
 class Config:
     data_directory = "/data"
+    # either "sqlite", "tinydb" or "partitioned" (TinyDB files per guild)
+    storage_backend = "sqlite"
+    sqlite_file = "voice_activity.sqlite3"
+    # keep TinyDB tables in memory and write them back in batches
+    cache_storage = True
+    cache_flush_interval = 30  # in seconds
+    cache_max_dirty = 100
+    # format of the TinyDB files, "json" or "msgpack" (needs the msgpack package)
+    tinydb_format = "json"
+    # TinyDB tables stored as packed ids and integer seconds,
+    # any of "subscriptions" and "time_counts"
+    tinydb_packed_tables = ()
+    # guild partitions kept open at most and closed after being idle
+    partition_max_open = 100
+    partition_idle_timeout = 600  # in seconds
+    # how many notifications can be sent at the same time
+    notification_concurrency = 10
+    notification_max_retries = 3
+    # how often the subscribers in digest mode get their digests
+    notification_digest_interval = 600  # in seconds
+    member_cache_ttl = 600  # in seconds
+    member_cache_size = 10000
+    # command responses cached until their data changes or they expire
+    response_cache_size = 1000
+    response_cache_ttl = 300  # in seconds
+    # replies sent to a channel at most, per seconds (None for no limit), and how long
+    # to wait for more replies to send them together
+    outbound_rate = 5
+    outbound_per = 5  # in seconds
+    outbound_coalesce_window = 0.1  # in seconds
+    session_log_file = "sessions.log"
+    session_log_compact_interval = 60  # in seconds
+    session_log_max_records = 10000
+    heartbeat_interval = 30  # in seconds
+    # leaving and rejoining a channel within this many seconds
+    # does not end the session nor notify the subscribers, 0 disables it
+    voice_flap_window = 5
+    # track-stats shows this many most active users
+    leaderboard_size = 50
+    leaderboard_page_size = 15
+    # names of the enabled plugins, their dependencies are enabled
+    # as well, None enables all of the known plugins
+    plugins = None
+    log_level = "INFO"
+    # metrics are served on http://metrics_host:metrics_port/metrics,
+    # shards use consecutive ports, None disables the endpoint
+    metrics_host = "127.0.0.1"
+    metrics_port = 9108
+    # more than one shard runs every shard in its own process
+    # with the storage owned by the main process
+    shard_count = 1
+    storage_socket = "storage.sock"
+    # set by the launcher for the shard processes
+    shard_id = None
+    storage_address = None
+    storage_authkey = None
@@ -0,0 +1,63 @@
+import asyncio
+import logging
+
+LOGGER = logging.getLogger(__name__)
+
+
+class ActivityDigest:
+    """
+    Collects channel activations for the digest subscribers.
+
+    Nothing is sent until `flush`, which sends every user with pending
+    activations a single message per guild covering all of their
+    channels there, so a period costs one message per user and guild
+    no matter how many activations there were. Pending activations are
+    kept in memory only, `close` sends them when the bot is shutting down.
+    """
+
+    def __init__(self, dispatcher):
+        self._dispatcher = dispatcher
+        # (guild id, user) -> (guild, channel id -> (channel name, names of who started it)),
+        # the members are resolved through the guild the digest is sent for
+        self._pending = {}
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, guild, channel, started_by, user_ids):
+        for user_id in user_ids:
+            _, channels = self._pending.setdefault((guild.id, user_id), (guild, {}))
+            _, starters = channels.setdefault(channel.id, (channel.name, []))
+            starters.append(started_by)
+
+    def flush(self):
+        """
+        Starts sending the digests, returns the dispatcher tasks.
+        """
+        pending, self._pending = self._pending, {}
+        if not pending:
+            return []
+        by_guild = {}
+        for (guild_id, user_id), (guild, channels) in pending.items():
+            by_guild.setdefault(guild_id, (guild, {}))[1][user_id] = self.format(channels)
+        LOGGER.info("sending %d activity digests", len(pending))
+        return [
+            self._dispatcher.dispatch_each(guild, contents)
+            for guild, contents in by_guild.values()
+        ]
+
+    async def close(self):
+        """
+        Sends the pending digests and waits for them to be delivered.
+        """
+        tasks = self.flush()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    @staticmethod
+    def format(channels):
+        lines = ["Activity since the last digest:"]
+        for name, starters in sorted(channels.values()):
+            times = "once" if len(starters) == 1 else f"{len(starters)} times"
+            lines.append(f"{name}: started {times} by {', '.join(sorted(set(starters)))}")
+        return "\n".join(lines)
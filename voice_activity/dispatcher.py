@@ -0,0 +1,104 @@
+import asyncio
+import logging
+import time
+
+from dataclasses import dataclass
+
+import discord
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_RETRY_AFTER = 1.0  # in seconds
+
+
+@dataclass
+class DeliveryStats:
+    sent: int = 0
+    failed: int = 0
+    retried: int = 0
+    elapsed: float = 0.0
+
+
+class NotificationDispatcher:
+    """
+    Sends direct messages to many users at once.
+
+    Each batch runs as a background task so the caller does not
+    wait for the delivery. At most `concurrency` messages are in
+    flight at the same time and when Discord answers with 429 all
+    of the senders pause for the requested retry-after period.
+    """
+
+    def __init__(self, members, concurrency=10, max_retries=3):
+        self._members = members
+        self._concurrency = concurrency
+        self._max_retries = max_retries
+        self._semaphore = None
+        self._resume_at = 0.0
+        self._tasks = set()
+
+    def dispatch(self, guild, user_ids, content):
+        """
+        Starts delivering `content` to the given members of the
+        guild. Returns the task which results in `DeliveryStats`.
+        """
+        return self.dispatch_each(guild, {user_id: content for user_id in user_ids})
+
+    def dispatch_each(self, guild, contents):
+        """
+        Like `dispatch` but with different content for every member,
+        given as a mapping of user id to content.
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._concurrency)
+        task = asyncio.create_task(self._deliver(guild, dict(contents)))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def close(self):
+        for task in self._tasks:
+            task.cancel()
+
+    async def _deliver(self, guild, contents):
+        stats = DeliveryStats()
+        start = time.monotonic()
+        members = await self._members.get_many(guild, list(contents))
+        stats.failed = len(contents) - len(members)
+        await asyncio.gather(*(
+            self._send(member, contents[user_id], stats) for user_id, member in members.items()))
+        stats.elapsed = time.monotonic() - start
+        LOGGER.info(
+            "notified %d/%d users in %.2fs (%d failed, %d retries)",
+            stats.sent, len(contents), stats.elapsed, stats.failed, stats.retried)
+        return stats
+
+    async def _send(self, user, content, stats):
+        async with self._semaphore:
+            for attempt in range(self._max_retries + 1):
+                await self._wait_for_rate_limit()
+                try:
+                    LOGGER.debug("notifying user %s", user.name)
+                    await user.send(content)
+                    stats.sent += 1
+                    return
+                except discord.HTTPException as e:
+                    if e.status != 429 or attempt == self._max_retries:
+                        LOGGER.warning("could not notify user %s: %s", user.name, e)
+                        stats.failed += 1
+                        return
+                    self._rate_limited(e)
+                    stats.retried += 1
+
+    async def _wait_for_rate_limit(self):
+        delay = self._resume_at - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def _rate_limited(self, exc):
+        try:
+            retry_after = float(exc.response.headers["Retry-After"])
+        except (AttributeError, KeyError, TypeError, ValueError):
+            retry_after = DEFAULT_RETRY_AFTER
+        LOGGER.info("rate limited, pausing notifications for %.2fs", retry_after)
+        self._resume_at = max(self._resume_at, time.monotonic() + retry_after)
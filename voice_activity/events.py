@@ -0,0 +1,98 @@
+import asyncio
+import logging
+import traceback
+
+from voice_activity.abc import (
+    AbstractListener,
+    ListenerMode,
+)
+from voice_activity.metrics import REGISTRY
+
+LOGGER = logging.getLogger(__name__)
+LISTENER_SECONDS = REGISTRY.histogram(
+    "listener_seconds", "Time spent in the listener event handlers.", ["listener", "event"])
+
+EVENTS = (
+    "on_ready",
+    "on_message",
+    "on_voice_state_update",
+    "on_member_update",
+    "on_member_remove",
+)
+
+
+class EventBus:
+    """
+    Delivers the bot events to the listeners.
+
+    Ordered and veto listeners are awaited one by one in the order
+    they were added, then all of the concurrent ones are awaited
+    together and fire-and-forget ones are left running in the
+    background. A failing or hanging listener is logged and does
+    not affect the others.
+    """
+
+    def __init__(self):
+        self._listeners = {event: [] for event in EVENTS}
+        self._tasks = set()
+
+    def add(self, listener):
+        for event in EVENTS:
+            handler = getattr(type(listener), event)
+            if handler is not getattr(AbstractListener, event):
+                self._listeners[event].append(listener)
+
+    def listeners(self, event):
+        return list(self._listeners[event])
+
+    async def emit(self, event, *args, guild=None, channels=()):
+        """
+        Calls `event` handler of every listener interested in it.
+        Returns True if any of the veto listeners vetoed the event.
+        """
+        ordered, concurrent = [], []
+        for listener in self._listeners[event]:
+            if not self._accepts(listener, guild, channels):
+                continue
+            if listener.mode in (ListenerMode.ORDERED, ListenerMode.VETO):
+                ordered.append(listener)
+            elif listener.mode == ListenerMode.CONCURRENT:
+                concurrent.append(listener)
+            else:
+                task = asyncio.create_task(self._call(listener, event, args))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+        vetoed = False
+        for listener in ordered:
+            res = await self._call(listener, event, args)
+            vetoed = vetoed or (listener.mode == ListenerMode.VETO and bool(res))
+        if concurrent:
+            await asyncio.gather(*(
+                self._call(listener, event, args) for listener in concurrent))
+        return vetoed
+
+    def close(self):
+        for task in self._tasks:
+            task.cancel()
+
+    @staticmethod
+    def _accepts(listener, guild, channels):
+        if listener.guilds is not None and (guild is None or guild.id not in listener.guilds):
+            return False
+        if listener.channels is not None and channels:
+            return any(chan in listener.channels for chan in channels)
+        return True
+
+    @staticmethod
+    async def _call(listener, event, args):
+        try:
+            with LISTENER_SECONDS.time(type(listener).__name__, event):
+                return await asyncio.wait_for(getattr(listener, event)(*args), listener.timeout)
+        except asyncio.TimeoutError:
+            LOGGER.warning(
+                "%s.%s timed out after %ss", type(listener).__name__, event, listener.timeout)
+        except Exception:
+            LOGGER.error(
+                "%s.%s failed, traceback: %s",
+                type(listener).__name__, event, traceback.format_exc())
+        return None
@@ -0,0 +1,218 @@
+import csv
+import json
+import logging
+import os.path
+import struct
+import sys
+
+from array import array
+from itertools import repeat
+
+from voice_activity.abc import StorageDump
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+LOGGER = logging.getLogger(__name__)
+
+# columns of the `StorageDump` tables with their `array` typecodes,
+# columns missing in an imported file are read as zeros so exports
+# made before a column was added, like the digest mode, still load
+SCHEMAS = {
+    "subscriptions": (("guild", "q"), ("channel", "q"), ("user", "q"), ("digest", "q")),
+    "tracked_channels": (("guild", "q"), ("channel", "q")),
+    "open_sessions": (("guild", "q"), ("channel", "q"), ("user", "q"), ("joined_at", "d")),
+    "time_counts": (("guild", "q"), ("channel", "q"), ("user", "q"), ("seconds", "d")),
+    "rollups": (
+        ("guild", "q"), ("channel", "q"), ("user", "q"),
+        ("granularity", "q"), ("bucket", "q"), ("seconds", "d")),
+}
+# tracked channels go first, some backends ignore sessions on untracked ones
+IMPORT_ORDER = ("tracked_channels", "subscriptions", "open_sessions", "time_counts", "rollups")
+
+BINARY_MAGIC = b"VACOLS1\n"
+EXTENSIONS = {"csv": ".csv", "parquet": ".parquet", "binary": ".bin"}
+
+
+def columnar_format():
+    """
+    Parquet if pyarrow is installed, the packed binary format otherwise.
+    """
+    return "parquet" if pyarrow is not None else "binary"
+
+
+class CsvWriter:
+
+    def __init__(self, path, schema):
+        self._file = open(path, "w", newline="")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(name for name, _ in schema)
+
+    def write(self, rows):
+        self._writer.writerows(rows)
+
+    def close(self):
+        self._file.close()
+
+
+class BinaryWriter:
+    """
+    Writes the rows as blocks of packed columns: a block is the number
+    of its rows followed by every column as a packed `array` in the
+    byte order named in the JSON header.
+    """
+
+    def __init__(self, path, schema):
+        self._schema = schema
+        self._file = open(path, "wb")
+        header = json.dumps({
+            "columns": [list(column) for column in schema],
+            "byteorder": sys.byteorder,
+        }).encode()
+        self._file.write(BINARY_MAGIC + struct.pack("<I", len(header)) + header)
+
+    def write(self, rows):
+        if not rows:
+            return
+        self._file.write(struct.pack("<I", len(rows)))
+        for i, (_, typecode) in enumerate(self._schema):
+            self._file.write(array(typecode, (row[i] for row in rows)).tobytes())
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetWriter:
+
+    def __init__(self, path, schema):
+        self._schema = schema
+        types = {"q": pyarrow.int64(), "d": pyarrow.float64()}
+        self._arrow_schema = pyarrow.schema([(name, types[code]) for name, code in schema])
+        self._writer = pyarrow.parquet.ParquetWriter(path, self._arrow_schema)
+
+    def write(self, rows):
+        if not rows:
+            return
+        columns = [[row[i] for row in rows] for i in range(len(self._schema))]
+        self._writer.write_table(pyarrow.Table.from_arrays(
+            [pyarrow.array(column, type=field.type) for column, field in zip(columns, self._arrow_schema)],
+            schema=self._arrow_schema))
+
+    def close(self):
+        self._writer.close()
+
+
+WRITERS = {"csv": CsvWriter, "binary": BinaryWriter, "parquet": ParquetWriter}
+
+
+def read_csv(path, schema, chunk_size):
+    converters = [int if code == "q" else float for _, code in schema]
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        indexes = [header.index(name) if name in header else None for name, _ in schema]
+        chunk = []
+        for line in reader:
+            chunk.append(tuple(
+                0 if i is None else conv(line[i]) for conv, i in zip(converters, indexes)))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+def read_binary(path, schema, chunk_size):
+    with open(path, "rb") as f:
+        if f.read(len(BINARY_MAGIC)) != BINARY_MAGIC:
+            raise ValueError(f"{path} is not a packed columns file")
+        [header_size] = struct.unpack("<I", f.read(4))
+        header = json.loads(f.read(header_size))
+        expected = dict(schema)
+        if any(expected.get(name) != code for name, code in header["columns"]):
+            raise ValueError(f"{path} has columns {header['columns']}, expected {list(schema)}")
+        while True:
+            size = f.read(4)
+            if not size:
+                return
+            [count] = struct.unpack("<I", size)
+            columns = {}
+            for name, code in header["columns"]:
+                column = array(code)
+                column.frombytes(f.read(count * column.itemsize))
+                if header["byteorder"] != sys.byteorder:
+                    column.byteswap()
+                columns[name] = column
+            rows = list(zip(*(columns.get(name, repeat(0, count)) for name, _ in schema)))
+            for i in range(0, len(rows), chunk_size):
+                yield rows[i:i + chunk_size]
+
+
+def read_parquet(path, schema, chunk_size):
+    if pyarrow is None:
+        raise RuntimeError(f"pyarrow is required to import {path}")
+    for batch in pyarrow.parquet.ParquetFile(path).iter_batches(batch_size=chunk_size):
+        columns = batch.to_pydict()
+        yield list(zip(*(columns.get(name, repeat(0, batch.num_rows)) for name, _ in schema)))
+
+
+READERS = {"csv": read_csv, "binary": read_binary, "parquet": read_parquet}
+
+
+def export_storage(backend, directory, formats=None, chunk_size=10000):
+    """
+    Streams every table of the backend into `<table>.<ext>` files in
+    `directory`, one per each of the `formats` (CSV and the best
+    available columnar format by default). Returns rows written per table.
+    Sessions in the session log which were not compacted into the
+    storage yet are not part of the export.
+    """
+    if formats is None:
+        formats = ("csv", columnar_format())
+    os.makedirs(directory, exist_ok=True)
+    counts = {}
+    for table, schema in SCHEMAS.items():
+        writers = [
+            WRITERS[fmt](os.path.join(directory, table + EXTENSIONS[fmt]), schema)
+            for fmt in formats
+        ]
+        counts[table] = 0
+        try:
+            for rows in backend.dump_chunks(table, chunk_size):
+                for writer in writers:
+                    writer.write(rows)
+                counts[table] += len(rows)
+        finally:
+            for writer in writers:
+                writer.close()
+        LOGGER.info("exported %d rows of %s", counts[table], table)
+    return counts
+
+
+def import_storage(backend, directory, chunk_size=10000):
+    """
+    Merges the tables exported to `directory` into the backend, chunk
+    by chunk. Time counts and rollups are added to the stored ones.
+    Columnar files are preferred over CSV when both are present.
+    Returns rows read per table.
+    """
+    counts = {}
+    for table in IMPORT_ORDER:
+        for fmt in ("parquet", "binary", "csv"):
+            path = os.path.join(directory, table + EXTENSIONS[fmt])
+            if os.path.exists(path):
+                break
+        else:
+            LOGGER.info("nothing to import for %s", table)
+            continue
+        counts[table] = 0
+        empty = {name: () for name in StorageDump._fields}
+        for rows in READERS[fmt](path, SCHEMAS[table], chunk_size):
+            backend.load(StorageDump(**{**empty, table: rows}))
+            counts[table] += len(rows)
+        LOGGER.info("imported %d rows of %s from %s", counts[table], table, path)
+    backend.flush()
+    return counts
@@ -0,0 +1,79 @@
+import copy
+import logging
+import multiprocessing
+import os
+import os.path
+import signal
+
+from voice_activity.backends.storage_server import StorageServer
+from voice_activity.bot import create_bot
+from voice_activity.modules.storage import create_backend
+
+LOGGER = logging.getLogger(__name__)
+
+SHUTDOWN_TIMEOUT = 30  # in seconds
+
+
+def run_sharded(token, config):
+    """
+    Runs `config.shard_count` shards of the bot, each in its own process.
+
+    This process becomes the storage owner: it opens the storage and
+    serves it to the shards over a unix socket in the data directory,
+    so the storage files only ever have one writer. SIGTERM, like
+    from `docker stop`, shuts everything down the same way an
+    interrupt from the terminal does.
+    """
+    address = os.path.join(config.data_directory, config.storage_socket)
+    if os.path.exists(address):
+        os.remove(address)
+    backend = create_backend(config)
+    server = StorageServer(backend, address, authkey=os.urandom(32))
+    server.start()
+    ctx = multiprocessing.get_context("spawn")
+    workers = []
+
+    def terminate(signum, frame):
+        # unlike an interrupt from the terminal only this process got it
+        for worker in workers:
+            if worker.is_alive():
+                os.kill(worker.pid, signal.SIGINT)
+        raise KeyboardInterrupt
+
+    previous_handler = signal.signal(signal.SIGTERM, terminate)
+    try:
+        for shard_id in range(config.shard_count):
+            shard_config = copy.copy(config)
+            shard_config.shard_id = shard_id
+            shard_config.storage_address = address
+            shard_config.storage_authkey = server.authkey
+            worker = ctx.Process(
+                target=run_shard, args=(token, shard_config), name=f"shard-{shard_id}")
+            worker.start()
+            LOGGER.info("started shard %d/%d, pid %d", shard_id, config.shard_count, worker.pid)
+            workers.append(worker)
+        for worker in workers:
+            worker.join()
+            LOGGER.info("%s exited with code %s", worker.name, worker.exitcode)
+    except KeyboardInterrupt:
+        # the shards got the interrupt as well, give them time to close
+        LOGGER.info("stopping shards")
+        for worker in workers:
+            worker.join(SHUTDOWN_TIMEOUT)
+    finally:
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+                worker.join()
+        server.close()
+        backend.close()
+        # closing the server usually removes the socket already
+        if os.path.exists(address):
+            os.remove(address)
+        signal.signal(signal.SIGTERM, previous_handler)
+
+
+def run_shard(token, config):
+    logging.basicConfig(level=config.log_level)
+    bot = create_bot(config=config)
+    bot.run(token)
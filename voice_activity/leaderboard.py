@@ -0,0 +1,36 @@
+import heapq
+
+from operator import itemgetter
+
+ORDERS = ("time", "name")
+
+
+def parse_order(text):
+    order = text.strip().lower()
+    if order not in ORDERS:
+        raise ValueError(f"invalid sort order {text!r}, expected one of: {', '.join(ORDERS)}")
+    return order
+
+
+def format_duration(seconds):
+    """
+    Formats seconds as `H:MM:SS`, hours are not wrapped at a day.
+    """
+    minutes, secs = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02}:{secs:02}"
+
+
+def top_users(stats, k):
+    """
+    Returns `k` `(user, seconds)` pairs with the most seconds,
+    the most active first, without sorting all of the users.
+    """
+    return heapq.nlargest(k, stats.items(), key=itemgetter(1))
+
+
+def pages(entries, page_size):
+    """
+    Splits the entries into pages of at most `page_size` entries.
+    """
+    return [entries[i:i + page_size] for i in range(0, len(entries), page_size)]
@@ -0,0 +1,116 @@
+import asyncio
+import logging
+import time
+
+from collections import OrderedDict
+
+import discord
+
+from voice_activity.metrics import REGISTRY
+
+LOGGER = logging.getLogger(__name__)
+# the same counter as the one of the HTTP client, the registry shares it by name
+DISCORD_API_CALLS = REGISTRY.counter(
+    "discord_api_calls", "Discord HTTP API requests made.", ["endpoint"])
+
+QUERY_CHUNK_SIZE = 100  # max number of user ids in a single members query
+
+
+class MemberCache:
+    """
+    LRU cache of guild members with time based expiry.
+
+    Members are looked up in the client's member cache first,
+    only those not found there are requested from discord, all
+    at once in chunks through the gateway, or if that is not possible
+    (it requires the members intent) one by one concurrently.
+    """
+
+    def __init__(self, ttl=600, max_size=10000, query_members=True):
+        self._ttl = ttl
+        self._max_size = max_size
+        self._query_members = query_members
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    async def get(self, guild, user_id):
+        """
+        Returns the member or None if it could not be found.
+        """
+        members = await self.get_many(guild, [user_id])
+        return members.get(user_id)
+
+    async def get_many(self, guild, user_ids):
+        """
+        Returns mapping of user id to member for every one
+        of the `user_ids` that could be found in the guild.
+        """
+        found = {}
+        misses = []
+        for user_id in user_ids:
+            member = self._lookup(guild.id, user_id)
+            if member is None:
+                member = guild.get_member(user_id)
+                if member is not None:
+                    self._store(guild.id, member)
+            if member is None:
+                misses.append(user_id)
+            else:
+                found[user_id] = member
+        if misses:
+            LOGGER.debug("fetching %d members of guild %a", len(misses), guild.id)
+            for member in await self._fetch(guild, misses):
+                self._store(guild.id, member)
+                found[member.id] = member
+        return found
+
+    def invalidate(self, guild_id, user_id):
+        self._entries.pop((guild_id, user_id), None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def _lookup(self, guild_id, user_id):
+        key = (guild_id, user_id)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        member, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return member
+
+    def _store(self, guild_id, member):
+        key = (guild_id, member.id)
+        self._entries[key] = (member, time.monotonic() + self._ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+
+    async def _fetch(self, guild, user_ids):
+        if not self._query_members:
+            return await self._fetch_each(guild, user_ids)
+        members = []
+        for i in range(0, len(user_ids), QUERY_CHUNK_SIZE):
+            chunk = user_ids[i:i + QUERY_CHUNK_SIZE]
+            try:
+                DISCORD_API_CALLS.inc("GATEWAY query_members")
+                members.extend(await guild.query_members(user_ids=chunk, limit=len(chunk)))
+            except (discord.ClientException, asyncio.TimeoutError, RuntimeError) as e:
+                LOGGER.debug("querying members failed (%s), fetching one by one", e)
+                members.extend(await self._fetch_each(guild, chunk))
+        return members
+
+    async def _fetch_each(self, guild, user_ids):
+        async def fetch(user_id):
+            try:
+                return await guild.fetch_member(user_id)
+            except discord.HTTPException as e:
+                LOGGER.debug("could not fetch member %a: %s", user_id, e)
+                return None
+        members = await asyncio.gather(*(fetch(user_id) for user_id in user_ids))
+        return [m for m in members if m is not None]
@@ -1,5 +1,4 @@
-from voice_activity.modules import (
-    default_modules,
-    sub,
-    time_count,
-)
\ No newline at end of file
+"""
+Plugins shipped with the bot, imported only when enabled,
+see `voice_activity.plugins.MANIFEST`.
+"""
\ No newline at end of file
@@ -21,10 +21,6 @@ class HelpMixin:
 
 class HelpCommand(AbstractCommand, HelpMixin):
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self._cached_help = None
-
     def name(self) -> str:
         return "help"
 
@@ -32,10 +28,10 @@ class HelpCommand(AbstractCommand, HelpMixin):
         return "shows this message"
 
     async def run(self, ctx):
-        resp_chan = ctx['resp_chan']
-        if self._cached_help is None:
-            self._cached_help = self._compute_help_msg()
-        await resp_chan.send(self._cached_help)
+        # recomputed once commands are added
+        await self._bot.responses.respond(
+            ("help", None, ()), [("commands",)], ctx['resp_chan'],
+            lambda resp_chan: resp_chan.send(self._compute_help_msg()))
 
     def _compute_help_msg(self):
         descriptions = {
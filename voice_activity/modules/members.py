@@ -0,0 +1,35 @@
+import logging
+
+from voice_activity.abc import (
+    AbstractListener,
+    AbstractPlugin,
+)
+from voice_activity.members import MemberCache
+
+LOGGER = logging.getLogger(__name__)
+
+
+class MemberCachePlugin(AbstractPlugin):
+    """
+    Exposes `MemberCache` as `bot.members`.
+    """
+
+    def __init__(self, bot, *args, config, **kwargs):
+        if config is None:
+            raise AttributeError("Configuration is required")
+        bot.members = MemberCache(
+            ttl=config.member_cache_ttl,
+            max_size=config.member_cache_size,
+            query_members=bot.intents.members)
+        bot.add_module(MemberCacheListener)
+
+
+class MemberCacheListener(AbstractListener):
+
+    async def on_member_update(self, before, after):
+        LOGGER.debug("member %a of guild %a updated", after.id, after.guild.id)
+        self._bot.members.invalidate(after.guild.id, after.id)
+
+    async def on_member_remove(self, member):
+        LOGGER.debug("member %a left guild %a", member.id, member.guild.id)
+        self._bot.members.invalidate(member.guild.id, member.id)
@@ -0,0 +1,20 @@
+import logging
+
+from voice_activity.abc import AbstractPlugin
+from voice_activity.metrics import serve_metrics
+
+LOGGER = logging.getLogger(__name__)
+
+
+class MetricsPlugin(AbstractPlugin):
+    """
+    Serves the collected metrics over HTTP in the Prometheus text format.
+    """
+
+    def __init__(self, bot, *args, config, **kwargs):
+        if config is None:
+            raise AttributeError("Configuration is required")
+        if config.metrics_port is None:
+            return
+        port = config.metrics_port + (config.shard_id or 0)
+        bot.add_background_task(serve_metrics, config.metrics_host, port)
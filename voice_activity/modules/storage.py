@@ -1,9 +1,68 @@
+import os.path
+import logging
+
+from functools import partial
 from types import SimpleNamespace
 
 from voice_activity.abc import AbstractPlugin
+from voice_activity.backends.async_storage import AsyncStorage
+from voice_activity.backends.migration import migrate_tinydb
+from voice_activity.backends.partitioned_backend import PartitionedBackend
+from voice_activity.backends.sqlite_backend import SQLiteBackend
+from voice_activity.backends.storage_server import RemoteBackend
+from voice_activity.backends.tinydb_backend import TinyDBBackend
+from voice_activity.metrics import REGISTRY
+from voice_activity.utility import run_periodically
+
+LOGGER = logging.getLogger(__name__)
 
 
 class StoragePlugin(AbstractPlugin):
+    """
+    Creates the storage backend chosen in the configuration
+    and exposes it as `bot.storage.backend`, wrapped in `AsyncStorage`
+    so the plugins can await its calls without blocking the loop.
+    """
+
+    def __init__(self, bot, *args, config, **kwargs):
+        if config is None:
+            raise AttributeError("Configuration is required")
+        backend = AsyncStorage(create_backend(config))
+        bot.add_cleanup(backend.close)
+        if config.cache_flush_interval:
+            bot.add_background_task(run_periodically, backend.flush, config.cache_flush_interval)
+        REGISTRY.gauge(
+            "storage_queue_depth", "Storage calls waiting to be executed.",
+            lambda: backend.queue_depth)
+        bot.storage = SimpleNamespace(backend=backend)
+
+
+def tinydb_options(config):
+    return {
+        "cached": config.cache_storage,
+        "max_dirty": config.cache_max_dirty,
+        "storage_format": config.tinydb_format,
+        "packed_tables": config.tinydb_packed_tables,
+    }
+
 
-    def __init__(self, bot, *args, **kwargs):
-        bot.storage = SimpleNamespace()
+def create_backend(config):
+    if config.storage_address is not None:
+        LOGGER.info("using storage served at %s", config.storage_address)
+        return RemoteBackend(config.storage_address, authkey=config.storage_authkey)
+    LOGGER.info("using %s storage backend", config.storage_backend)
+    if config.storage_backend == "tinydb":
+        return TinyDBBackend(config.data_directory, **tinydb_options(config))
+    if config.storage_backend == "partitioned":
+        backend = PartitionedBackend(
+            config.data_directory,
+            partial(TinyDBBackend, **tinydb_options(config)),
+            max_open=config.partition_max_open,
+            idle_timeout=config.partition_idle_timeout)
+        migrate_tinydb(config.data_directory, backend, **tinydb_options(config))
+        return backend
+    if config.storage_backend == "sqlite":
+        backend = SQLiteBackend(os.path.join(config.data_directory, config.sqlite_file))
+        migrate_tinydb(config.data_directory, backend, **tinydb_options(config))
+        return backend
+    raise ValueError(f"unknown storage backend {config.storage_backend!r}")
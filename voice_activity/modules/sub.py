@@ -1,25 +1,26 @@
-import os.path
-import asyncio
 import logging
 
-from tinydb import TinyDB
-
 from voice_activity.abc import (
     AbstractCommand,
     AbstractListener,
     AbstractPlugin,
 )
+from voice_activity.digest import ActivityDigest
+from voice_activity.dispatcher import NotificationDispatcher
 from voice_activity.modules.default_modules import HelpMixin
-# this unused import is here so that plugin
-# autodiscovery discovers storage plugin earlier than
-# us as it is our dependency (we use `storage` field created
-# by it in our objects).
-from voice_activity.modules import storage
-from voice_activity.tinydb_exts.defaultdict import DefaultDict
+from voice_activity.utility import run_periodically
 
 LOGGER = logging.getLogger(__name__)
 
 PER_CHAN_TIMEOUT = 60  # in seconds
+DELIVERY_MODES = ("immediate", "digest")
+
+
+def parse_mode(text):
+    mode = text.strip().lower()
+    if mode not in DELIVERY_MODES:
+        raise ValueError(f"invalid delivery mode {text!r}, expected one of: {', '.join(DELIVERY_MODES)}")
+    return mode
 
 
 class SubPlugin(AbstractPlugin):
@@ -29,13 +30,21 @@ class SubPlugin(AbstractPlugin):
             raise AttributeError("Storage plugin required to run SubModule")
         if config is None:
             raise AttributeError("Configuration is required")
-        db_path = os.path.join(config.data_directory, "subs.db")
-        db = TinyDB(db_path)
-        bot.storage._subs = DefaultDict(db, set, list, set)
+        dispatcher = NotificationDispatcher(
+            bot.members,
+            concurrency=config.notification_concurrency,
+            max_retries=config.notification_max_retries)
+        bot.add_cleanup(dispatcher.close)
+        digest = ActivityDigest(dispatcher)
+        # cleanups run in reverse, the digest is sent before the dispatcher closes
+        bot.add_cleanup(digest.close)
+        bot.add_background_task(run_periodically, digest.flush, config.notification_digest_interval)
 
         bot.add_module(SubCommand)
         bot.add_module(UnsubCommand)
-        bot.add_module(NotificationListener)
+        bot.add_module(ListSubsCommand)
+        bot.add_module(UnsubAllCommand)
+        bot.add_module(NotificationListener, dispatcher, digest)
 
 
 class SubCommand(AbstractCommand, HelpMixin):
@@ -43,7 +52,7 @@ class SubCommand(AbstractCommand, HelpMixin):
     def name(self) -> str:
         return "sub"
 
-    async def run(self, ctx, chan):
+    async def run(self, ctx, chan, mode: parse_mode = "immediate"):
         user, guild, resp_chan = ctx['user'], ctx['guild'], ctx['resp_chan']
         chan_name = chan
         try:
@@ -51,16 +60,17 @@ class SubCommand(AbstractCommand, HelpMixin):
         except ValueError:
             raise ValueError(f"channel {chan_name} doesn't exist")
 
-        subs = self._bot.storage._subs[chan.id]
-        subs.add(user.id)
-        self._bot.storage._subs[chan.id] = subs
+        await self._bot.storage.backend.add_subscriber(guild.id, chan.id, user.id, mode == "digest")
 
+        if mode == "digest":
+            return await resp_chan.send(f"subscribed you to digests of channel {chan.name}")
         await resp_chan.send(f"subscribed you to channel {chan.name}")
 
     def description(self):
         return """
             receive a notification when somebody starts
-            an activity on the given voice channel
+            an activity on the given voice channel, right
+            away (immediate, default) or in a periodic digest
         """
 
 
@@ -75,20 +85,58 @@ class UnsubCommand(AbstractCommand, HelpMixin):
             [chan] = [ch for ch in guild.voice_channels if ch.name == chan]
         except ValueError:
             raise ValueError(f"channel {chan} doesn't exist")
-        subs = self._bot.storage._subs[chan.id]
-        subs.remove(user.id)
-        self._bot.storage._subs[chan.id] = subs
+        if not await self._bot.storage.backend.remove_subscriber(guild.id, chan.id, user.id):
+            return await resp_chan.send(f"you are not subscribed to channel {chan.name}")
         await resp_chan.send(f"unsubscribed you from channel {chan.name}")
 
     def description(self):
         return "stop receiving notification about given channel"
 
 
+class ListSubsCommand(AbstractCommand, HelpMixin):
+
+    def name(self) -> str:
+        return "subs"
+
+    async def run(self, ctx):
+        user, guild, resp_chan = ctx['user'], ctx['guild'], ctx['resp_chan']
+        backend = self._bot.storage.backend
+        channels = await backend.subscriptions(user.id, guild.id)
+        digests = await backend.digest_subscriptions(user.id, guild.id)
+        names = sorted(
+            f"{chan.name} (digest)" if chan.id in digests else chan.name
+            for chan in map(guild.get_channel, channels) if chan is not None)
+        if not names:
+            return await resp_chan.send("you are not subscribed to any channel")
+        await resp_chan.send("you are subscribed to:\n" + "\n".join(names))
+
+    def description(self):
+        return "list channels you are subscribed to"
+
+
+class UnsubAllCommand(AbstractCommand, HelpMixin):
+
+    def name(self) -> str:
+        return "unsub-all"
+
+    async def run(self, ctx):
+        user, guild, resp_chan = ctx['user'], ctx['guild'], ctx['resp_chan']
+        channels = await self._bot.storage.backend.subscriptions(user.id, guild.id)
+        # channels of unknown guild are only removed if they are in this one
+        channels = [chan for chan in channels if guild.get_channel(chan) is not None]
+        removed = await self._bot.storage.backend.remove_subscriptions(guild.id, user.id, channels)
+        await resp_chan.send(f"unsubscribed you from {removed} channels")
+
+    def description(self):
+        return "stop receiving notifications about all channels"
+
+
 class NotificationListener(AbstractListener):
 
-    def __init__(self, bot):
+    def __init__(self, bot, dispatcher, digest):
         super().__init__(bot)
-        self._timeouts = set()
+        self._dispatcher = dispatcher
+        self._digest = digest
 
     async def on_voice_state_update(self, mem, bef, after):
         channel_changed = bef.channel != after.channel
@@ -96,21 +144,21 @@ class NotificationListener(AbstractListener):
         if after.channel is None:
             LOGGER.debug("user %s left channel", mem.name)
             return
-        if after.channel.id in self._timeouts:
+        if ("channel_timeout", after.channel.id) in self._bot.scheduler:
             LOGGER.debug("channel %s is still timed out", after.channel.name)
             return
         if channel_changed and len(after.channel.members) == 1:
             LOGGER.info("%s just joined channel %s(%a)", mem.name, after.channel.name, after.channel.id)
             LOGGER.info("channel members %a", after.channel.members)
-            self._timeouts.add(after.channel.id)
-            for user_id in self._bot.storage._subs[after.channel.id]:
-                user = await mem.guild.fetch_member(user_id)
-                LOGGER.info("notifying user %s", user.name)
-                if user != mem:
-                    await user.send(f"Activity started on {after.channel} by {mem.name}")
-            asyncio.create_task(self._revoke_timeout(after.channel.id))
-
-    async def _revoke_timeout(self, channel_id):
-        await asyncio.sleep(PER_CHAN_TIMEOUT)
-        LOGGER.debug("revoking timeout on channel %a", channel_id)
-        self._timeouts.remove(channel_id)
+            # the channel is timed out for as long as the timer is scheduled
+            self._bot.scheduler.schedule(("channel_timeout", after.channel.id), PER_CHAN_TIMEOUT)
+            backend = self._bot.storage.backend
+            subs = await backend.subscribers(after.channel.id) - {mem.id}
+            if not subs:
+                return
+            digest = await backend.digest_subscribers(after.channel.id) & subs
+            if digest:
+                self._digest.add(mem.guild, after.channel, mem.name, digest)
+            if subs - digest:
+                self._dispatcher.dispatch(
+                    mem.guild, subs - digest, f"Activity started on {after.channel} by {mem.name}")
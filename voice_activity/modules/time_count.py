@@ -2,34 +2,47 @@ import logging
 import os.path
 import time
 
-from tinydb import TinyDB
-from types import SimpleNamespace
-from collections import defaultdict
-from datetime import (
-    datetime,
-    timedelta,
-)
+from functools import partial
+
+import discord
 
 from voice_activity.abc import (
     AbstractCommand,
     AbstractListener,
     AbstractPlugin,
 )
-from voice_activity.tinydb_exts.defaultdict import DefaultDict
+from voice_activity.coalescing import event_time
 from voice_activity.utility import (
     unapply_ctx,
     get_voice_channel,
+    run_periodically,
 )
 from voice_activity.modules.default_modules import HelpMixin
-
-# this unused import is here so that plugin
-# autodiscovery discovers storage plugin earlier than
-# us as it is our dependency (we use `storage` field created
-# by it in our objects).
-from voice_activity.modules import storage
+from voice_activity.presence import Presence
+from voice_activity.leaderboard import (
+    format_duration,
+    pages,
+    parse_order,
+    top_users,
+)
+from voice_activity.rollups import (
+    bucket_start,
+    format_window,
+    granularity_for,
+    parse_window,
+)
+from voice_activity.session_log import SessionLog
+from voice_activity.sharding import (
+    shard_file,
+    shard_key,
+)
 
 LOGGER = logging.getLogger(__name__)
 
+# last time the bot was known to be running, used to close
+# the sessions left open when the bot went down
+HEARTBEAT_META_KEY = "heartbeat"
+
 
 class TimeCountingPlugin(AbstractPlugin):
 
@@ -39,26 +52,38 @@ class TimeCountingPlugin(AbstractPlugin):
         if config is None:
             raise AttributeError("Configuration is required")
 
-        db_path = os.path.join(config.data_directory, "time_count.db")
-        db = TinyDB(db_path)
+        shard = None if config.shard_id is None else (config.shard_id, config.shard_count)
+        sessions = SessionLog(
+            os.path.join(config.data_directory, shard_file(config.session_log_file, shard)),
+            bot.storage.backend,
+            max_records=config.session_log_max_records,
+            shard=shard)
+        bot.add_background_task(sessions.load)
+        # the listener ignores events on other channels without asking storage
+        presence = Presence(sessions)
+        bot.add_background_task(presence.load, bot.storage.backend)
+        bot.presence = presence
+        bot.add_background_task(run_periodically, sessions.compact, config.session_log_compact_interval)
+        bot.add_cleanup(sessions.close)
+
+        bot.add_module(TrackChannel, presence)
+        bot.add_module(UntrackChannel, presence, sessions)
+        bot.add_module(ShowStats, sessions, config.leaderboard_size, config.leaderboard_page_size)
+        bot.add_module(ShowTrackedChannels)
+        bot.add_module(
+            TimeListener, presence, sessions, config.heartbeat_interval, shard_key(HEARTBEAT_META_KEY, shard))
 
-        bot.storage.time_counting = SimpleNamespace(
-            tracked_channels=DefaultDict(TinyDB.table(db, "tracked_channels"), dict),
-            time_counts=DefaultDict(TinyDB.table(db, "time_counts"), lambda: defaultdict(float)),
-        )
 
-        bot.add_module(TrackChannel)
-        bot.add_module(UntrackChannel)
-        bot.add_module(ShowStats)
-        bot.add_module(ShowTrackedChannels)
-        bot.add_module(TimeListener)
+def write_heartbeat(storage, key):
+    return storage.set_meta(key, time.time())
 
 
 class TrackChannel(AbstractCommand, HelpMixin):
 
-    def __init__(self, bot):
+    def __init__(self, bot, presence):
         super().__init__(bot)
-        self.storage = bot.storage.time_counting
+        self.storage = bot.storage.backend
+        self._presence = presence
 
     def name(self):
         return "track"
@@ -66,10 +91,11 @@ class TrackChannel(AbstractCommand, HelpMixin):
     async def run(self, ctx, channel_name):
         _, guild, resp_chan = unapply_ctx(ctx)
         chan = get_voice_channel(guild, channel_name)
-        if chan in self.storage.tracked_channels:
+        if await self.storage.is_tracked(chan.id):
             return await resp_chan.send(f"channel '{channel_name}' is already tracked")
-        self.storage.time_counts[chan] = defaultdict(lambda: timedelta(seconds=0))
-        self.storage.tracked_channels[chan] = {}
+        await self.storage.track_channel(guild.id, chan.id)
+        self._presence.track(chan.id)
+        self._bot.responses.invalidate(("channel", chan.id), ("tracked", guild.id))
         await resp_chan.send(f"channel {channel_name} is now tracked")
 
     def description(self):
@@ -81,9 +107,11 @@ class TrackChannel(AbstractCommand, HelpMixin):
 
 class UntrackChannel(AbstractCommand, HelpMixin):
 
-    def __init__(self, bot):
+    def __init__(self, bot, presence, sessions):
         super().__init__(bot)
-        self.storage = bot.storage.time_counting
+        self.storage = bot.storage.backend
+        self._presence = presence
+        self._sessions = sessions
 
     def name(self):
         return "untrack"
@@ -91,10 +119,12 @@ class UntrackChannel(AbstractCommand, HelpMixin):
     async def run(self, ctx, channel_name):
         _, guild, resp_chan = unapply_ctx(ctx)
         chan = get_voice_channel(guild, channel_name)
-        if chan not in self.storage.tracked_channels:
+        if not await self.storage.is_tracked(chan.id):
             return await resp_chan.send(f"channel '{channel_name}' is not being tracked")
-        del self.storage.tracked_channels[chan]
-        del self.storage.time_counts[chan]
+        self._presence.untrack(chan.id)
+        await self._sessions.untrack(guild.id, chan.id)
+        await self.storage.untrack_channel(guild.id, chan.id)
+        self._bot.responses.invalidate(("channel", chan.id), ("tracked", guild.id))
         await resp_chan.send(f"channel '{channel_name}' was removed from tracking")
 
     def description(self):
@@ -104,34 +134,88 @@ class UntrackChannel(AbstractCommand, HelpMixin):
         """
 
 
+def parse_stats_window(text):
+    return None if text.strip().lower() == "all" else parse_window(text)
+
+
 class ShowStats(AbstractCommand, HelpMixin):
+    """
+    Shows the most active users of the channel as pages of embeds.
 
-    def __init__(self, bot):
+    Only the top `size` users are picked from the counts and only
+    their names are resolved. Sorted by time every page is sent as
+    soon as its members are known, sorted by name all of them have
+    to be known first.
+
+    Responses are cached until a session on the channel is closed,
+    with windowed stats also until the window's first bucket moves.
+    """
+
+    def __init__(self, bot, sessions, size, page_size):
         super().__init__(bot)
-        self.storage = bot.storage.time_counting
+        self.storage = bot.storage.backend
+        self._sessions = sessions
+        self._size = size
+        self._page_size = page_size
 
     def name(self):
         return "track-stats"
 
-    async def run(self, ctx, chan_name):
+    async def run(self, ctx, chan_name, window: parse_stats_window = None, order: parse_order = "time"):
         _, guild, resp_chan = unapply_ctx(ctx)
         chan = get_voice_channel(guild, chan_name)
-        if chan.id not in self.storage.tracked_channels:
+        since = None if window is None else time.time() - window
+        first_bucket = None if window is None else bucket_start(since, granularity_for(window))
+        await self._bot.responses.respond(
+            (self.name(), guild.id, (chan_name, window, order, first_bucket)), [("channel", chan.id)],
+            resp_chan, partial(self._respond, guild, chan, chan_name, window, since, order))
+
+    async def _respond(self, guild, chan, chan_name, window, since, order, resp_chan):
+        if not await self.storage.is_tracked(chan.id):
             return await resp_chan.send(f"channel '{chan_name}' is not being tracked")
-        stats = self.storage.time_counts[chan.id]
-        msg = f"Stats for channel '{chan_name}':\n\n"
-
-        for user_id, tim in stats.items():
-            user = await guild.fetch_member(user_id)
-            t = time.strftime('%H:%M:%S', time.gmtime(tim))
-            msg += f"{user.name}: {t}\n"
-        msg += "\nThat is all"
-        await resp_chan.send(msg)
+        if window is None:
+            stats = await self._sessions.time_counts(chan.id)
+            title = f"Stats for channel '{chan_name}'"
+        else:
+            stats = await self._sessions.rollup_counts(chan.id, granularity_for(window), since)
+            title = f"Stats for channel '{chan_name}' in the last {format_window(window)}"
+        if not stats:
+            return await resp_chan.send(f"{title}: no activity yet")
+
+        top = top_users(stats, self._size)
+        rank = {user_id: i for i, (user_id, _) in enumerate(top, 1)}
+        if order == "name":
+            users = await self._bot.members.get_many(guild, [user_id for user_id, _ in top])
+            top.sort(key=lambda entry: self._user_name(users, entry[0]).lower())
+        else:
+            users = None
+        all_pages = pages(top, self._page_size)
+        for page_number, page in enumerate(all_pages, 1):
+            page_users = users
+            if page_users is None:
+                page_users = await self._bot.members.get_many(guild, [user_id for user_id, _ in page])
+            lines = [
+                f"{rank[user_id]}. {self._user_name(page_users, user_id)}: {format_duration(seconds)}"
+                for user_id, seconds in page
+            ]
+            embed = discord.Embed(title=title, description="\n".join(lines))
+            footer = f"page {page_number}/{len(all_pages)}"
+            if len(stats) > len(top):
+                footer += f", top {len(top)} of {len(stats)} users"
+            embed.set_footer(text=footer)
+            await resp_chan.send(embed=embed)
+
+    @staticmethod
+    def _user_name(users, user_id):
+        user = users.get(user_id)
+        return user.name if user is not None else f"unknown user ({user_id})"
 
     def description(self):
         return """
-            show activity time on the given
-            voice channel for each user
+            show the most active users of the given
+            voice channel, optionally only in the given
+            time window like 24h, 7d or 4w (all by default),
+            sorted by time (default) or by name
         """
 
 
@@ -139,16 +223,23 @@ class ShowTrackedChannels(AbstractCommand, HelpMixin):
 
     def __init__(self, bot):
         super().__init__(bot)
-        self.storage = bot.storage.time_counting
+        self.storage = bot.storage.backend
 
     def name(self):
         return "track-channels"
 
     async def run(self, ctx):
         _, guild, resp_chan = unapply_ctx(ctx)
+        await self._bot.responses.respond(
+            (self.name(), guild.id, ()), [("tracked", guild.id)],
+            resp_chan, partial(self._respond, guild))
+
+    async def _respond(self, guild, resp_chan):
         msg = "Tracked channels:\n\n"
-        for chan_id in self.storage.tracked_channels:
+        for chan_id in await self.storage.tracked_channels(guild.id):
             chan = guild.get_channel(chan_id)
+            if chan is None:
+                continue
             msg += f"{chan.name}\n"
         msg += "\nThat's all"
         await resp_chan.send(msg)
@@ -159,9 +250,59 @@ class ShowTrackedChannels(AbstractCommand, HelpMixin):
 
 class TimeListener(AbstractListener):
 
-    def __init__(self, bot):
+    def __init__(self, bot, presence, sessions, heartbeat_interval, heartbeat_key=HEARTBEAT_META_KEY):
         super().__init__(bot)
-        self.storage = bot.storage.time_counting
+        self.storage = bot.storage.backend
+        self._sessions = sessions
+        self._heartbeat_interval = heartbeat_interval
+        self._heartbeat_key = heartbeat_key
+        self._heartbeat_started = False
+        self._presence = presence
+        # only called for the events on the tracked channels
+        self.channels = presence
+
+    async def on_ready(self):
+        """
+        Reconciles the stored sessions with the current channel members.
+
+        If the bot was down (the last heartbeat is older than two heartbeat
+        intervals) every stored session is closed at the last heartbeat
+        and sessions are opened for everybody present on the channel now.
+        Otherwise only the sessions of the users who left while the bot
+        was disconnected are closed and the ones of the users who joined
+        are opened.
+        """
+        # the open sessions are compared with the channel members below
+        await self._sessions.ready()
+        now = time.time()
+        heartbeat = await self.storage.get_meta(self._heartbeat_key)
+        await self._presence.load(self.storage)
+        was_down = heartbeat is None or now - heartbeat > 2 * self._heartbeat_interval
+        leaves, joins = [], []
+        for chan_id in self._presence.tracked:
+            chan = self._bot.get_channel(chan_id)
+            if chan is None:
+                continue
+            present = {member.id for member in chan.members}
+            opened = self._presence.members(chan_id)
+            for user_id, joined_at in opened.items():
+                if was_down or user_id not in present:
+                    closed_at = joined_at if heartbeat is None else max(joined_at, heartbeat)
+                    leaves.append((chan.guild.id, chan_id, user_id, closed_at))
+            for user_id in present:
+                if was_down or user_id not in opened:
+                    joins.append((chan.guild.id, chan_id, user_id, now))
+        LOGGER.info(
+            "recovering sessions: closing %d and opening %d (bot was down: %s)",
+            len(leaves), len(joins), was_down)
+        await self._sessions.recover(leaves, joins)
+        self._bot.responses.invalidate(*{("channel", chan_id) for _, chan_id, _, _ in leaves})
+        beat = partial(write_heartbeat, self.storage, self._heartbeat_key)
+        await beat()
+        if not self._heartbeat_started:
+            self._heartbeat_started = True
+            self._bot.add_background_task(run_periodically, beat, self._heartbeat_interval)
+            self._bot.add_cleanup(beat)
 
     async def on_voice_state_update(self, mem, bef, aft):
         channel_changed = bef.channel != aft.channel
@@ -169,19 +310,12 @@ class TimeListener(AbstractListener):
         if not channel_changed:
             LOGGER.debug("%a Channels did not change", mem.name)
             return
-        if aft.channel is not None and aft.channel in self.storage.tracked_channels:
-            LOGGER.debug("%a Appeared in channel %a", mem.name, aft.channel.name)
-            chan = self.storage.tracked_channels[aft.channel.id]
-            chan[str(mem.id)] = datetime.utcnow().timestamp()
-            self.storage.tracked_channels[aft.channel.id] = chan
-
-        if bef.channel is not None and bef.channel in self.storage.tracked_channels:
+        now = event_time()
+        if bef.channel is not None and bef.channel.id in self._presence:
             LOGGER.debug("%a Left channel %a", mem.name, bef.channel.name)
-            now = datetime.utcnow().timestamp()
-            tracked_chan = self.storage.tracked_channels[bef.channel.id]
-            appeared_at = tracked_chan[str(mem.id)]
-            diff = now - appeared_at
-
-            chan = self.storage.time_counts[bef.channel.id]
-            chan[str(mem.id)] += diff
-            self.storage.time_counts[bef.channel.id] = chan
+            if await self._sessions.leave(mem.guild.id, bef.channel.id, mem.id, now) is not None:
+                self._bot.responses.invalidate(("channel", bef.channel.id))
+
+        if aft.channel is not None and aft.channel.id in self._presence:
+            LOGGER.debug("%a Appeared in channel %a", mem.name, aft.channel.name)
+            await self._sessions.join(mem.guild.id, aft.channel.id, mem.id, now)
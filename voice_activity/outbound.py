@@ -0,0 +1,182 @@
+import asyncio
+import logging
+import traceback
+
+from collections import deque
+
+from voice_activity.metrics import REGISTRY
+
+LOGGER = logging.getLogger(__name__)
+OUTBOUND_MESSAGES = REGISTRY.counter(
+    "outbound_messages", "Replies queued, and messages sent for them.", ["kind"])
+
+MESSAGE_LIMIT = 2000  # characters discord accepts in a single message
+
+
+def split_message(text, limit=MESSAGE_LIMIT):
+    """
+    Splits the text into chunks of at most `limit` characters,
+    between lines unless a single line is longer than that.
+    """
+    chunks = []
+    current = ""
+    for line in text.splitlines(keepends=True):
+        if len(current) + len(line) > limit and current:
+            chunks.append(current)
+            current = ""
+        while len(line) > limit:
+            chunks.append(line[:limit])
+            line = line[limit:]
+        current += line
+    chunks.append(current)
+    return [chunk.rstrip("\n") for chunk in chunks if chunk.strip("\n")] or [text[:limit]]
+
+
+class RateLimiter:
+    """
+    Token bucket allowing `rate` acquisitions per `per` seconds.
+    """
+
+    def __init__(self, rate, per):
+        self._rate = rate
+        self._per = per
+        self._tokens = float(rate)
+        self._updated = None
+
+    async def acquire(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            now = loop.time()
+            if self._updated is not None:
+                self._tokens = min(self._rate, self._tokens + (now - self._updated) * self._rate / self._per)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) * self._per / self._rate)
+
+
+class _Outgoing:
+
+    def __init__(self, content, embed):
+        self.content = content
+        self.embed = embed
+        self.futures = [asyncio.get_event_loop().create_future()]
+
+
+class OutboundChannel:
+    """
+    Channel wrapper queueing the messages to send instead of sending
+    them right away.
+
+    Returned by `Outbox.channel`, `send` accepts the same `content`
+    and `embed` as the discord channels and returns a future of the
+    message it ended up in, or of None if sending failed.
+    """
+
+    def __init__(self, outbox, channel):
+        self._outbox = outbox
+        self.channel = channel
+
+    async def send(self, content=None, embed=None):
+        OUTBOUND_MESSAGES.inc("queued")
+        return self._outbox._enqueue(self.channel, _Outgoing(None if content is None else str(content), embed))
+
+
+class Outbox:
+    """
+    Queues the outbound messages, one queue per channel.
+
+    Every queue is drained by its own task, started when something is
+    queued and finished once it's empty. Before sending, the task waits
+    `coalesce_window` seconds for more replies and joins all of the
+    text-only ones at the front of the queue into as few messages as
+    they fit in, split between lines at the message length limit. Sends
+    to a channel wait for its token bucket of `rate` messages
+    per `per` seconds, discord's per channel limit by default, so bursts
+    are spread out instead of running into 429 responses. A `rate`
+    of None disables the limit.
+    """
+
+    def __init__(self, rate=5, per=5.0, coalesce_window=0.1):
+        self.rate = rate
+        self.per = per
+        self.coalesce_window = coalesce_window
+        # channel id -> queued `_Outgoing`
+        self._queues = {}
+        self._limiters = {}
+        self._drains = {}
+
+    def channel(self, channel):
+        return OutboundChannel(self, channel)
+
+    async def close(self):
+        """
+        Waits for the queued messages to be sent.
+        """
+        if self._drains:
+            await asyncio.gather(*self._drains.values(), return_exceptions=True)
+
+    def _enqueue(self, channel, outgoing):
+        self._queues.setdefault(channel.id, deque()).append(outgoing)
+        if channel.id not in self._drains:
+            self._drains[channel.id] = asyncio.ensure_future(self._drain(channel))
+        return outgoing.futures[0]
+
+    async def _drain(self, channel):
+        queue = self._queues[channel.id]
+        limiter = self._limiters.get(channel.id)
+        if limiter is None and self.rate is not None:
+            limiter = self._limiters[channel.id] = RateLimiter(self.rate, self.per)
+        try:
+            while queue:
+                if self.coalesce_window:
+                    await asyncio.sleep(self.coalesce_window)
+                outgoing = self._coalesce(queue)
+                try:
+                    message = await self._deliver(channel, limiter, outgoing)
+                except Exception:
+                    LOGGER.error(
+                        "couldn't send a message to channel %a, traceback: %s",
+                        channel.id, traceback.format_exc())
+                    message = None
+                for future in outgoing.futures:
+                    if not future.done():
+                        future.set_result(message)
+        finally:
+            del self._drains[channel.id]
+            if not queue:
+                del self._queues[channel.id]
+
+    @staticmethod
+    def _coalesce(queue):
+        outgoing = queue.popleft()
+        if outgoing.embed is not None:
+            return outgoing
+        while queue and queue[0].embed is None:
+            following = queue.popleft()
+            OUTBOUND_MESSAGES.inc("coalesced")
+            outgoing.content = "\n".join(filter(None, (outgoing.content, following.content)))
+            outgoing.futures.extend(following.futures)
+        return outgoing
+
+    async def _deliver(self, channel, limiter, outgoing):
+        chunks = split_message(outgoing.content) if outgoing.content else [None]
+        message = None
+        for i, chunk in enumerate(chunks):
+            await self._acquire(limiter)
+            OUTBOUND_MESSAGES.inc("sent")
+            # an embed goes with the last part of the content
+            message = await self._send(channel, chunk, outgoing.embed if i == len(chunks) - 1 else None)
+        return message
+
+    @staticmethod
+    async def _acquire(limiter):
+        if limiter is not None:
+            await limiter.acquire()
+
+    @staticmethod
+    def _send(channel, content, embed):
+        if embed is None:
+            return channel.send(content)
+        return channel.send(content, embed=embed)
@@ -0,0 +1,106 @@
+import importlib
+import logging
+
+from dataclasses import dataclass
+from importlib import metadata
+from typing import Optional
+
+LOGGER = logging.getLogger(__name__)
+
+# other packages can provide plugins as entry points of this group,
+# `name = "package.module:PluginClass"`, their dependencies are read
+# from the `requires` attribute of the plugin class
+ENTRY_POINT_GROUP = "voice_activity.plugins"
+
+
+@dataclass(frozen=True)
+class PluginSpec:
+    """
+    Where to find a plugin and which plugins it needs started before it.
+    `requires` of None means it is read from the plugin class.
+    """
+    name: str
+    path: str
+    requires: Optional[tuple] = ()
+
+    def load(self):
+        """
+        Imports the plugin module and returns the plugin class.
+        """
+        module_name, _, class_name = self.path.partition(":")
+        return getattr(importlib.import_module(module_name), class_name)
+
+    def dependencies(self):
+        if self.requires is None:
+            return tuple(self.load().requires)
+        return self.requires
+
+
+MANIFEST = (
+    PluginSpec("storage", "voice_activity.modules.storage:StoragePlugin"),
+    PluginSpec("members", "voice_activity.modules.members:MemberCachePlugin"),
+    PluginSpec("metrics", "voice_activity.modules.metrics:MetricsPlugin"),
+    PluginSpec("default", "voice_activity.modules.default_modules:DefaultModulesPlugin"),
+    PluginSpec("sub", "voice_activity.modules.sub:SubPlugin", requires=("storage", "members")),
+    PluginSpec(
+        "time_count", "voice_activity.modules.time_count:TimeCountingPlugin",
+        requires=("storage", "members")),
+)
+
+
+def entry_point_specs():
+    entry_points = metadata.entry_points()
+    if hasattr(entry_points, "select"):
+        group = entry_points.select(group=ENTRY_POINT_GROUP)
+    else:
+        group = entry_points.get(ENTRY_POINT_GROUP, ())
+    return [PluginSpec(ep.name, ep.value, requires=None) for ep in group]
+
+
+class PluginRegistry:
+    """
+    Known plugins, by default the ones from `MANIFEST`
+    followed by the ones installed as entry points.
+    """
+
+    def __init__(self, specs=None):
+        if specs is None:
+            specs = list(MANIFEST) + entry_point_specs()
+        self._specs = {}
+        for spec in specs:
+            if spec.name in self._specs:
+                LOGGER.warning("plugin %r from %s is already registered, ignoring it", spec.name, spec.path)
+                continue
+            self._specs[spec.name] = spec
+
+    def __iter__(self):
+        return iter(self._specs.values())
+
+    def resolve(self, enabled=None):
+        """
+        Returns specs of the `enabled` plugins (all of them if None)
+        together with their dependencies, ordered so that every plugin
+        comes after the plugins it requires. Raises `ValueError` for
+        unknown plugins and dependency cycles.
+        """
+        names = list(self._specs) if enabled is None else list(enabled)
+        order = []
+        done = set()
+
+        def visit(name, chain):
+            if name in done:
+                return
+            if name in chain:
+                raise ValueError("plugin dependency cycle: " + " -> ".join(chain + (name,)))
+            spec = self._specs.get(name)
+            if spec is None:
+                required_by = f", required by {chain[-1]!r}" if chain else ""
+                raise ValueError(f"unknown plugin {name!r}{required_by}")
+            for dependency in spec.dependencies():
+                visit(dependency, chain + (name,))
+            done.add(name)
+            order.append(spec)
+
+        for name in names:
+            visit(name, ())
+        return order
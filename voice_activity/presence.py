@@ -0,0 +1,52 @@
+import logging
+
+LOGGER = logging.getLogger(__name__)
+
+
+class Presence:
+    """
+    In-memory view of the tracked channels and of who is in them.
+
+    `tracked` is a frozenset of the tracked channel ids which is
+    replaced on every change, so checking the channel of an event
+    is a single set lookup without any storage I/O and the set can
+    be iterated while channels are being tracked or untracked.
+
+    Who is present on a tracked channel since when is given by the
+    open sessions of the session log, which is replayed from the
+    storage on start and updated on every join and leave.
+    """
+
+    def __init__(self, sessions):
+        self._sessions = sessions
+        self.tracked = frozenset()
+
+    def __contains__(self, channel_id):
+        return channel_id in self.tracked
+
+    def __iter__(self):
+        return iter(self.tracked)
+
+    def __len__(self):
+        return len(self.tracked)
+
+    async def load(self, storage):
+        """
+        Adds the channels tracked in the storage.
+        """
+        self.tracked = self.tracked | await storage.tracked_channels()
+        LOGGER.info("loaded %d tracked channels", len(self.tracked))
+
+    def track(self, channel_id):
+        self.tracked = self.tracked | {channel_id}
+
+    def untrack(self, channel_id):
+        self.tracked = self.tracked - {channel_id}
+
+    def members(self, channel_id):
+        """
+        Returns `{user id: since}` of the members present on the channel.
+        """
+        if channel_id not in self.tracked:
+            return {}
+        return self._sessions.open_sessions(channel_id)
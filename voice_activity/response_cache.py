@@ -0,0 +1,110 @@
+import logging
+import time
+
+from collections import OrderedDict
+
+from voice_activity.metrics import REGISTRY
+
+LOGGER = logging.getLogger(__name__)
+RESPONSE_CACHE_LOOKUPS = REGISTRY.counter(
+    "response_cache_lookups", "Command responses looked up in the cache.", ["result"])
+
+
+class RecordingChannel:
+    """
+    Sends to the wrapped channel and remembers what was sent.
+    """
+
+    def __init__(self, channel):
+        self._channel = channel
+        self.sent = []
+
+    async def send(self, content=None, **kwargs):
+        self.sent.append((content, kwargs))
+        return await self._channel.send(content, **kwargs)
+
+
+class ResponseCache:
+    """
+    LRU cache of command responses with time based expiry.
+
+    Responses are cached under `(command, guild, args)` keys together
+    with tags naming the data they were computed from, like
+    `("channel", channel_id)`. Whatever changes that data invalidates
+    the tag, which drops every response computed from it. A response
+    computed while one of its tags was invalidated is not cached.
+    """
+
+    def __init__(self, max_size=1000, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        # key -> (sent messages, tags, expires at)
+        self._entries = OrderedDict()
+        # tag -> keys of the entries having it
+        self._tagged = {}
+        # tag -> generation it was last invalidated in
+        self._invalidated = {}
+        self._generation = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    async def respond(self, key, tags, resp_chan, compute):
+        """
+        Sends the cached response of `key` to `resp_chan`, or if there
+        is none awaits `compute(channel)` with a channel forwarding to
+        `resp_chan` and caches everything it sent under `key`.
+        """
+        sent = self._lookup(key)
+        if sent is not None:
+            RESPONSE_CACHE_LOOKUPS.inc("hit")
+            for content, kwargs in sent:
+                await resp_chan.send(content, **kwargs)
+            return
+        RESPONSE_CACHE_LOOKUPS.inc("miss")
+        started = self._generation
+        recording = RecordingChannel(resp_chan)
+        await compute(recording)
+        if all(self._invalidated.get(tag, -1) < started for tag in tags):
+            self._store(key, recording.sent, tags)
+
+    def invalidate(self, *tags):
+        self._generation += 1
+        for tag in tags:
+            self._invalidated[tag] = self._generation
+            for key in self._tagged.pop(tag, ()):
+                self._drop(key)
+
+    def clear(self):
+        self._entries.clear()
+        self._tagged.clear()
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        sent, _, expires_at = entry
+        if expires_at < time.monotonic():
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return sent
+
+    def _store(self, key, sent, tags):
+        self._drop(key)
+        self._entries[key] = (sent, tuple(tags), time.monotonic() + self.ttl)
+        for tag in tags:
+            self._tagged.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.max_size:
+            self._drop(next(iter(self._entries)))
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[1]:
+            keys = self._tagged.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tagged[tag]
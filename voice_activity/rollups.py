@@ -0,0 +1,79 @@
+import re
+
+HOUR = 3600
+DAY = 24 * HOUR
+WEEK = 7 * DAY
+
+# every closed session is added to the buckets of each of these
+# sizes so the time spent in a window is a sum of a few buckets.
+# buckets are aligned in UTC, weeks start on Monday.
+GRANULARITIES = (HOUR, DAY, WEEK)
+
+# how long buckets of the granularities are kept, as long as
+# `granularity_for` may still query them. week buckets are kept.
+RETENTION = {HOUR: 2 * DAY, DAY: 8 * WEEK}
+
+# unix epoch was on Thursday, first Monday after it was 4 days later
+WEEK_OFFSET = 4 * DAY
+
+WINDOW_UNITS = {"h": HOUR, "d": DAY, "w": WEEK}
+WINDOW_REGEX = re.compile(r"(\d+)([hdw])")
+
+
+def bucket_start(timestamp, granularity):
+    offset = WEEK_OFFSET if granularity == WEEK else 0
+    return int((timestamp - offset) // granularity * granularity + offset)
+
+
+def expired_before(granularity, now):
+    """
+    Returns start of the oldest bucket of the granularity which
+    is still kept at `now`, None if the buckets are kept forever.
+    """
+    kept = RETENTION.get(granularity)
+    return None if kept is None else bucket_start(now - kept, granularity)
+
+
+def split_session(start, end, granularity):
+    """
+    Splits the session into `(bucket_start, seconds)` pairs
+    of the buckets of the given granularity it overlaps.
+    """
+    parts = []
+    bucket = bucket_start(start, granularity)
+    while bucket < end:
+        bucket_end = bucket + granularity
+        seconds = min(end, bucket_end) - max(start, bucket)
+        if seconds > 0:
+            parts.append((bucket, seconds))
+        bucket = bucket_end
+    return parts
+
+
+def granularity_for(window):
+    """
+    Returns the coarsest granularity which still
+    answers the window with reasonable precision.
+    """
+    if window <= 2 * DAY:
+        return HOUR
+    if window <= 8 * WEEK:
+        return DAY
+    return WEEK
+
+
+def parse_window(text):
+    """
+    Converts window like `12h`, `7d` or `4w` to seconds.
+    """
+    match = WINDOW_REGEX.fullmatch(text.strip().lower())
+    if match is None or int(match.group(1)) == 0:
+        raise ValueError(f"invalid time window {text!r}, expected something like 12h, 7d or 4w")
+    return int(match.group(1)) * WINDOW_UNITS[match.group(2)]
+
+
+def format_window(window):
+    for unit, size in sorted(WINDOW_UNITS.items(), key=lambda item: -item[1]):
+        if window % size == 0:
+            return f"{window // size}{unit}"
+    return f"{window}s"
@@ -0,0 +1,111 @@
+import asyncio
+import heapq
+import inspect
+import itertools
+import logging
+import traceback
+
+LOGGER = logging.getLogger(__name__)
+
+
+class Scheduler:
+    """
+    Runs delayed callbacks from a single task.
+
+    Timers are kept in a heap ordered by their deadline, every timer has
+    a key and scheduling a timer under a key which is already scheduled
+    replaces the previous one. Cancelled and replaced timers are left
+    in the heap and skipped when they come up. Callbacks returning an
+    awaitable are started as tasks so they don't hold up other timers.
+    """
+
+    def __init__(self):
+        self._heap = []
+        # key -> sequence number of the timer currently scheduled under it
+        self._timers = {}
+        self._counter = itertools.count()
+        self._wakeup = None
+        self._tasks = set()
+
+    def __contains__(self, key):
+        return key in self._timers
+
+    def __len__(self):
+        return len(self._timers)
+
+    def schedule(self, key, delay, callback=None, *args):
+        """
+        Calls `callback(*args)` in `delay` seconds, replacing
+        the timer already scheduled under `key` if there is one.
+        A timer without a callback only keeps `key` scheduled
+        until its deadline, which is enough for cooldowns.
+        """
+        seq = next(self._counter)
+        deadline = self._now() + delay
+        self._timers[key] = seq
+        heapq.heappush(self._heap, (deadline, seq, key, callback, args))
+        if len(self._heap) > 2 * len(self._timers) + 64:
+            self._prune()
+        if self._heap[0][1] == seq and self._wakeup is not None:
+            self._wakeup.set()
+
+    def cancel(self, key):
+        """
+        Cancels the timer scheduled under `key`,
+        returns False if there was none.
+        """
+        return self._timers.pop(key, None) is not None
+
+    async def run(self):
+        self._wakeup = asyncio.Event()
+        try:
+            while True:
+                self._fire_due()
+                timeout = self._heap[0][0] - self._now() if self._heap else None
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._wakeup = None
+
+    def close(self):
+        self._heap.clear()
+        self._timers.clear()
+        for task in self._tasks:
+            task.cancel()
+
+    def _fire_due(self):
+        now = self._now()
+        while self._heap and self._heap[0][0] <= now:
+            _, seq, key, callback, args = heapq.heappop(self._heap)
+            if self._timers.get(key) != seq:
+                continue
+            del self._timers[key]
+            if callback is None:
+                continue
+            try:
+                res = callback(*args)
+                if inspect.isawaitable(res):
+                    task = asyncio.ensure_future(self._await(key, res))
+                    self._tasks.add(task)
+                    task.add_done_callback(self._tasks.discard)
+            except Exception:
+                LOGGER.error("timer %r failed, traceback: %s", key, traceback.format_exc())
+
+    def _prune(self):
+        self._heap = [
+            timer for timer in self._heap if self._timers.get(timer[2]) == timer[1]]
+        heapq.heapify(self._heap)
+
+    @staticmethod
+    async def _await(key, awaitable):
+        try:
+            await awaitable
+        except Exception:
+            LOGGER.error("timer %r failed, traceback: %s", key, traceback.format_exc())
+
+    @staticmethod
+    def _now():
+        return asyncio.get_event_loop().time()
@@ -0,0 +1,268 @@
+import asyncio
+import json
+import logging
+import os
+import os.path
+import traceback
+
+from concurrent.futures import ThreadPoolExecutor
+
+from voice_activity.rollups import (
+    bucket_start,
+    split_session,
+)
+from voice_activity.sharding import shard_key
+
+LOGGER = logging.getLogger(__name__)
+
+# sequence number of the last record applied to the storage
+SEQ_META_KEY = "session_log_seq"
+
+
+class SessionLog:
+    """
+    Append-only log of joins and leaves on the tracked channels.
+
+    Every join and leave is a single JSON line appended to the log,
+    the sessions are tracked in memory and the storage is only
+    updated when the log is compacted: closed sessions are added to
+    the time counts and the open ones are written as a snapshot, all
+    in one transaction which also stores the sequence number of the
+    last applied record. After that the log is truncated so replaying
+    it on startup only covers records since the last compaction.
+
+    Records are flushed to the OS on every write, they survive the
+    process crashing but not necessarily the machine crashing. The
+    log file is only touched by a dedicated writer thread, in the
+    order the records were made, so the event loop never waits on
+    the disk; a join or leave returns once its record is flushed.
+
+    When sharded, every shard has its own log given `shard` as
+    `(shard_id, shard_count)` and only snapshots its own sessions.
+    """
+
+    def __init__(self, path, storage, max_records=10000, shard=None):
+        self._path = path
+        self._shard = shard
+        self._seq_key = shard_key(SEQ_META_KEY, shard)
+        self._rotated_path = path + ".1"
+        self._storage = storage
+        self._max_records = max_records
+        self._file = None
+        self._ready = asyncio.Event()
+        self._seq = 0
+        self._records = 0
+        # channel -> user -> (guild, joined_at)
+        self._open = {}
+        # channel -> [(guild, channel, user, start, end)] not applied to the storage yet
+        self._closed = {}
+        self._compaction = None
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="session-log-writer")
+
+    @property
+    def pending_records(self) -> int:
+        """
+        Number of records written since the last compaction.
+        """
+        return self._records
+
+    async def load(self):
+        """
+        Loads the last snapshot from the storage
+        and replays the log records written after it.
+        """
+        compacted_seq = await self._storage.get_meta(self._seq_key, 0)
+        for guild, chan, user, joined_at in await self._storage.all_open_sessions(self._shard):
+            self._open.setdefault(chan, {})[user] = (guild, joined_at)
+        self._seq = compacted_seq
+        for path in (self._rotated_path, self._path):
+            for record in await self._run(self._read, path):
+                if record["seq"] > compacted_seq:
+                    self._apply(record)
+                    self._seq = record["seq"]
+        self._records = self._seq - compacted_seq
+        self._file = await self._run(open, self._path, "a")
+        self._ready.set()
+        LOGGER.info("replayed %d session log records", self._records)
+
+    async def ready(self):
+        """
+        Waits for `load` to finish, until then `open_sessions`
+        doesn't know about the sessions being replayed.
+        """
+        await self._ready.wait()
+
+    async def join(self, guild_id, channel_id, user_id, timestamp):
+        await self._append("join", guild_id, channel_id, user_id, timestamp)
+
+    async def leave(self, guild_id, channel_id, user_id, timestamp):
+        """
+        Closes the user's session, returns its duration
+        or None if the user had no open session.
+        """
+        await self._ready.wait()
+        if user_id not in self._open.get(channel_id, {}):
+            return None
+        return await self._append("leave", guild_id, channel_id, user_id, timestamp)
+
+    async def untrack(self, guild_id, channel_id):
+        """
+        Forgets all of the not yet compacted sessions of the channel.
+        """
+        await self._append("untrack", guild_id, channel_id)
+
+    async def recover(self, leaves, joins):
+        """
+        Closes and opens many sessions at once, both given as
+        `(guild, channel, user, timestamp)` rows, and compacts
+        the log so the storage is updated in a single transaction.
+        """
+        await self._ready.wait()
+        await self._write(
+            [("leave", *row) for row in leaves if row[2] in self._open.get(row[1], {})]
+            + [("join", *row) for row in joins])
+        await self.compact()
+
+    def open_sessions(self, channel_id):
+        return {user: joined_at for user, (_, joined_at) in self._open.get(channel_id, {}).items()}
+
+    async def time_counts(self, channel_id):
+        """
+        Returns stored time counts of the channel
+        together with the not yet compacted sessions.
+        """
+        # taken before awaiting, the storage read is ordered after
+        # every compaction which already took these sessions out
+        pending = list(self._closed.get(channel_id, ()))
+        counts = await self._storage.time_counts(channel_id)
+        for _, _, user, start, end in pending:
+            counts[user] = counts.get(user, 0.0) + max(0.0, end - start)
+        return counts
+
+    async def rollup_counts(self, channel_id, granularity, since):
+        pending = list(self._closed.get(channel_id, ()))
+        counts = await self._storage.rollup_counts(channel_id, granularity, since)
+        first = bucket_start(since, granularity)
+        for _, _, user, start, end in pending:
+            for bucket, seconds in split_session(start, end, granularity):
+                if bucket >= first:
+                    counts[user] = counts.get(user, 0.0) + seconds
+        return counts
+
+    async def compact(self):
+        """
+        Applies the log to the storage and truncates it. If the
+        compaction is already running waits for it to finish instead.
+        """
+        if self._compaction is None:
+            self._compaction = asyncio.ensure_future(self._compact())
+        await asyncio.shield(self._compaction)
+
+    async def close(self):
+        if self._file is None:
+            return
+        await self.compact()
+        await self._run(self._file.close)
+        self._file = None
+        self._writer.shutdown()
+
+    async def _compact(self):
+        try:
+            if self._records and self._file is not None:
+                await self._apply_to_storage()
+        except Exception:
+            LOGGER.error("session log compaction failed, traceback: %s", traceback.format_exc())
+        finally:
+            self._compaction = None
+
+    async def _apply_to_storage(self):
+        seq = self._seq
+        closed = [session for sessions in self._closed.values() for session in sessions]
+        self._closed = {}
+        open_sessions = [
+            (guild, chan, user, joined_at)
+            for chan, users in self._open.items()
+            for user, (guild, joined_at) in users.items()
+        ]
+        # queued behind the writes of every record up to `seq`
+        rotation = self._run(self._rotate)
+        LOGGER.debug("compacting session log up to record %d", seq)
+        try:
+            await rotation
+            await self._storage.record_sessions(
+                closed, open_sessions, {self._seq_key: seq}, self._shard)
+        except Exception:
+            for session in reversed(closed):
+                self._closed.setdefault(session[1], []).insert(0, session)
+            raise
+        await self._run(os.remove, self._rotated_path)
+        self._records = self._seq - seq
+        LOGGER.info("compacted %d closed sessions into the storage", len(closed))
+
+    def _run(self, func, *args):
+        return asyncio.get_event_loop().run_in_executor(self._writer, func, *args)
+
+    def _rotate(self):
+        self._file.close()
+        if os.path.exists(self._rotated_path):
+            # previous compaction failed, keep its records as well
+            with open(self._rotated_path, "a") as rotated, open(self._path) as current:
+                rotated.write(current.read())
+            os.remove(self._path)
+        else:
+            os.replace(self._path, self._rotated_path)
+        self._file = open(self._path, "a")
+
+    async def _append(self, op, guild_id, channel_id, user_id=None, timestamp=None):
+        await self._ready.wait()
+        [result] = await self._write([(op, guild_id, channel_id, user_id, timestamp)])
+        return result
+
+    async def _write(self, entries):
+        records = []
+        for op, guild_id, channel_id, user_id, timestamp in entries:
+            self._seq += 1
+            records.append({
+                "seq": self._seq, "op": op, "g": guild_id,
+                "c": channel_id, "u": user_id, "t": timestamp,
+            })
+        written = self._run(self._flush, "".join(
+            json.dumps(record, separators=(",", ":")) + "\n" for record in records))
+        self._records += len(records)
+        results = [self._apply(record) for record in records]
+        if self._records >= self._max_records and self._compaction is None:
+            asyncio.ensure_future(self.compact())
+        await written
+        return results
+
+    def _flush(self, data):
+        self._file.write(data)
+        self._file.flush()
+
+    def _apply(self, record):
+        op, guild, chan, user, ts = record["op"], record["g"], record["c"], record["u"], record["t"]
+        if op == "join":
+            self._open.setdefault(chan, {})[user] = (guild, ts)
+        elif op == "leave":
+            opened = self._open.get(chan, {}).pop(user, None)
+            if opened is None:
+                return None
+            self._closed.setdefault(chan, []).append((opened[0], chan, user, opened[1], ts))
+            return max(0.0, ts - opened[1])
+        elif op == "untrack":
+            self._open.pop(chan, None)
+            self._closed.pop(chan, None)
+        return None
+
+    @staticmethod
+    def _read(path):
+        records = []
+        if not os.path.exists(path):
+            return records
+        with open(path) as log:
+            for line in log:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    LOGGER.warning("skipping corrupted session log record in %s: %r", path, line)
+        return records
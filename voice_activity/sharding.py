@@ -0,0 +1,25 @@
+import os.path
+
+
+def shard_of(guild_id, shard_count):
+    """
+    Returns the id of the shard Discord delivers the guild's events to.
+    """
+    return (guild_id >> 22) % shard_count
+
+
+def shard_key(key, shard):
+    """
+    Makes a storage meta key private to the `(shard_id, shard_count)`
+    shard, keys are left as they are when not sharded.
+    """
+    if shard is None:
+        return key
+    return f"{key}:{shard[0]}"
+
+
+def shard_file(name, shard):
+    if shard is None:
+        return name
+    base, ext = os.path.splitext(name)
+    return f"{base}-{shard[0]}{ext}"
@@ -0,0 +1,125 @@
+import base64
+import json
+import sys
+
+from array import array
+
+from tinydb.storages import (
+    JSONStorage,
+    Storage,
+    touch,
+)
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+def _pack(values, typecode):
+    packed = array(typecode, values)
+    if sys.byteorder != "little":
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def _unpack(data, typecode):
+    unpacked = array(typecode)
+    unpacked.frombytes(data)
+    if sys.byteorder != "little":
+        unpacked.byteswap()
+    return unpacked
+
+
+class _PackedCodec:
+    """
+    Base of the codecs storing values as little endian packed arrays.
+
+    Storages which can't hold bytes (JSON) get them base64 encoded.
+    Values stored before the codec was enabled are still decoded,
+    they are converted on the next write.
+    """
+
+    def __init__(self, binary=False):
+        self._binary = binary
+
+    def _encode(self, data):
+        return data if self._binary else base64.b64encode(data).decode("ascii")
+
+    def _decode(self, value):
+        return value if isinstance(value, bytes) else base64.b64decode(value)
+
+
+class IdSetCodec(_PackedCodec):
+    """
+    Stores sets of ids as sorted arrays of unsigned 64 bit integers.
+    """
+
+    def serialize(self, ids):
+        return self._encode(_pack(sorted(ids), "Q"))
+
+    def deserialize(self, value):
+        if isinstance(value, list):
+            return set(value)
+        return set(_unpack(self._decode(value), "Q"))
+
+
+class SecondsMapCodec(_PackedCodec):
+    """
+    Stores `{str user id: seconds}` dicts as an array of the user ids
+    followed by an array of the seconds rounded to unsigned 32 bit
+    integers, which is enough for over a century per user.
+    """
+
+    def serialize(self, seconds):
+        users = [int(user) for user in seconds]
+        return self._encode(
+            _pack(users, "Q") + _pack((round(secs) for secs in seconds.values()), "I"))
+
+    def deserialize(self, value):
+        if isinstance(value, dict):
+            return value
+        data = self._decode(value)
+        count = len(data) // 12
+        users = _unpack(data[:count * 8], "Q")
+        seconds = _unpack(data[count * 8:], "I")
+        return {str(user): float(secs) for user, secs in zip(users, seconds)}
+
+
+class MsgPackStorage(Storage):
+    """
+    TinyDB storage writing the whole database as msgpack.
+
+    Files written by `JSONStorage` are still read, they are
+    converted on the next write.
+    """
+
+    def __init__(self, path, create_dirs=False):
+        if msgpack is None:
+            raise RuntimeError("msgpack is required for the msgpack TinyDB storage")
+        super().__init__()
+        touch(path, create_dirs=create_dirs)
+        self._handle = open(path, "rb+")
+
+    def read(self):
+        self._handle.seek(0)
+        data = self._handle.read()
+        if not data:
+            return None
+        if data[:1] == b"{":
+            return json.loads(data)
+        return msgpack.unpackb(data, raw=False, strict_map_key=False)
+
+    def write(self, data):
+        self._handle.seek(0)
+        self._handle.write(msgpack.packb(data, use_bin_type=True))
+        self._handle.flush()
+        self._handle.truncate()
+
+    def close(self):
+        self._handle.close()
+
+
+STORAGES = {"json": JSONStorage, "msgpack": MsgPackStorage}
+# tables of the TinyDB backend which can be stored packed and their codecs
+PACKED_CODECS = {"subscriptions": IdSetCodec, "time_counts": SecondsMapCodec}
@@ -1,6 +1,14 @@
+import logging
+
 from collections import abc
 from typing import Iterator, Any
-from tinydb import where
+from tinydb import (
+    TinyDB,
+    where,
+)
+
+LOGGER = logging.getLogger(__name__)
+
 
 def identity(val):
     return val
@@ -28,6 +36,9 @@ class DefaultDict(abc.MutableMapping):
     def __delitem__(self, key: Any):
         self._client.remove(where('key') == key)
 
+    def __contains__(self, key: Any) -> bool:
+        return self._client.contains(where('key') == key)
+
     def __iter__(self) -> Iterator:
         values = self._client.all()
         return iter([v["key"] for v in values])
@@ -37,3 +48,101 @@ class DefaultDict(abc.MutableMapping):
 
     def __repr__(self):
         return f'{self.__class__.__name__}({self._client})'
+
+
+class CachedDefaultDict(DefaultDict):
+    """
+    DefaultDict with an in-memory key -> value index.
+
+    The whole table is read once on construction, after that
+    reads never touch the disk. Writes only mark keys as dirty,
+    they are written back to TinyDB on `flush` which happens
+    either explicitly, or once more than `max_dirty` keys are
+    waiting to be written.
+
+    Values handed out by `__getitem__` are the cached objects
+    themselves, so in-place modifications have to be stored
+    back with `__setitem__` to be persisted, exactly like
+    with the uncached version.
+    """
+
+    def __init__(self, tinydb, default_factory, serializer=identity, deserializer=identity, *, max_dirty=None):
+        super().__init__(tinydb, default_factory, serializer, deserializer)
+        self._max_dirty = max_dirty
+        self._index = {
+            doc['key']: self._deserializer(doc['value'])
+            for doc in self._client.all()
+        }
+        self._dirty = set()
+
+    def __getitem__(self, key: Any) -> Any:
+        try:
+            return self._index[key]
+        except KeyError:
+            return self._default_factory()
+
+    def __setitem__(self, key: Any, value: Any):
+        self._index[key] = value
+        self._mark_dirty(key)
+
+    def __delitem__(self, key: Any):
+        del self._index[key]
+        self._mark_dirty(key)
+
+    def __contains__(self, key: Any) -> bool:
+        return key in self._index
+
+    def __iter__(self) -> Iterator:
+        return iter(list(self._index))
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    @property
+    def dirty(self) -> int:
+        """
+        Number of keys modified since the last flush.
+        """
+        return len(self._dirty)
+
+    def flush(self):
+        """
+        Writes back all of the modified keys.
+
+        TinyDB rewrites the whole file on every modification
+        anyway so instead of upserting every dirty key one
+        by one the table is replaced with the index contents
+        in a single write of the storage, so the table on disk
+        is never left empty or half written.
+        """
+        if not self._dirty:
+            return
+        LOGGER.debug("flushing %d dirty keys of %r", len(self._dirty), self)
+        docs = {
+            doc_id: {'key': key, 'value': self._serializer(value)}
+            for doc_id, (key, value) in enumerate(self._index.items(), 1)
+        }
+
+        def replace(table):
+            table.clear()
+            table.update(docs)
+
+        table = self._client
+        if isinstance(table, TinyDB):
+            table = table.table(table.default_table_name)
+        table._update_table(replace)
+        # ids of the documents are recomputed on the next insert
+        table._next_id = None
+        self._dirty.clear()
+
+    def rewrite(self):
+        """
+        Writes back all of the keys, e.g. after changing the serializer.
+        """
+        self._dirty.update(self._index)
+        self.flush()
+
+    def _mark_dirty(self, key):
+        self._dirty.add(key)
+        if self._max_dirty is not None and len(self._dirty) >= self._max_dirty:
+            self.flush()
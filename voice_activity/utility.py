@@ -1,3 +1,12 @@
+import asyncio
+import inspect
+import itertools
+import logging
+import traceback
+
+LOGGER = logging.getLogger(__name__)
+
+
 def unapply_ctx(ctx):
     user, guild, resp_chan = ctx['user'], ctx['guild'], ctx['resp_chan']
     return user, guild, resp_chan
@@ -7,5 +16,33 @@ def get_voice_channel(guild, name):
     try:
         [chan] = [ch for ch in guild.voice_channels if ch.name == name]
     except ValueError:
-        raise ValueError(f"channel {chan_name} doesn't exist")
+        raise ValueError(f"channel {name} doesn't exist")
     return chan
+
+
+def chunked(iterable, size):
+    """
+    Yields lists of at most `size` consecutive items of the iterable.
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+async def run_periodically(func, interval):
+    """
+    Calls `func` every `interval` seconds until cancelled.
+    If `func` returns an awaitable it is awaited before sleeping.
+    Exceptions are logged and do not stop the loop.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            res = func()
+            if inspect.isawaitable(res):
+                await res
+        except Exception:
+            LOGGER.error("periodic call of %r failed, traceback: %s", func, traceback.format_exc())